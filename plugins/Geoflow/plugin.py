@@ -54,17 +54,23 @@ def run_geoflow(atoms):
     same process.  There isn't much point in making this a method of the
     plugin class.  At least not that I can see now.  There may however be a
     better way to do this in the future.
+
+    'atoms' may carry a 'grid' with the 'dcel' and 'extvalue' to use instead
+    of the defaults, e.g. as sized by the psize plugin.
     '''
     # TODO: All of the following belong in a configuration file.  I like the
     # idea of a geoflow config building module.  It would assist the user
     # with the meaning of the various values, as well as tracking, naming and
     # locating the configs the user has created.
-    solver = Geoflow_Solver(pres_i=0.008, gama_i=0.0001, npiter=1,
+    settings = dict(pres_i=0.008, gama_i=0.0001, npiter=1,
             ngiter=1, tauval=1.40, prob=0.0, ffmodel=1, sigmas=1.5828,
             epsilonw=0.1554, vdwdispersion=0, extvalue=1.90, iadi=0,
             alpha=0.50, tol=1e-4, tottf=3.5, dcel=0.25, maxstep=20,
             epsilons=80.00, epsilonp=1.5, radexp=1, crevalue=0.01,
             density=0.03346)
+    settings.update(atoms.get('grid', {}))
+
+    solver = Geoflow_Solver(**settings)
 
     result = solver.process_molecule(atoms)
 
@@ -77,6 +83,7 @@ class Geoflow(BasePlugin):
     '''
     def __init__(self, **kwargs):
         self._atoms = []
+        self._grid = {}
 
         super().__init__(**kwargs)
         _log.info("Geoflow plug-in initialized.")
@@ -89,7 +96,7 @@ class Geoflow(BasePlugin):
 
     @classmethod
     def sinks(cls):
-        return ['apbs_atom']
+        return ['apbs_atom', 'pqr_atoms', 'grid_parameters']
 
 
     @classmethod
@@ -99,35 +106,86 @@ class Geoflow(BasePlugin):
 
     async def run(self):
         try:
-            # Collect all of the atoms that are available.
+            # Collect all of the atoms that are available.  Atoms from
+            # different models are solved separately, each as soon as the
+            # next model starts.
+            model = None
             while True:
                 data = await self.read_data()
-                if data:
-                    for list in data:
-                        value = data[list]
-                        self._atoms.append({
-                            'pos': (
-                                value['Cartn_x'],
-                                value['Cartn_y'],
-                                value['Cartn_z']
-                            ),
-                            'radius': value['radius'],
-                            'charge': value['charge']
-                            })
-
-                    else:
-                        break
-
-            # Run Geoflow in a separate process
-            result = await self.runner.run_as_process(run_geoflow,
-                    {'atoms': self._atoms})
-
-            await self.publish(self._tm.new_text(lines=[str(result)]))
+                if data and 'pqr_atoms' in data:
+                    # A whole model at once, straight from PDB2PQR.
+                    if self._atoms:
+                        await self._solve()
+
+                    self._add_columns(data['pqr_atoms']['atoms'])
+                    await self._solve()
+
+                elif data and 'grid_parameters' in data:
+                    # A whole model, with the grid that psize suggests for
+                    # it.  Geoflow's grid is uniform, so take the finest
+                    # spacing and the closest boundary.
+                    if self._atoms:
+                        await self._solve()
+
+                    grid = data['grid_parameters']
+                    self._add_columns(grid['atoms'])
+                    self._grid = {
+                        'dcel': min(grid['fine_spacing']),
+                        'extvalue': min(grid['extension'])
+                    }
+
+                    await self._solve()
+
+                elif data:
+                    value = data['apbs_atom']
+                    if self._atoms and value.get('pdbx_PDB_model_num') != model:
+                        await self._solve()
+
+                    model = value.get('pdbx_PDB_model_num')
+                    self._atoms.append({
+                        'pos': (
+                            value['Cartn_x'],
+                            value['Cartn_y'],
+                            value['Cartn_z']
+                        ),
+                        'radius': value['radius'],
+                        'charge': value['charge']
+                        })
+
+                else:
+                    break
+
+            if self._atoms:
+                await self._solve()
 
             await self.done()
         except Exception as e:
             _log.exception('Unhandled exception:')
 
 
+    def _add_columns(self, atoms):
+        '''Collect atoms that were sent as columns, one list per field.
+        '''
+        for x, y, z, radius, charge in zip(atoms['x'], atoms['y'],
+                atoms['z'], atoms['radius'], atoms['charge']):
+            self._atoms.append({
+                'pos': (x, y, z),
+                'radius': radius,
+                'charge': charge
+            })
+
+
+    async def _solve(self):
+        '''Solve the atoms collected so far, and publish the result.
+        '''
+        # Run Geoflow in a separate process
+        result = await self.runner.run_as_process(run_geoflow,
+                {'atoms': self._atoms, 'grid': self._grid})
+        self._atoms = []
+        self._grid = {}
+
+        await self.publish(self._tm.new_text(lines=[str(result)]))
+
+
     def xform_data(self, data, to_type):
         return data
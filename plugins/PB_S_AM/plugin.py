@@ -82,7 +82,7 @@ class PB_S_AM(BasePlugin):
 
     @classmethod
     def sinks(cls):
-        return ['apbs_atom']
+        return ['apbs_atom', 'pqr_atoms']
 
 
     @classmethod
@@ -92,11 +92,34 @@ class PB_S_AM(BasePlugin):
 
     async def run(self):
         try:
-            # Collect all of the atoms that are available.
+            # Collect all of the atoms that are available.  Atoms from
+            # different models are solved separately, each as soon as the
+            # next model starts.
+            model = None
             while True:
                 data = await self.read_data()
-                if data:
+                if data and 'pqr_atoms' in data:
+                    # A whole model at once, straight from PDB2PQR.
+                    if self._molecules:
+                        await self._solve()
+
+                    atoms = data['pqr_atoms']['atoms']
+                    for x, y, z, radius, charge in zip(atoms['x'], atoms['y'],
+                            atoms['z'], atoms['radius'], atoms['charge']):
+                        self._molecules.append({
+                            'pos': (x, y, z),
+                            'radius': radius,
+                            'charge': charge
+                        })
+
+                    await self._solve()
+
+                elif data:
                     value = data['apbs_atom']
+                    if self._molecules and value.get('pdbx_PDB_model_num') != model:
+                        await self._solve()
+
+                    model = value.get('pdbx_PDB_model_num')
                     self._molecules.append({
                         'pos': (
                             value['Cartn_x'],
@@ -109,16 +132,24 @@ class PB_S_AM(BasePlugin):
                 else:
                     break
 
-            # Run Geoflow in a separate process
-            result = await self.runner.run_as_process(run_pbam,
-                    {'atoms': self._molecules})
-
-            await self.publish(self._tm.new_text(lines=[str(result)]))
+            if self._molecules:
+                await self._solve()
 
             await self.done()
         except Exception as e:
             _log.exception('Unhandled exception:')
 
 
+    async def _solve(self):
+        '''Solve the atoms collected so far, and publish the result.
+        '''
+        # Run PB-SAM in a separate process
+        result = await self.runner.run_as_process(run_pbam,
+                {'atoms': self._molecules})
+        self._molecules = []
+
+        await self.publish(self._tm.new_text(lines=[str(result)]))
+
+
     def xform_data(self, data, to_type):
         return data
@@ -44,16 +44,30 @@
     ----------------------------
 """
 
+import copy
+import multiprocessing
 import pkgutil
+import traceback
 
-from optparse import OptionGroup, OptionConflictError, Option
+from optparse import OptionParser, OptionGroup, OptionConflictError, Option
+
+from ..src.analysis import runAnalyses
 
 _extList = [name for _, name, _ in pkgutil.iter_modules(__path__)]
 
-extDict = {}
+class _ExtensionDict(dict):
+    """
+    Maps the name of each extension to its module. A module is only 
+    imported the first time it is looked up, so running a few extensions
+    does not import all of them.
+    """
+    def __missing__(self, extName):
+        if extName not in _extList:
+            raise KeyError(extName)
+        extModule = self[extName] = __import__(extName,globals(),locals(),[], 1)
+        return extModule
 
-for extName in _extList:
-    extDict[extName] = __import__(extName,globals(),locals(),[], 1)
+extDict = _ExtensionDict()
     
 def setupExtensionsOptions(parser):
     """
@@ -64,13 +78,14 @@ def setupExtensionsOptions(parser):
     options are put in their own group.
     """
     
-    if len(extDict) == 0:
+    if len(_extList) == 0:
         return None
     
     firstGroup = OptionGroup(parser,"Extension options")
     groups = [firstGroup]
     
-    for extName, extModule in list(extDict.items()):
+    for extName in _extList:
+        extModule = extDict[extName]
         helpArg = {}
         if hasattr(extModule, 'usage'):
             helpArg['help'] = extModule.usage()
@@ -104,6 +119,83 @@ def setupExtensionsOptions(parser):
     
     return groups
 
+def getExtensionOptions(extNames, values=None):
+    """
+    Returns an options object for running the named extensions without
+    a command line. It has the defaults of the options that the 
+    extensions add, overridden by the values dictionary.
+    """
+    parser = OptionParser()
+    group = OptionGroup(parser, "Extension options")
+    for extName in extNames:
+        extModule = extDict[extName]
+        if hasattr(extModule, 'addExtensionOptions'):
+            extModule.addExtensionOptions(group)
+    parser.add_option_group(group)
+    
+    options, args = parser.parse_args([])
+    if values:
+        for name, value in values.items():
+            setattr(options, name, value)
+    return options
+
+def runExtensions(routines, outroot, options, extNames):
+    """
+    Runs the named extensions on the routines.
+    
+    The extensions that look at pairs of close atoms provide their 
+    analysis through create_analysis, and all of those share a single
+    pass over the protein after the other extensions have run.
+    """
+    analyses = []
+    try:
+        for extName in extNames:
+            extModule = extDict[extName]
+            if hasattr(extModule, 'create_analysis'):
+                analyses.append(extModule.create_analysis(routines, outroot, options))
+            else:
+                extModule.run_extension(routines, outroot, options)
+    except:
+        for analysis in analyses:
+            analysis.finish()
+        raise
+    
+    runAnalyses(routines.protein, analyses)
+
+def _runForkedExtensions(routines, outroot, options, extNames, connection):
+    try:
+        runExtensions(routines, outroot, options, extNames)
+    except Exception:
+        connection.send(traceback.format_exc())
+    else:
+        connection.send(None)
+    connection.close()
+
+def forkExtensions(routines, outroot, options, extNames):
+    """
+    Starts running the named extensions in a process forked from this one.
+    
+    The process sees the routines as they are now, without them being
+    copied, and anything the extensions change stays in that process. 
+    Several sets of extensions can so run at the same time on one
+    prepared protein, which this process is free to keep using.
+    
+    Returns the process, and a connection that receives None once the
+    extensions are done, or the traceback of the error that stopped them.
+    Where processes cannot be forked, the extensions are run here before
+    returning, on a copy of the routines, and the process is None.
+    """
+    receiver, sender = multiprocessing.Pipe(False)
+    if "fork" not in multiprocessing.get_all_start_methods():
+        _runForkedExtensions(copy.deepcopy(routines), outroot, options, extNames, sender)
+        return None, receiver
+    
+    worker = multiprocessing.get_context("fork").Process(target=_runForkedExtensions,
+                                                         args=(routines, outroot, options, extNames, sender))
+    worker.start()
+    sender.close()
+    return worker, receiver
+
 class extOutputHelper(object):
     """
     Simple class that makes writing to both file and output simple.
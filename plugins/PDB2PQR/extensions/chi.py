@@ -11,8 +11,6 @@
 __date__ = "17 February 2006"
 __author__ = "Todd Dolinsky"
 
-from ..src.utilities import getDihedral
-
 def usage():
     return 'Print the per-residue backbone chi angle to {output-path}.chi'
 
@@ -37,32 +35,40 @@ def run_extension(routines, outroot, options):
 
     protein = routines.protein
 
+    residues = []
+    quadruplets = []
     for residue in protein.getResidues():
         if residue.hasAtom("N"): 
-            ncoords = residue.getAtom("N").getCoords()
+            natom = residue.getAtom("N")
         else: 
             continue
 
         if residue.hasAtom("CA"):
-            cacoords = residue.getAtom("CA").getCoords()
+            caatom = residue.getAtom("CA")
         else: 
             continue
 
         if residue.hasAtom("CB"): 
-            cbcoords = residue.getAtom("CB").getCoords()
+            cbatom = residue.getAtom("CB")
         else: 
             continue
 
         if residue.hasAtom("CG"): 
-            gcoords = residue.getAtom("CG").getCoords()
+            gatom = residue.getAtom("CG")
         elif residue.hasAtom("OG"): 
-            gcoords = residue.getAtom("OG").getCoords()
+            gatom = residue.getAtom("OG")
         elif residue.hasAtom("SG"): 
-            gcoords = residue.getAtom("SG").getCoords()
+            gatom = residue.getAtom("SG")
         else: 
             continue
 
-        chi = getDihedral(ncoords, cacoords, cbcoords, gcoords)
+        residues.append(residue)
+        quadruplets.append((natom, caatom, cbatom, gatom))
+
+    # Calculate every chi angle in one batch
+
+    angles = protein.getDihedralAngles(quadruplets)
+    for residue, chi in zip(residues, angles):
         routines.write("%s\t%.4f\n" % (residue, chi))
         outfile.write("%s\t%.4f\n" % (residue, chi))
         
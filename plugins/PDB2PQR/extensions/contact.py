@@ -11,70 +11,80 @@
 __date__ = "April 2007"
 __author__ = "Julie C. Mitchell"
 
-from ..src.utilities import distance
-from ..src.routines import Cells
+from ..src.analysis import PairAnalysis, runAnalyses
 
 DIST_CUTOFF = 3.5         # max distance  
 
 def usage():
     return 'Print a list of contacts to {output-path}.con\n'
 
-def run_extension(routines, outroot, options):
+class ContactAnalysis(PairAnalysis):
     """
-        Print a list of contacts.
-
-        Parameters
-            routines:  A link to the routines object
-            outroot:   The root of the output name
-            options:   options object 
+    Finds the heavy atoms close to each donor with hydrogens
     """
-    outname = outroot + ".con"
-    outfile = open(outname, "w")
-
-    # Initialize - set nearby cells, donors/acceptors
-    
-    cellsize = int(DIST_CUTOFF + 1.0 + 1.0) 
-    protein = routines.protein
-    routines.setDonorsAndAcceptors()
-    routines.cells = Cells(cellsize)
-    routines.cells.assignCells(protein)
+    def __init__(self, routines, outfile):
+        PairAnalysis.__init__(self, DIST_CUTOFF)
+        routines.setDonorsAndAcceptors()
+        
+        self.routines = routines
+        self.outfile = outfile
+        self.lastatom = None
+        self.count = 0
 
-    for thisatom in protein.getAtoms():
+    def isQuery(self, thisatom):
         # Grab the list of thisatoms
         if not thisatom.hdonor: 
-            continue
-        thisatomhs = []
+            return False
         for bond in thisatom.bonds:
             if bond.isHydrogen(): 
-                thisatomhs.append(bond)
-        if thisatomhs == []: 
-            continue
+                return True
+        return False
+
+    def isPartner(self, thatatom):
+        return not thatatom.isHydrogen()
 
-        # For each thisatom, grab all thatatomeptors
+    def addPair(self, thisatom, thatatom, thisdist):
+        if (thisatom.residue == thatatom.residue): 
+            return  # comment this out to include interresidue contacts
+        
+        # The contacts are counted for each atom
+        if thisatom is not self.lastatom:
+            self.lastatom = thisatom
+            self.count = 0
             
-        count = 0
-        closeatoms = routines.cells.getNearCells(thisatom)
-        for thatatom in closeatoms:
-            if (thisatom.residue == thatatom.residue): 
-                continue  # comment this out to include interresidue contacts
-            if (thatatom.isHydrogen()): 
-                continue
-            thisdist = distance(thisatom.getCoords(), thatatom.getCoords())
-            if (thisdist <= DIST_CUTOFF): 
-                count = count+1
-                thisBstring='S'
-                thatBstring='S'
-                hscore= 0.0
-                if (thisatom.hdonor & thatatom.hacceptor): 
-                    hscore = 1.0
-                if (thisatom.hacceptor & thatatom.hdonor): 
-                    hscore = 1.0
-                if (thisatom.isBackbone()): 
-                    thisBstring='B'
-                if (thatatom.isBackbone()): 
-                    thatBstring='B'
-                outfile.write("%4d %4d %-4s (%4d  ) %s     %-4s<>%4d %-4s (%4d  ) %s     %-4s D=%6.2f  H-ene=%6.2f  Sym=  (%s-%s)\n" % \
-                  (count, thisatom.residue.resSeq,thisatom.residue.name,thisatom.residue.resSeq, thisatom.residue.chainID,thisatom.name,thatatom.residue.resSeq,thatatom.residue.name,thatatom.residue.resSeq, thatatom.residue.chainID,thatatom.name, thisdist, hscore, thisBstring, thatBstring)) 
+        self.count = self.count+1
+        thisBstring='S'
+        thatBstring='S'
+        hscore= 0.0
+        if (thisatom.hdonor & thatatom.hacceptor): 
+            hscore = 1.0
+        if (thisatom.hacceptor & thatatom.hdonor): 
+            hscore = 1.0
+        if (thisatom.isBackbone()): 
+            thisBstring='B'
+        if (thatatom.isBackbone()): 
+            thatBstring='B'
+        self.outfile.write("%4d %4d %-4s (%4d  ) %s     %-4s<>%4d %-4s (%4d  ) %s     %-4s D=%6.2f  H-ene=%6.2f  Sym=  (%s-%s)\n" % \
+          (self.count, thisatom.residue.resSeq,thisatom.residue.name,thisatom.residue.resSeq, thisatom.residue.chainID,thisatom.name,thatatom.residue.resSeq,thatatom.residue.name,thatatom.residue.resSeq, thatatom.residue.chainID,thatatom.name, thisdist, hscore, thisBstring, thatBstring)) 
+
+    def finish(self):
+        self.routines.write("\n")
+        PairAnalysis.finish(self)
+
+def create_analysis(routines, outroot, options):
+    """
+        Returns the analysis that writes the contact list, so that it
+        can share a pass over the atoms with the analyses of other extensions.
+    """
+    return ContactAnalysis(routines, open(outroot + ".con", "w"))
+
+def run_extension(routines, outroot, options):
+    """
+        Print a list of contacts.
 
-    routines.write("\n")
-    outfile.close()
+        Parameters
+            routines:  A link to the routines object
+            outroot:   The root of the output name
+            options:   options object 
+    """
+    runAnalyses(routines.protein, [create_analysis(routines, outroot, options)])
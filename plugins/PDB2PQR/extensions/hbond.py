@@ -28,7 +28,7 @@ __author__ = "Todd Dolinsky, Michael J Bradley, Julie Mitchell, and Kyle Monson"
 #1155-1173, 2008.  http://dx.doi.org/10.1016/j.jmb.2008.03.010
 
 from ..src.utilities import distance, getAngle
-from ..src.routines import Cells
+from ..src.analysis import PairAnalysis, runAnalyses
 from math import cos
 from ..extensions import extOutputHelper
 
@@ -59,88 +59,118 @@ def _residueString(residue, name):
     return '%4d %-4s (%4d  ) %s     %-4s' % \
         (residue.resSeq, residue.name, residue.resSeq, residue.chainID, name)
 
-def create_hbond_output(routines, outfile, whatif=False, 
-                                           angleCutoff=ANGLE_CUTOFF, 
-                                           distanceCutoff=DIST_CUTOFF, 
-                                           oldDistanceMethod=False):
-
-    routines.write("Printing hydrogen bond list...\n")
-    
-    output = extOutputHelper(routines, outfile)
-    
-    cellsize = int(distanceCutoff + 1.0 + 1.0) 
-    protein = routines.protein
-    routines.setDonorsAndAcceptors()
-    routines.cells = Cells(cellsize)
-    routines.cells.assignCells(protein)
-
-    for donor in protein.getAtoms():
-
-        # Grab the list of donors
-        if not donor.hdonor: 
-            continue
-        donorhs = []
-        for bond in donor.bonds:
-            if bond.isHydrogen(): 
-                donorhs.append(bond)
-        if donorhs == []: 
-            continue
-
-        # For each donor, grab all acceptors
-        closeatoms = routines.cells.getNearCells(donor)
-        for acc in closeatoms:
-            if not acc.hacceptor: 
+class HbondAnalysis(PairAnalysis):
+    """
+    Finds the hydrogen bonds among the pairs of donors and acceptors
+    """
+    def __init__(self, routines, outfile, whatif=False, 
+                                          angleCutoff=ANGLE_CUTOFF, 
+                                          distanceCutoff=DIST_CUTOFF, 
+                                          oldDistanceMethod=False):
+        routines.write("Printing hydrogen bond list...\n")
+        routines.setDonorsAndAcceptors()
+        
+        self.routines = routines
+        self.output = extOutputHelper(routines, outfile)
+        self.whatif = whatif
+        self.angleCutoff = angleCutoff
+        self.distanceCutoff = distanceCutoff
+        self.oldDistanceMethod = oldDistanceMethod
+        
+        # Grab the list of hydrogens of each donor
+        self.donorhs = {}
+        longest = 0.0
+        for donor in routines.protein.getAtoms():
+            if not donor.hdonor: 
                 continue
-            if donor.residue == acc.residue: 
+            donorhs = [bond for bond in donor.bonds if bond.isHydrogen()]
+            if donorhs == []: 
                 continue
-            
-            #TODO: do we need to do this for plain hbond stuff?
-            if whatif and (donor.residue.chainID == acc.residue.chainID): 
+            self.donorhs[donor] = donorhs
+            for donorh in donorhs:
+                longest = max(longest, distance(donor.getCoords(), donorh.getCoords()))
+        
+        # The old method measures from the hydrogen, which can be up to a
+        # bond length further from the acceptor than the donor is
+        if oldDistanceMethod:
+            PairAnalysis.__init__(self, distanceCutoff + longest)
+        else:
+            PairAnalysis.__init__(self, distanceCutoff)
+
+    def isQuery(self, atom):
+        return atom in self.donorhs
+
+    def isPartner(self, atom):
+        return bool(atom.hacceptor)
+
+    def addPair(self, donor, acc, dist):
+        if donor.residue == acc.residue: 
+            return
+        
+        #TODO: do we need to do this for plain hbond stuff?
+        if self.whatif and (donor.residue.chainID == acc.residue.chainID): 
+            return
+        
+        for donorh in self.donorhs[donor]:
+
+            # Do old style distance check       
+            if self.oldDistanceMethod:
+                dist = distance(donorh.getCoords(), acc.getCoords())
+                if dist > self.distanceCutoff: 
+                    continue
+                
+            # Do angle check
+            angle = getAngle(acc.getCoords(), donor.getCoords(), donorh.getCoords())
+            if angle > self.angleCutoff: 
                 continue
             
-            # Do new style distance check
-            if not oldDistanceMethod:
-                dist = distance(donor.getCoords(), acc.getCoords())
-                if dist > distanceCutoff:
+            if self.whatif:
+                if (donor.tempFactor > 60.0): 
                     continue
-            
-            for donorh in donorhs:
-
-                # Do old style distance check       
-                if oldDistanceMethod:
-                    dist = distance(donorh.getCoords(), acc.getCoords())
-                    if dist > distanceCutoff: 
-                        continue
-                    
-                # Do angle check
-                angle = getAngle(acc.getCoords(), donor.getCoords(), donorh.getCoords())
-                if angle > angleCutoff: 
+                if (acc.tempFactor > 60.0): 
                     continue
                 
-                if whatif:
-                    if (donor.tempFactor > 60.0): 
-                        continue
-                    if (acc.tempFactor > 60.0): 
-                        continue
-                    
-                    thisBstring='B' if donor.isBackbone() else 'S'
-                    thatBstring='B' if acc.isBackbone() else 'S'
-
-                    score= (1.7/dist) * cos(angle * 3.142 / 180.0)
-                    output.write(_residueString(donor.residue, donor.name))
-                    output.write('-> ')
-                    output.write(_residueString(acc.residue, acc.name))
-                    output.write('Sym=   1 Val= %6.3lf  DA=%6.2f  DHA=%6.2f (%s-%s)\n' % 
-                                 (score, dist, angle, thisBstring, thatBstring))
-#                    outfile.write("%4d %-4s (%4d  ) %s     %-4s-> %4d %-4s (%4d  ) %s     %-4sSym=   1 Val= %6.3lf  DA=%6.2f  DHA=%6.2f (%s-%s)\n" % \
-#                      (donor.residue.resSeq,donor.residue.name,donor.residue.resSeq, donor.residue.chainID,donor.name,acc.residue.resSeq,acc.residue.name,acc.residue.resSeq, acc.residue.chainID,acc.name, score, dist, angle, thisBstring, thatBstring)) 
-
-                else:
-                    s = "Donor: %s %s\tAcceptor: %s %s\tdist: %.2f\tAngle: %.2f\n" % \
-                        (donor.residue, donor.name, acc.residue, acc.name, dist, angle)
-                    output.write(s) 
-                    
-    routines.write("\n")
+                thisBstring='B' if donor.isBackbone() else 'S'
+                thatBstring='B' if acc.isBackbone() else 'S'
+
+                score= (1.7/dist) * cos(angle * 3.142 / 180.0)
+                self.output.write(_residueString(donor.residue, donor.name))
+                self.output.write('-> ')
+                self.output.write(_residueString(acc.residue, acc.name))
+                self.output.write('Sym=   1 Val= %6.3lf  DA=%6.2f  DHA=%6.2f (%s-%s)\n' % 
+                                  (score, dist, angle, thisBstring, thatBstring))
+
+            else:
+                s = "Donor: %s %s\tAcceptor: %s %s\tdist: %.2f\tAngle: %.2f\n" % \
+                    (donor.residue, donor.name, acc.residue, acc.name, dist, angle)
+                self.output.write(s) 
+
+    def finish(self):
+        self.routines.write("\n")
+        PairAnalysis.finish(self)
+
+def create_hbond_output(routines, outfile, whatif=False, 
+                                           angleCutoff=ANGLE_CUTOFF, 
+                                           distanceCutoff=DIST_CUTOFF, 
+                                           oldDistanceMethod=False):
+
+    runAnalyses(routines.protein, [HbondAnalysis(routines, outfile, whatif=whatif, 
+                                                                   angleCutoff=angleCutoff,
+                                                                   distanceCutoff=distanceCutoff,
+                                                                   oldDistanceMethod=oldDistanceMethod)])
+
+def create_analysis(routines, outroot, options):
+    """
+        Returns the analysis that writes the hydrogen bond list, so that it
+        can share a pass over the atoms with the analyses of other extensions.
+    """
+    outfile = open(outroot + ".hbond", "w")
+    analysis = HbondAnalysis(routines, outfile, whatif=options.whatif, 
+                                                angleCutoff=options.angle_cutoff,
+                                                distanceCutoff=options.distance_cutoff,
+                                                oldDistanceMethod=options.old_distance_method)
+    analysis.outfile = outfile
+    return analysis
 
 def run_extension(routines, outroot, options):
     """
@@ -158,4 +188,3 @@ def run_extension(routines, outroot, options):
                                                angleCutoff=options.angle_cutoff,
                                                distanceCutoff=options.distance_cutoff,
                                                oldDistanceMethod=options.old_distance_method)
-
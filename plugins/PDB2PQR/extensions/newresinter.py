@@ -7,11 +7,12 @@
 __date__ = "21 October 2011"
 __authors__ = "Kyle Monson and Emile Hogan"
 
-import extensions
-from ..src.hydrogens import Optimize
+from ..extensions import extOutputHelper
+from ..src.hydrogens import PairEnergyTable
 #itertools FTW!
-from itertools import product, permutations, count
+from itertools import permutations, count
 from ..src.hydrogens import hydrogenRoutines
+from ..src.sweep import sweepCombinations
 
 #Here are the Ri -> [Ri0, Ri1] maps:
 #ARG -> [{AR0}, {ARG}]
@@ -48,6 +49,34 @@ for tsSet in _titrationSets:
 #loose ends.
 _titrationSetsMap['HIS'] = _titrationSetsMap['HSD']
 _titrationSetsMap['CYM'] = _titrationSetsMap['CYS']
+
+def addExtensionOptions(extensionGroup):
+    """
+        Add options.
+    """
+    extensionGroup.add_option('--newresinter_cutoff',
+                              dest='newresinter_cutoff',
+                              type='float',
+                              metavar='DIST',
+                              default=None,
+                              help=
+'''Only count the interaction between a donor and an acceptor whose heavy atoms are
+within DIST angstroms of each other, and skip pairs of residues that are too far
+apart to have any.  Much faster on large proteins, but the small energies of more
+distant pairs are left out.  By default every pair is counted.''')
+
+    extensionGroup.add_option('--newresinter_processes',
+                              dest='newresinter_processes',
+                              type='int',
+                              metavar='NUM',
+                              default=None,
+                              help=
+'''Run the titration state combinations in NUM worker processes.  Every
+combination then starts from the same prepared protein rather than from the atoms
+left by the previous combination, so results can differ slightly unless used with
+--noopt and --nodebump.  Finished combinations are kept in
+{output-path}.newresinter.checkpoint, and an interrupted run restarted with the
+same input and options resumes from there.''')
         
 def usage():
     """
@@ -57,24 +86,47 @@ def usage():
     return txt
 
 def run_extension(routines, outroot, options):
+    # The cached energies are only good for this protein
+    pairEnergyTable = PairEnergyTable(getattr(options, 'newresinter_cutoff', None))
+
     outname = outroot + ".newresinter"
     with open(outname, "w") as outfile:
-        processor = ResInter(routines, outfile, options)
+        processor = ResInter(routines, outfile, options, checkpoint=outname + ".checkpoint",
+                             pairEnergyTable=pairEnergyTable)
         processor.generate_all()
         processor.write_resinter_output()
 
 class ResInter(object):
-    def __init__(self, routines, outfile, options):
+    def __init__(self, routines, outfile, options, checkpoint=None, pairEnergyTable=None):
+        if pairEnergyTable is None:
+            pairEnergyTable = PairEnergyTable(getattr(options, 'newresinter_cutoff', None))
+        self.pairEnergyTable = pairEnergyTable
         self.pairEnergyResults = {}
+        self.checkpoint = checkpoint
         self.combinationCount = 0
         self.totalCombinations = 0
         self.options = options
-        self.output = extensions.extOutputHelper(routines, outfile)
+        self.output = extOutputHelper(routines, outfile)
         self.routines = routines
 
-    def save_interation_energy(self, first, second):
-        energy = get_residue_interaction_energy(first, second)
+    def is_new_pair(self, first, second):
+        """
+        Returns True if the energy of this pair of residues, in their
+        current titration states, has not been saved yet.
+        """
+        return (str(first) + ' ' + str(second)) not in self.pairEnergyResults
+
+    def save_interation_energy(self, first, second, energy=None):
+        """
+        Saves the interaction energy of a pair the first time it is tested.
+        The energy is only computed here, if not given, when it is needed.
+        """
         pairText = str(first) + ' ' + str(second)
+        if energy is None and pairText not in self.pairEnergyResults:
+            energy = get_residue_interaction_energy(first, second, self.pairEnergyTable)
+        self.save_pair_energy(pairText, energy)
+
+    def save_pair_energy(self, pairText, energy):
         if pairText in self.pairEnergyResults:            
             txt = '#%s re-tested!!! LOLWAT?\n' % pairText
             self.output.write(txt)             
@@ -87,23 +139,33 @@ class ResInter(object):
         Writes out the residue interaction energy for each possible
         residue pair in the protein.
         """
-        residuepairs = permutations(self.routines.protein.getResidues(), 2)
+        residues = self.routines.protein.getResidues()
+        matrix = self.pairEnergyTable.getInteractionMatrix(residues)
         
-        for pair in residuepairs:
-            self.save_interation_energy(pair[0], pair[1])
+        for i, j in permutations(range(len(residues)), 2):
+            self.save_interation_energy(residues[i], residues[j], matrix.get((i, j), 0.0))
             
     def save_one_with_all_interaction_energies(self, i):
         """
         Writes out the residue interaction energy for each possible
         residue pair in the protein.
         """
-        residues = list(self.routines.protein.getResidues())
+        residues = self.routines.protein.getResidues()
         target = residues[i]
-        del residues[i]        
+
+        # Titration states repeat between combinations, so only the row
+        #  and column of the residue that changed can hold new pairs, and
+        #  often none of those are new either
+        matrix = {}
+        if any(self.is_new_pair(target, residue) or self.is_new_pair(residue, target)
+               for residue in residues if residue is not target):
+            matrix = self.pairEnergyTable.getInteractionMatrix(residues, rows=[i])
         
-        for residue in residues:
-            self.save_interation_energy(target, residue)
-            self.save_interation_energy(residue, target)
+        for j, residue in enumerate(residues):
+            if j == i:
+                continue
+            self.save_interation_energy(target, residue, matrix.get((i, j), 0.0))
+            self.save_interation_energy(residue, target, matrix.get((j, i), 0.0))
             
     def save_pair_interaction_energies(self, i, j):
         """
@@ -115,6 +177,80 @@ class ResInter(object):
         self.save_interation_energy(residues[i], residues[j])
         self.save_interation_energy(residues[j], residues[i])
             
+    def get_interaction_energies(self, i=None, j=None):
+        """
+        Returns a list of [pair text, energy] for the pairs saved by
+        save_all_residue_interaction_energies if i is None, by
+        save_one_with_all_interaction_energies if only j is None, and by
+        save_pair_interaction_energies otherwise, in the same order.
+        """
+        residues = list(self.routines.protein.getResidues())
+        if j is not None:
+            pairs = [(i, j), (j, i)]
+            return [[str(residues[first]) + ' ' + str(residues[second]),
+                     get_residue_interaction_energy(residues[first], residues[second],
+                                                    self.pairEnergyTable)]
+                    for first, second in pairs]
+        
+        if i is None:
+            matrix = self.pairEnergyTable.getInteractionMatrix(residues)
+            pairs = permutations(range(len(residues)), 2)
+        else:
+            matrix = self.pairEnergyTable.getInteractionMatrix(residues, rows=[i])
+            pairs = []
+            for k in range(len(residues)):
+                if k != i:
+                    pairs.extend([(i, k), (k, i)])
+        
+        return [[str(residues[first]) + ' ' + str(residues[second]), matrix.get((first, second), 0.0)]
+                for first, second in pairs]
+            
+    def sweep_all(self):
+        """
+        Runs every combination in worker processes, each starting from
+        the prepared protein, and saves the energies in the order of the
+        combinations.
+        """
+        residues = self.routines.protein.getResidues()
+        tasks = [[get_residue_titration_set_protonated(residues), None, None]]
+        for residueSet, i in residue_set_single_unprotonated_combinations(residues):
+            tasks.append([residueSet, i, None])
+        for residueSet, i, j in residue_set_pair_unprotonated_combinations(residues):
+            tasks.append([residueSet, i, j])
+        
+        def run_combination(routines, task):
+            number, (residueSet, i, j) = task
+            self.combinationCount = number
+            self.process_residue_set(residueSet, 
+                                     clean = self.options.clean,
+                                     neutraln = self.options.neutraln,
+                                     neutralc = self.options.neutralc,
+                                     ligand = self.options.ligand,
+                                     assign_only = self.options.assign_only,
+                                     chain = self.options.chain,
+                                     debump = self.options.debump,
+                                     opt = self.options.opt)
+            return self.get_interaction_energies(i, j)
+        
+        #The results depend on these as well as on the protein.
+        settings = {'clean': self.options.clean,
+                    'neutraln': self.options.neutraln,
+                    'neutralc': self.options.neutralc,
+                    'ligand': self.options.ligand,
+                    'assign_only': self.options.assign_only,
+                    'chain': self.options.chain,
+                    'debump': self.options.debump,
+                    'opt': self.options.opt,
+                    'cutoff': self.pairEnergyTable.cutoff}
+        
+        for index, energies in sweepCombinations(self.routines, enumerate(tasks), run_combination,
+                                                 processes = self.options.newresinter_processes,
+                                                 checkpoint = self.checkpoint,
+                                                 settings = settings):
+            self.combinationCount = index + 1
+            for pairText, energy in energies:
+                self.save_pair_energy(pairText, energy)
+            
     def create_all_protonated(self):
         residueSet = get_residue_titration_set_protonated(self.routines.protein.getResidues())
         self.process_residue_set(residueSet, 
@@ -183,6 +319,13 @@ class ResInter(object):
         
         self.count_combinations()
         
+        #Most residues keep their hydrogens from one combination to the next.
+        self.routines.enableHydrogenReplay()
+        
+        if getattr(self.options, 'newresinter_processes', None) is not None:
+            self.sweep_all()
+            return
+        
         #Phase 1: Everything protonated
         self.create_all_protonated()
         
@@ -332,12 +475,14 @@ def residue_set_pair_unprotonated_combinations(residues):
                     yield result, i, j
 
 
-def get_residue_interaction_energy(residue1, residue2):
+def get_residue_interaction_energy(residue1, residue2, pairEnergyTable=None):
     """
     Returns to total energy of every atom pair between the two residues.
     
     Uses Optimize.getPairEnergy and it's donor/accepter model 
-    to determine energy.
+    to determine energy. The pair energy matrices are cached by
+    geometry in pairEnergyTable, which should only be shared by
+    the combinations of one protein.
     
     residue1 - "donor" residue
     residue2 - "acceptor" residue
@@ -345,10 +490,8 @@ def get_residue_interaction_energy(residue1, residue2):
     THE RESULTS OF THIS FUNCTION ARE NOT SYMMETRIC. Swapping 
     residue1 and residue2 will not always produce the same result.
     """
-    energy = 0.0
-    for pair in product(residue1.getAtoms(), residue2.getAtoms()):
-        energy += Optimize.getPairEnergy(pair[0], pair[1])
-        
-    return energy
+    if pairEnergyTable is None:
+        pairEnergyTable = PairEnergyTable()
+    return pairEnergyTable.getInteractionEnergy(residue1, residue2)
     
 
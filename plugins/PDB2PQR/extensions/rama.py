@@ -10,8 +10,7 @@
 __date__ = "17 February 2006"
 __author__ = "Mike Bradley, Todd Dolinsky"
   
-from ..src.utilities import getDihedral
-import extensions
+from ..extensions import extOutputHelper
 
 def addExtensionOptions(extensionGroup):
     """
@@ -37,50 +36,64 @@ def create_rama_output(routines, outfile, outputtype='rama'):
     routines.write(verboseHeader)
     routines.write('-' * len(verboseHeader) + '\n')
     
-    output = extensions.extOutputHelper(routines, outfile)
+    output = extOutputHelper(routines, outfile)
 
     # Initialize some variables
 
     protein = routines.protein
 
+    # Gather the backbone atoms first so every angle is calculated in one
+    # batch over the protein coordinates
+
+    residues = []
+    phis = []
+    psis = []
     for residue in protein.getResidues():
         if residue.hasAtom("N"): 
-            ncoords = residue.getAtom("N").getCoords()
+            natom = residue.getAtom("N")
         else: 
             continue
 
         if residue.hasAtom("CA"): 
-            cacoords = residue.getAtom("CA").getCoords()
+            caatom = residue.getAtom("CA")
         else: 
             continue
 
         if residue.hasAtom("C"): 
-            ccoords = residue.getAtom("C").getCoords()
+            catom = residue.getAtom("C")
         else: 
             continue
 
         try:
             if residue.peptideN != None:
-                pepncoords = residue.peptideN.getCoords()
+                pepnatom = residue.peptideN
             else: 
                 continue
 
             if residue.peptideC != None:
-                pepccoords = residue.peptideC.getCoords()
+                pepcatom = residue.peptideC
             else: 
                 continue
         except AttributeError: # Non amino acids
             continue
 
+        residues.append(residue)
+        phis.append((pepcatom, natom, caatom, catom))
+        psis.append((natom, caatom, catom, pepnatom))
+
+    if outputtype in ('rama', 'phi'):
+        phis = protein.getDihedralAngles(phis)
+    if outputtype in ('rama', 'psi'):
+        psis = protein.getDihedralAngles(psis)
+
+    for i, residue in enumerate(residues):
         output.write(str(residue))
         
         if outputtype in ('rama', 'phi'):
-            phi = getDihedral(pepccoords, ncoords, cacoords, ccoords)
-            output.write("\t%.4f" % phi)
+            output.write("\t%.4f" % phis[i])
             
         if outputtype in ('rama', 'psi'):
-            psi = getDihedral(ncoords, cacoords, ccoords, pepncoords)
-            output.write("\t%.4f" % psi)
+            output.write("\t%.4f" % psis[i])
             
         output.write('\n')
 
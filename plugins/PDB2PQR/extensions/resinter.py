@@ -7,12 +7,13 @@
 __date__ = "21 October 2011"
 __authors__ = "Kyle Monson and Emile Hogan"
 
-import extensions
-from ..src.hydrogens import Optimize
+from ..extensions import extOutputHelper
+from ..src.hydrogens import PairEnergyTable
 #itertools FTW!
-from itertools import product, permutations, count
+from itertools import permutations, count
 from collections import defaultdict
 from ..src.hydrogens import hydrogenRoutines
+from ..src.sweep import sweepCombinations
 
 _titrationSets = (('ARG','AR0'),
                   ('ASP', 'ASH'),
@@ -35,7 +36,6 @@ for tsSet in _titrationSets:
 _titrationSetsMap['HIS'] = _titrationSetsMap['HSD']
 _titrationSetsMap['CYM'] = _titrationSetsMap['CYS']
 
-_pairEnergyResults = {}
 #If the residue pair energy for a specific pair changes less than this ignore it.
 PAIR_ENERGY_EPSILON = 1.0e-14
 
@@ -66,6 +66,30 @@ Results with --noopt should be the same as --residue_combinations. Runs consider
 Use without --noopt to discover how hydrogen optimization affects residue 
 interaction energies via the warnings in the output.''') 
 
+    extensionGroup.add_option('--resinter_cutoff',
+                              dest='resinter_cutoff',
+                              type='float',
+                              metavar='DIST',
+                              default=None,
+                              help=
+'''Only count the interaction between a donor and an acceptor whose heavy atoms are
+within DIST angstroms of each other, and skip pairs of residues that are too far
+apart to have any.  Much faster on large proteins, but the small energies of more
+distant pairs are left out.  By default every pair is counted.''')
+
+    extensionGroup.add_option('--resinter_processes',
+                              dest='resinter_processes',
+                              type='int',
+                              metavar='NUM',
+                              default=None,
+                              help=
+'''Run the titration state combinations of --residue_combinations or
+--all_residue_combinations in NUM worker processes.  Every combination then starts
+from the same prepared protein rather than from the atoms left by the previous
+combination, so results can differ slightly unless used with --noopt and --nodebump.
+Finished combinations are kept in {output-path}.resinter.checkpoint, and an
+interrupted run restarted with the same input and options resumes from there.''')
+
 def usage():
     """
     Returns usage text for resinter.
@@ -162,12 +186,14 @@ def pairwiseCombinations(initialList):
                 
     return R
     
-def get_residue_interaction_energy(residue1, residue2):
+def get_residue_interaction_energy(residue1, residue2, pairEnergyTable=None):
     """
     Returns to total energy of every atom pair between the two residues.
     
     Uses Optimize.getPairEnergy and it's donor/accepter model 
-    to determine energy.
+    to determine energy. The pair energy matrices are cached by
+    geometry in pairEnergyTable, which should only be shared by
+    the combinations of one protein.
     
     residue1 - "donor" residue
     residue2 - "acceptor" residue
@@ -175,25 +201,43 @@ def get_residue_interaction_energy(residue1, residue2):
     THE RESULTS OF THIS FUNCTION ARE NOT SYMMETRIC. Swapping 
     residue1 and residue2 will not always produce the same result.
     """
-    energy = 0.0
-    for pair in product(residue1.getAtoms(), residue2.getAtoms()):
-        energy += Optimize.getPairEnergy(pair[0], pair[1])
+    if pairEnergyTable is None:
+        pairEnergyTable = PairEnergyTable()
+    return pairEnergyTable.getInteractionEnergy(residue1, residue2)
+
+def get_residue_interaction_energies(residues, pairEnergyTable):
+    """
+    Returns a list of [pair text, energy] for each possible residue
+    pair in the protein.
+    """
+    residues = list(residues)
+    matrix = pairEnergyTable.getInteractionMatrix(residues)
+    
+    energies = []
+    for i, j in permutations(range(len(residues)), 2):
+        pairText = str(residues[i]) + ' ' + str(residues[j])
+        energies.append([pairText, matrix.get((i, j), 0.0)])
         
-    return energy
+    return energies
 
-def save_residue_interaction_energies(residues, output):
+def save_residue_interaction_energies(residues, output, pairEnergyTable, pairEnergyResults):
     """
     Writes out the residue interaction energy for each possible
     residue pair in the protein.
     """
-    residuepairs = permutations(residues, 2)
-    
-    for pair in residuepairs:
-        energy = get_residue_interaction_energy(pair[0], pair[1])
-        pairText = str(pair[0]) + ' ' + str(pair[1])
-        if pairText in _pairEnergyResults:
+    merge_residue_interaction_energies(get_residue_interaction_energies(residues, pairEnergyTable),
+                                       output, pairEnergyResults)
+
+def merge_residue_interaction_energies(energies, output, pairEnergyResults):
+    """
+    Saves each [pair text, energy] that has not been seen before in
+    pairEnergyResults, and warns about pairs that were re-tested with a
+    different energy.
+    """
+    for pairText, energy in energies:
+        if pairText in pairEnergyResults:
             
-            oldEnergy = _pairEnergyResults[pairText]
+            oldEnergy = pairEnergyResults[pairText]
             energyDiff = oldEnergy - energy
             if abs(energyDiff) > PAIR_ENERGY_EPSILON:
                 txt = '#%s re-tested' % pairText
@@ -208,7 +252,7 @@ def save_residue_interaction_energies(residues, output):
                  
             continue
         
-        _pairEnergyResults[pairText] = energy
+        pairEnergyResults[pairText] = energy
                     
         
 def get_residue_titration_sets(residues):
@@ -221,7 +265,8 @@ def get_residue_titration_sets(residues):
         
     return result
 
-def process_residue_set(residueSet, routines, output, clean = False,
+def process_residue_set(residueSet, routines, output, pairEnergyTable, pairEnergyResults,
+                                                      clean = False,
                                                       neutraln = False,
                                                       neutralc = False,
                                                       ligand = None,
@@ -229,6 +274,31 @@ def process_residue_set(residueSet, routines, output, clean = False,
                                                       chain = False,
                                                       debump = True,
                                                       opt = True):
+    prepare_residue_set(residueSet, routines, 
+                        clean = clean,
+                        neutraln = neutraln,
+                        neutralc = neutralc,
+                        ligand = ligand,
+                        assign_only = assign_only,
+                        chain = chain,
+                        debump = debump,
+                        opt = opt)
+        
+    save_residue_interaction_energies(routines.protein.getResidues(), output,
+                                      pairEnergyTable, pairEnergyResults)
+
+def prepare_residue_set(residueSet, routines, clean = False,
+                                              neutraln = False,
+                                              neutralc = False,
+                                              ligand = None,
+                                              assign_only = False,
+                                              chain = False,
+                                              debump = True,
+                                              opt = True):
+    """
+    Remaps the residues of the protein to the titration states in
+    residueSet and runs PDB2PQR on the result.
+    """
     routines.write(str(residueSet)+'\n')
     
     routines.removeHydrogens()
@@ -279,14 +349,57 @@ def process_residue_set(residueSet, routines, output, clean = False,
         # Special for GLH/ASH, since both conformations were added
         hydRoutines.cleanup()
         
-    save_residue_interaction_energies(routines.protein.getResidues(), output)        
+
+def sweep_residue_combinations(routines, output, options, combinationGenerator, checkpoint,
+                               pairEnergyTable, pairEnergyResults):
+    """
+    Runs the combinations in worker processes, each starting from the 
+    prepared protein, and saves their energies in the order of the
+    combinations. Returns the number of combinations.
+    """
+    def run_combination(routines, residueSet):
+        prepare_residue_set(residueSet, routines, 
+                            clean = options.clean,
+                            neutraln = options.neutraln,
+                            neutralc = options.neutralc,
+                            ligand = options.ligand,
+                            assign_only = options.assign_only,
+                            chain = options.chain,
+                            debump = options.debump,
+                            opt = options.opt)
+        return get_residue_interaction_energies(routines.protein.getResidues(), pairEnergyTable)
+    
+    #The results depend on these as well as on the protein.
+    settings = {'clean': options.clean,
+                'neutraln': options.neutraln,
+                'neutralc': options.neutralc,
+                'ligand': options.ligand,
+                'assign_only': options.assign_only,
+                'chain': options.chain,
+                'debump': options.debump,
+                'opt': options.opt,
+                'cutoff': pairEnergyTable.cutoff}
+    
+    count = 0
+    for index, energies in sweepCombinations(routines, combinationGenerator, run_combination,
+                                             processes = options.resinter_processes,
+                                             checkpoint = checkpoint,
+                                             settings = settings):
+        count += 1
+        merge_residue_interaction_energies(energies, output, pairEnergyResults)
         
+    return count
 
-def write_all_residue_interaction_energies_combinations(routines, output, options, all_residue_combinations=False):
+def write_all_residue_interaction_energies_combinations(routines, output, options, all_residue_combinations=False,
+                                                        checkpoint=None, pairEnergyTable=None):
     """
     For every titration state combination of residue output the 
     interaction energy for all possible residue pairs. 
     """
+    if pairEnergyTable is None:
+        pairEnergyTable = PairEnergyTable()
+    pairEnergyResults = {}
+    
     residueNamesList = get_residue_titration_sets(routines.protein.getResidues())
     
     routines.write("Testing the following combinations\n")
@@ -298,12 +411,22 @@ def write_all_residue_interaction_energies_combinations(routines, output, option
     if all_residue_combinations:
         combinationGenerator = combinations(residueNamesList)
     else:
-        combinationGenerator = pairwiseCombinations(residueNamesList)
+        #Sorted, since the order of a set changes from run to run.
+        combinationGenerator = sorted(pairwiseCombinations(residueNamesList))
+    
+    #Most residues keep their hydrogens from one combination to the next.
+    routines.enableHydrogenReplay()
+        
+    if getattr(options, 'resinter_processes', None) is not None:
+        count = sweep_residue_combinations(routines, output, options, combinationGenerator, checkpoint,
+                                           pairEnergyTable, pairEnergyResults)
+        combinationGenerator = ()
+    else:
+        count = 0
         
-    count = 0
     for residueSet in combinationGenerator:
         count += 1
-        process_residue_set(residueSet, routines, output, 
+        process_residue_set(residueSet, routines, output, pairEnergyTable, pairEnergyResults,
                             clean = options.clean,
                             neutraln = options.neutraln,
                             neutralc = options.neutralc,
@@ -313,31 +436,44 @@ def write_all_residue_interaction_energies_combinations(routines, output, option
                             debump = options.debump,
                             opt = options.opt)
         
-    for resultKey in sorted(_pairEnergyResults.keys()):
-        output.write(resultKey + ' ' + str(_pairEnergyResults[resultKey]) + '\n')
+    for resultKey in sorted(pairEnergyResults.keys()):
+        output.write(resultKey + ' ' + str(pairEnergyResults[resultKey]) + '\n')
     
     routines.write(str(count)+' residue combinations tried\n')
 
 def create_resinter_output(routines, outfile, options, 
                            residue_combinations=False,
-                           all_residue_combinations=False):
+                           all_residue_combinations=False,
+                           checkpoint=None,
+                           pairEnergyTable=None):
     """
     Output the interaction energy between each possible residue pair.
     """
     routines.write("Printing residue interaction energies...\n")
     
-    output = extensions.extOutputHelper(routines, outfile)
+    output = extOutputHelper(routines, outfile)
+    
+    if pairEnergyTable is None:
+        pairEnergyTable = PairEnergyTable(getattr(options, 'resinter_cutoff', None))
     
     if residue_combinations or all_residue_combinations:
         write_all_residue_interaction_energies_combinations(routines, output, options, 
-                                                            all_residue_combinations=all_residue_combinations)
+                                                            all_residue_combinations=all_residue_combinations,
+                                                            checkpoint=checkpoint,
+                                                            pairEnergyTable=pairEnergyTable)
     else:
-        save_residue_interaction_energies(routines.protein.getResidues(), output)
+        save_residue_interaction_energies(routines.protein.getResidues(), output,
+                                          pairEnergyTable, {})
     
 
 def run_extension(routines, outroot, options):
+    # The cached energies are only good for this protein
+    pairEnergyTable = PairEnergyTable(getattr(options, 'resinter_cutoff', None))
+
     outname = outroot + ".resinter"
     with open(outname, "w") as outfile:
         create_resinter_output(routines, outfile, options, 
                                residue_combinations=options.residue_combinations,
-                               all_residue_combinations=options.all_residue_combinations)
+                               all_residue_combinations=options.all_residue_combinations,
+                               checkpoint=outname + ".checkpoint",
+                               pairEnergyTable=pairEnergyTable)
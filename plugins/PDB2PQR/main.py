@@ -50,7 +50,7 @@ __author__ = "Todd Dolinsky, Nathan Baker, Jens Nielsen, Paul Czodrowski, Jan Je
 import string
 import sys
 import getopt
-from optparse import OptionParser, OptionGroup
+from optparse import OptionParser, OptionGroup, Values
 import os
 import time
 import copy
@@ -59,6 +59,7 @@ from .src import utilities
 from .src import structures
 from .src import routines
 from .src import protein
+from .src import datacache
 from .src.pdb import *
 from .src.utilities import *
 from .src.structures import *
@@ -193,7 +194,9 @@ def runPDB2PQR(pdblist, ff,
                usernames = None,
                ffout = None,
                commandLine=None,
-               include_old_header=False):
+               include_old_header=False,
+               processes=1,
+               topology=None):
     """
         Run the PDB2PQR Suite
 
@@ -227,6 +230,11 @@ def runPDB2PQR(pdblist, ff,
             commandLine:   command line used (if any) to launch the program. Included in output header.
             include_old_header: Include most of the PDB header in output.
             pdb2pka_params: parameters for running pdb2pka.
+            processes:     The number of processes to use for the stages that can be
+                           run on each chain separately.
+            topology:      If given, a dictionary that is filled with the finished protein
+                           so that models sharing its topology can reuse it, and with the
+                           reference distances that later runs can reuse.  See runPDB2PQRModels.
 
         Returns
             header:  The PQR file header (string)
@@ -279,12 +287,19 @@ def runPDB2PQR(pdblist, ff,
     else:
         myProtein = Protein(pdblist, myDefinition)
 
+    if topology is not None:
+        # Map the input serial numbers to atoms before they are renumbered
+        topology["atoms"] = dict((atom.serial, atom) for atom in myProtein.getAtoms())
+
     if verbose:
         print("Created protein object -")
         print("\tNumber of residues in protein: %s" % myProtein.numResidues())
         print("\tNumber of atoms in protein   : %s" % myProtein.numAtoms())
 
-    myRoutines = Routines(myProtein, verbose)
+    refdistances = None
+    if topology is not None:
+        refdistances = topology.setdefault("refdistances", {})
+    myRoutines = Routines(myProtein, verbose, refdistances=refdistances)
 
     for residue in myProtein.getResidues():
         multoccupancy = 0
@@ -314,6 +329,11 @@ def runPDB2PQR(pdblist, ff,
         if verbose:
             print("Total time taken: %.2f seconds\n" % (time.time() - start))
 
+        if topology is not None:
+            topology.update(protein=myProtein, routines=myRoutines,
+                            hitlist=myProtein.getAtoms(), gaps=[],
+                            header=header, missed=None)
+
         #Be sure to include None for missed ligand residues
         return header, lines, None
 
@@ -339,7 +359,7 @@ def runPDB2PQR(pdblist, ff,
         elif ph_calc_method == 'pdb2pka':
             myRoutines.runPDB2PKA(ph, ff, pdblist, ligand, verbose, ph_calc_options)
 
-        myRoutines.addHydrogens()
+        myRoutines.addHydrogens(processes)
 
         myhydRoutines = hydrogenRoutines(myRoutines)
 
@@ -448,11 +468,255 @@ def runPDB2PQR(pdblist, ff,
     #     module.run_extension(myRoutines, outroot, extensionOptions)
 
 
+    if topology is not None:
+        topology.update(protein=myProtein, routines=myRoutines,
+                        hitlist=hitlist, gaps=myRoutines.findBackboneGaps(),
+                        header=header, missed=missedligandresidues)
+
     if verbose:
         print("Total time taken: %.2f seconds\n" % (time.time() - start))
 
     return header, lines, missedligandresidues
 
+def runPDB2PQRModels(models, ff, **kwargs):
+    """
+        Run the PDB2PQR Suite on every model of an NMR ensemble or a
+        trajectory, one model at a time.
+
+        With assign_only or clean the result only depends on which atoms are
+        present, so a model with the same topology as the one before it reuses
+        that protein and only has its coordinates replaced.  Otherwise the
+        added hydrogens and protonation states depend on the coordinates, and
+        each model is run in full.  The definition and forcefield files are
+        still only parsed once, through the data cache, and the reference
+        distances, which only depend on the atoms and bonds of a residue
+        (see Routines.setReferenceDistance), are carried over from model
+        to model.
+
+        Arguments:
+            models:  (model, pdblist) pairs, as yielded by iterModels
+            ff:      The name of the forcefield (string)
+
+        Keyword Arguments:
+            The same as runPDB2PQR.  The userff, usernames and ligand files
+            are read once, and each model is given its own copy of them.
+            The topology dictionary, if given, holds the protein of the
+            model just yielded.  With keep set, every model is run in full,
+            so that the protein of a model is never changed by the models
+            after it.
+
+        Yields (model, header, lines, missedligandresidues)
+            model:   The model serial number (int)
+            The rest are as returned by runPDB2PQR.
+    """
+    keep = kwargs.pop("keep", False)
+    reuse = (kwargs.get("assign_only") or kwargs.get("clean")) and not keep
+    chain = kwargs.get("chain", False)
+    topology = kwargs.pop("topology", None)
+    if topology is None:
+        topology = {}
+    lastkey = None
+
+    # Reading a forcefield or ligand closes its file, so keep the contents
+    files = {}
+    for name in ("userff", "usernames", "ligand"):
+        if kwargs.get(name) is not None:
+            files[name] = kwargs[name].read()
+            kwargs[name].close()
+
+    for model, pdblist in models:
+        for name, contents in files.items():
+            kwargs[name] = StringIO(contents)
+
+        key = None
+        if reuse and kwargs.get("ligand") is None:
+            key = getTopologyKey(pdblist)
+
+        if key is not None and key == lastkey:
+            atoms = topology["atoms"]
+            for record in pdblist:
+                if isinstance(record, (ATOM, HETATM)) and record.serial in atoms:
+                    atom = atoms[record.serial]
+                    atom.x = record.x
+                    atom.y = record.y
+                    atom.z = record.z
+
+            # A backbone gap changes the warnings in the header
+            if kwargs.get("clean") or \
+               topology["routines"].findBackboneGaps() == topology["gaps"]:
+                lines = topology["protein"].printAtoms(topology["hitlist"], chain)
+                yield model, topology["header"], lines, topology["missed"]
+                continue
+
+        header, lines, missedligands = runPDB2PQR(pdblist, ff, topology=topology, **kwargs)
+
+        # Serial numbers must be unique for the coordinates to be mapped back
+        if len(topology["atoms"]) == topology["protein"].numAtoms():
+            lastkey = key
+        else:
+            lastkey = None
+
+        yield model, header, lines, missedligands
+
+def getRunOptions(options):
+    """
+        Turn a dictionary of options, named as in options.json, into the
+        keyword arguments of runPDB2PQR
+
+        Parameters
+            options:  The options (dict)
+        Returns
+            kwargs:   The keyword arguments (dict)
+    """
+    clean = options.get("clean", False)
+    assign_only = options.get("assign_only", False)
+    ff = options.get("ff")
+    if not clean and ff is None and options.get("userff") is None:
+        raise PDBInputError("One of ff, userff or clean must be given!")
+
+    ph = options.get("with_ph", 7.0)
+    ph_calc_method = options.get("ph_calc_method")
+    ph_calc_options = None
+    if ph_calc_method == "propka":
+        ph_calc_options = utilities.createPropkaOptions(ph,
+                              verbose=options.get("propka_verbose", False),
+                              reference=options.get("propka_reference", "neutral"))
+    elif ph_calc_method == "pdb2pka":
+        ph_calc_options = {"output_dir": options.get("pdb2pka_out", "pdb2pka_output"),
+                           "clean_output": not options.get("pdb2pka_resume", False),
+                           "pdie": options.get("pdie", 8),
+                           "sdie": options.get("sdie", 80),
+                           "pairene": options.get("pairne", 1.0)}
+
+    # Read the user files here, so that no open file outlives the run
+    userff = usernames = None
+    if not clean:
+        if options.get("userff") is not None:
+            with open(options["userff"], "r") as userfffile:
+                userff = StringIO(userfffile.read())
+        if options.get("usernames") is not None:
+            with open(options["usernames"], "r") as usernamesfile:
+                usernames = StringIO(usernamesfile.read())
+
+    return dict(ph = ph,
+                verbose = options.get("verbose", False),
+                ph_calc_method = ph_calc_method,
+                ph_calc_options = ph_calc_options,
+                clean = clean,
+                neutraln = options.get("neutraln", False),
+                neutralc = options.get("neutralc", False),
+                assign_only = assign_only,
+                chain = options.get("chain", False),
+                drop_water = options.get("drop_water", False),
+                debump = not (options.get("nodebump", False) or assign_only or clean),
+                opt = not options.get("noopt", False),
+                typemap = options.get("typemap", False),
+                userff = userff,
+                usernames = usernames,
+                ffout = options.get("ffout"),
+                include_old_header = options.get("include_header", False),
+                processes = options.get("processes", 1))
+
+def processPDB(pdblist, options, keep=False, data=None):
+    """
+        Run PDB2PQR in-process on a parsed PDB file, without going through
+        a command line, and hand back the atoms as columns instead of PQR
+        text.
+
+        Given the contents of the file, runs without side effects are
+        looked up in and stored in the result cache, as in mainCommand,
+        unless the routines are kept.
+
+        Parameters
+            pdblist:  The records read from the PDB file (list)
+            options:  The options, named as in options.json (dict)
+            keep:     Keep the routines of each model unchanged once it
+                      has been yielded, for use after later models (bool)
+            data:     The contents of the PDB file (bytes)
+
+        Yields (atoms, metadata), once per model with the "models" option,
+        and once otherwise
+            atoms:     The atoms of the PQR file, as returned by
+                       Protein.getAtomColumns (dict)
+            metadata:  The "model" number (None unless "models" is set),
+                       the PQR "header" and "lines", the total "charge",
+                       the "forcefield", the "missedligands" and the
+                       "routines" of the prepared protein, or None for a
+                       result from the cache (dict)
+    """
+    kwargs = getRunOptions(options)
+    ff = options.get("ff")
+
+    resultkey = None
+    results = []
+    cachedir = options.get("cache_dir")
+    if data is not None and not keep and not (options.get("nocache") or
+            options.get("verbose") or options.get("typemap") or
+            options.get("ph_calc_method")):
+        pathoptions = Values(dict((name, options.get(name)) for name in
+                                  ("clean", "ff", "ffout", "userff", "usernames")))
+        resultkey = datacache.getResultKey(data,
+                                           "processPDB %r" % sorted(options.items()),
+                                           getResultPaths(pathoptions))
+        if resultkey is not None:
+            cached = datacache.getCachedResult(resultkey, cachedir=cachedir)
+            if cached is not None:
+                for atoms, metadata in cached:
+                    yield atoms, metadata
+                return
+
+    if options.get("models"):
+        models = iterModels(pdblist)
+    else:
+        models = [(None, pdblist)]
+
+    topology = {}
+    for model, header, lines, missedligands in \
+            runPDB2PQRModels(models, ff, topology=topology, keep=keep, **kwargs):
+        atoms = topology["protein"].getAtomColumns(topology["hitlist"])
+        metadata = {"model": model,
+                    "header": header,
+                    "lines": lines,
+                    "charge": sum(atoms["charge"]),
+                    "forcefield": ff,
+                    "missedligands": missedligands,
+                    "routines": topology["routines"]}
+        if resultkey is not None:
+            results.append((atoms, dict(metadata, routines=None)))
+        yield atoms, metadata
+
+    if resultkey is not None:
+        datacache.storeResult(resultkey, results, cachedir=cachedir)
+
+def getResultPaths(options):
+    """
+        Get the files that the result of a run depends on: the definition
+        and forcefield files, and the code of PDB2PQR itself, so that a
+        cached result is not used once any of them has changed.
+
+        Parameters
+            options:  The parsed command line options
+        Returns
+            paths:    The paths of the files (list)
+    """
+    paths = [AAPATH, NAPATH, PATCHPATH, HYDPATH]
+    if not options.clean:
+        for name in (options.ff, options.ffout):
+            if name is not None:
+                paths.append(getFFfile(name))
+                paths.append(getNamesFile(name))
+        for path in (options.userff, options.usernames):
+            if path is not None:
+                paths.append(path)
+
+    codedir = os.path.dirname(os.path.abspath(__file__))
+    srcdir = os.path.join(codedir, "src")
+    paths.append(os.path.join(codedir, "main.py"))
+    for name in sorted(os.listdir(srcdir)):
+        if name.endswith(".py"):
+            paths.append(os.path.join(srcdir, name))
+    return paths
+
 def mainCommand(argv):
     """
         Main driver for running program from the command line.
@@ -510,6 +774,14 @@ def mainCommand(argv):
     group.add_option('--usernames', dest='usernames', metavar='USER_NAME_FILE',
                       help='The user created names file to use. Required if using --userff')
 
+    group.add_option('--nocache', dest='cache', action='store_false', default=True,
+                      help='Do not look up or store the result in the on-disk result cache.')
+
+    group.add_option('--cache-dir', dest='cachedir', metavar='PATH',
+                      help='Keep the on-disk result cache under this directory instead of ' +
+                           '$PDB2PQR_CACHE_DIR, or pdb2pqr under $XDG_CACHE_HOME or ~/.cache. ' +
+                           'It must be owned by the user and not writable by anyone else.')
+
     group.add_option('--apbs-input', dest='input', action='store_true', default=False,
                       help='Create a template APBS input file based on the generated PQR file.  Also creates a Python ' +
                            'pickle for using these parameters in other programs.')
@@ -538,6 +810,14 @@ def mainCommand(argv):
     group.add_option('--drop-water', dest='drop_water', action='store_true', default=False,
                       help='Drop waters before processing protein. Currently recognized and deleted are the following water types:  %s' % ', '.join(WAT.water_residue_names))
 
+    group.add_option('--models', dest='models', action='store_true', default=False,
+                      help='Process every MODEL of a multi-model PDB file (an NMR ensemble or a trajectory) '
+                           'instead of only the first, writing one MODEL/ENDMDL block per model.')
+
+    group.add_option('--processes', dest='processes', metavar='N', type='int', default=1,
+                      help='Add hydrogens to the chains of a multi-chain structure in N processes. '
+                           'Debumping and hydrogen optimization still look at the whole structure.')
+
     group.add_option('--include-header', dest='include_header', action='store_true', default=False,
                       help='Include pdb header in pqr file. '
                            'WARNING: The resulting PQR file will not work with APBS versions prior to 1.5')
@@ -688,55 +968,94 @@ Please cite your use of PDB2PQR as:
 
     path = args[0]
     pdbFile = getPDBFile(path)
-    pdblist, errlist = readPDB(pdbFile)
-
-    if len(pdblist) == 0 and len(errlist) == 0:
-        parser.error("Unable to find file %s!" % path)
-
-    if len(errlist) != 0 and options.verbose:
-        print("Warning: %s is a non-standard PDB file.\n" % path)
-        print(errlist)
-
-    #In case no extensions were specified or no extensions exist.
-    if not hasattr(options, 'active_extensions' ) or options.active_extensions is None:
-        options.active_extensions = []
-
-    #I see no point in hiding options from extensions.
-    extensionOpts = options
-
-    #TODO: The ideal would be to pass a file like object for the second
-    # argument and add a third for names then
-    # get rid of the userff and username arguments to this function.
-    # This would also do away with the redundent checks and such in
-    # the Forcefield constructor.
-    try:
-        header, lines, missedligands = runPDB2PQR(pdblist,
-                                                  options.ff,
-                                                  # outname = options.outname,
-                                                  ph = options.ph,
-                                                  verbose = options.verbose,
-                                                  selectedExtensions = options.active_extensions,
-                                                  ph_calc_method = options.ph_calc_method,
-                                                  ph_calc_options = ph_calc_options,
-                                                  extensionOptions = extensionOpts,
-                                                  clean = options.clean,
-                                                  neutraln = options.neutraln,
-                                                  neutralc = options.neutralc,
-                                                  ligand = options.ligand,
-                                                  assign_only = options.assign_only,
-                                                  chain = options.chain,
-                                                  drop_water = options.drop_water,
-                                                  debump = options.debump,
-                                                  opt = options.opt,
-                                                  typemap = options.typemap,
-                                                  userff = userfffile,
-                                                  usernames = usernamesfile,
-                                                  ffout = options.ffout,
-                                                  commandLine = commandLine,
-                                                  include_old_header = options.include_header)
-    except PDB2PQRError as er:
-        print(er)
-        sys.exit(2)
+
+    # Runs without side effects are cached, keyed by the input file and
+    # everything else that the output depends on
+    resultkey = None
+    result = None
+    if options.cache and pdbFile is not None and not (options.verbose or
+            options.input or options.typemap or options.ph_calc_method or
+            options.ligand):
+        pdbdata = pdbFile.read()
+        if isinstance(pdbdata, str):
+            pdbFile = StringIO(pdbdata)
+            pdbdata = pdbdata.encode()
+        else:
+            pdbFile = BytesIO(pdbdata)
+
+        resultkey = datacache.getResultKey(pdbdata, commandLine,
+                                           getResultPaths(options))
+        if resultkey is not None:
+            result = datacache.getCachedResult(resultkey, cachedir=options.cachedir)
+
+    if result is not None:
+        header, lines = result
+    else:
+        pdblist, errlist = readPDB(pdbFile)
+
+        if len(pdblist) == 0 and len(errlist) == 0:
+            parser.error("Unable to find file %s!" % path)
+
+        if len(errlist) != 0 and options.verbose:
+            print("Warning: %s is a non-standard PDB file.\n" % path)
+            print(errlist)
+
+        #In case no extensions were specified or no extensions exist.
+        if not hasattr(options, 'active_extensions' ) or options.active_extensions is None:
+            options.active_extensions = []
+
+        #I see no point in hiding options from extensions.
+        extensionOpts = options
+
+        #TODO: The ideal would be to pass a file like object for the second
+        # argument and add a third for names then
+        # get rid of the userff and username arguments to this function.
+        # This would also do away with the redundent checks and such in
+        # the Forcefield constructor.
+        runOptions = dict(# outname = options.outname,
+                          ph = options.ph,
+                          verbose = options.verbose,
+                          selectedExtensions = options.active_extensions,
+                          ph_calc_method = options.ph_calc_method,
+                          ph_calc_options = ph_calc_options,
+                          extensionOptions = extensionOpts,
+                          clean = options.clean,
+                          neutraln = options.neutraln,
+                          neutralc = options.neutralc,
+                          ligand = options.ligand,
+                          assign_only = options.assign_only,
+                          chain = options.chain,
+                          drop_water = options.drop_water,
+                          debump = options.debump,
+                          opt = options.opt,
+                          typemap = options.typemap,
+                          userff = userfffile,
+                          usernames = usernamesfile,
+                          ffout = options.ffout,
+                          commandLine = commandLine,
+                          include_old_header = options.include_header,
+                          processes = options.processes)
+
+        try:
+            if options.models:
+                header = ""
+                lines = []
+                for model, modelheader, modellines, missedligands in \
+                        runPDB2PQRModels(iterModels(pdblist), options.ff, **runOptions):
+                    lines.append("MODEL     %4d\n" % model)
+                    lines.append(modelheader)
+                    # Each model ends with "TER\nEND"; close it with ENDMDL instead
+                    lines.extend(modellines[:-1])
+                    lines.append("TER\nENDMDL\n")
+                lines.append("END")
+            else:
+                header, lines, missedligands = runPDB2PQR(pdblist, options.ff, **runOptions)
+        except PDB2PQRError as er:
+            print(er)
+            sys.exit(2)
+
+        if resultkey is not None:
+            datacache.storeResult(resultkey, (header, lines), cachedir=options.cachedir)
 
     # Print the PQR file
     pqr = header
@@ -761,8 +1080,8 @@ Please cite your use of PDB2PQR as:
         from .src import psize
         method = "mg-auto"
         size = psize.Psize()
-        size.parseInput(outpath)
-        size.runPsize(outpath)
+        size.parseString(pqr)
+        size.setAll()
         async = 0 # No async files here!
         input = inputgen.Input(outpath, size, method, async, potdx=True)
         input.printInputFiles()
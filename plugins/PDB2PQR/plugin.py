@@ -40,14 +40,58 @@
 
 import logging
 import os
+from io import BytesIO, StringIO
 
 from sphinx.plugin import BasePlugin
-from .main import mainCommand
+from .main import mainCommand, processPDB
+from .src import datacache
+from .src.pdb import readPDB
+from .src.utilities import getPDBFile
 
 __author__ = 'Keith T. Star <keith@pnnl.gov>'
 
 _log = logging.getLogger()
 
+def define_types(tm):
+    '''Define a type for the atoms that PDB2PQR produces
+
+    The atoms are sent as columns, one array per field, so that a solver can
+    take a whole structure in one message without formatting or parsing PQR
+    text.  The PQR header and total charge come along with them.
+    '''
+    numbers = {'type': 'array', 'items': {'type': 'number'}}
+    integers = {'type': 'array', 'items': {'type': 'integer'}}
+    strings = {'type': 'array', 'items': {'type': 'string'}}
+
+    tm.define_type('pqr_atoms',
+                   { 'model': {'type': ['integer', 'null']},
+                     'header': {'type': 'string'},
+                     'forcefield': {'type': ['string', 'null']},
+                     'total_charge': {'type': 'number'},
+                     'atoms': {
+                         'type': 'object',
+                         'properties': {
+                             'type': strings,
+                             'serial': integers,
+                             'name': strings,
+                             'resName': strings,
+                             'chainID': strings,
+                             'resSeq': integers,
+                             'iCode': strings,
+                             'x': numbers,
+                             'y': numbers,
+                             'z': numbers,
+                             'charge': numbers,
+                             'radius': numbers}}})
+
+    # The prepared protein itself, for running PDB2PQR extensions on.  The
+    # routines are a Python object, and are handed over as they are.
+    tm.define_type('pdb2pqr_protein',
+                   { 'model': {'type': ['integer', 'null']},
+                     'options': {'type': 'object'},
+                     'routines': {}})
+
+
 class PDB2PQR(BasePlugin):
     '''Stuff PDB2PQR into Sphnx
     '''
@@ -73,13 +117,36 @@ class PDB2PQR(BasePlugin):
 
     @classmethod
     def sources(cls):
-        return ['text']
+        return ['pqr_atoms', 'pdb2pqr_protein', 'text']
 
 
     async def run(self):
+        # Solvers get the atoms straight from PDB2PQR, without a round trip
+        # through the command line and PQR text.  Extensions get the
+        # prepared protein, which must then stay as it is after each model.
+        sink_types = set(self._sinks.values())
+        if sink_types & {'pqr_atoms', 'pdb2pqr_protein'}:
+            keep = 'pdb2pqr_protein' in sink_types
+            data = getPDBFile(self._opts['pdb']).read()
+            if isinstance(data, str):
+                pdblist, errlist = readPDB(StringIO(data))
+                data = data.encode()
+            else:
+                pdblist, errlist = readPDB(BytesIO(data))
+            for atoms, metadata in processPDB(pdblist, self._opts, keep=keep,
+                                              data=data):
+                await self.publish((atoms, metadata))
+            _log.info('PDB2PQR result cache: {hits} hits, {misses} misses, '
+                      '{evictions} evictions.'.format(**datacache.resultstats))
+
+            await self.done()
+            return
+
         cmd = ['pdb2pqr-sphinx']
         print(self._opt_handler.get_misc('ff'))
-        for k, v in self._opts.items():
+        # Sort the options, so the same set of options always gives the same
+        # command line, and the same key in the result cache.
+        for k, v in sorted(self._opts.items()):
             print('foo', k, v)
             if k != 'pdb':
                 try:
@@ -101,10 +168,34 @@ class PDB2PQR(BasePlugin):
 #        pqr = mainCommand(['pdb2pqr-sphinx', '-v', '--ff={}'.format(self._ff), self._pdb])
 
         pqr = mainCommand(cmd)
+        _log.info('PDB2PQR result cache: {hits} hits, {misses} misses, '
+                  '{evictions} evictions.'.format(**datacache.resultstats))
 
         await self.publish(self._tm.new_text({'lines': pqr.split('\n')}))
         await self.done()
 
 
     def xform_data(self, data, to_type):
-        return data
+        if not isinstance(data, tuple):
+            return data
+
+        atoms, metadata = data
+        if to_type == 'pqr_atoms':
+            columns = {}
+            for field, column in atoms.items():
+                columns[field] = list(column)
+
+            return self._tm.new_pqr_atoms(model=metadata['model'],
+                                          header=metadata['header'],
+                                          forcefield=metadata['forcefield'],
+                                          total_charge=metadata['charge'],
+                                          atoms=columns)
+
+        elif to_type == 'pdb2pqr_protein':
+            return self._tm.new_pdb2pqr_protein(model=metadata['model'],
+                                                options=self._opts,
+                                                routines=metadata['routines'])
+
+        elif to_type == 'text':
+            pqr = metadata['header'] + ''.join(metadata['lines'])
+            return self._tm.new_text(lines=pqr.split('\n'))
@@ -0,0 +1,180 @@
+"""
+    Single pass analysis of close atom pairs
+
+    The hbond, contact and salt extensions each look at pairs of atoms
+    within a cutoff distance of each other.  runAnalyses finds the close
+    pairs for any number of such analyses in one pass over the protein,
+    using a single grid sized for the largest cutoff, and hands each
+    analysis the pairs it asked for as they are found.
+
+    Copyright (c) 2002-2011, Jens Erik Nielsen, University College Dublin; 
+    Nathan A. Baker, Battelle Memorial Institute, Developed at the Pacific 
+    Northwest National Laboratory, operated by Battelle Memorial Institute, 
+    Pacific Northwest Division for the U.S. Department Energy.; 
+    Paul Czodrowski & Gerhard Klebe, University of Marburg.
+
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, 
+    are permitted provided that the following conditions are met:
+
+        * Redistributions of source code must retain the above copyright notice, 
+          this list of conditions and the following disclaimer.
+        * Redistributions in binary form must reproduce the above copyright notice, 
+          this list of conditions and the following disclaimer in the documentation 
+          and/or other materials provided with the distribution.
+        * Neither the names of University College Dublin, Battelle Memorial Institute,
+          Pacific Northwest National Laboratory, US Department of Energy, or University
+          of Marburg nor the names of its contributors may be used to endorse or promote
+          products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND 
+    ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED 
+    WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+    IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, 
+    INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, 
+    BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, 
+    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+    LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE 
+    OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED 
+    OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+
+__date__ = "19 October 2026"
+
+import math
+
+
+class PairAnalysis(object):
+    """
+        An analysis of the pairs of atoms within a cutoff distance of each
+        other.  Subclasses select the atoms they want as the first and the
+        second atom of a pair, and handle each pair in addPair.
+
+        If outfile is set, finish closes it.
+    """
+    def __init__(self, cutoff):
+        """
+            Initialize the analysis
+
+            Parameters
+                cutoff:  The largest distance between the atoms of a pair
+                         (float)
+        """
+        self.cutoff = cutoff
+        self.outfile = None
+
+    def isQuery(self, atom):
+        """
+            Whether pairs should be found for an atom (bool)
+        """
+        return True
+
+    def isPartner(self, atom):
+        """
+            Whether an atom may be the second atom of a pair (bool)
+        """
+        return True
+
+    def addPair(self, atom, partner, dist):
+        """
+            Handle a pair of atoms.  The pairs of each atom are added in the
+            order of the atoms in the protein, and so are the atoms.
+
+            Parameters
+                atom:     The first atom of the pair (Atom)
+                partner:  The second atom of the pair (Atom)
+                dist:     The distance between them, computed as in
+                          utilities.distance (float)
+        """
+        pass
+
+    def finish(self):
+        """
+            Called once all pairs have been added, or the pass has failed
+        """
+        if self.outfile is not None:
+            self.outfile.close()
+
+
+def runAnalyses(protein, analyses):
+    """
+        Find the pairs of atoms within the cutoff of each analysis and add
+        them to the analysis.  The distances are computed once for all of
+        the analyses, and finish is called on each analysis at the end.
+
+        Parameters
+            protein:   The protein to analyze (Protein)
+            analyses:  The analyses to run (list of PairAnalysis)
+    """
+    try:
+        atoms = protein.getAtoms()
+        queries = [[analysis.isQuery(atom) for atom in atoms] for analysis in analyses]
+        partners = [[analysis.isPartner(atom) for atom in atoms] for analysis in analyses]
+        anyquery = [any(flags) for flags in zip(*queries)]
+        anypartner = [any(flags) for flags in zip(*partners)]
+        cutoffs = [analysis.cutoff for analysis in analyses]
+        if not atoms or not analyses or not any(anyquery):
+            return
+
+        # With cells as large as the largest cutoff, the partners of an atom
+        #  are all in the neighboring cells of its own
+        size = max(max(cutoffs), 1.0)
+        cellmap = {}
+        cells = []
+        for index, atom in enumerate(atoms):
+            key = (math.floor(atom.x / size), math.floor(atom.y / size), math.floor(atom.z / size))
+            cells.append(key)
+            if anypartner[index]:
+                try:
+                    cellmap[key].append(index)
+                except KeyError:
+                    cellmap[key] = [index]
+
+        nearmap = {}
+        bound = size * size * 1.000001
+        for index, atom in enumerate(atoms):
+            if not anyquery[index]:
+                continue
+
+            key = cells[index]
+            try:
+                near = nearmap[key]
+            except KeyError:
+                x, y, z = key
+                near = []
+                for i in (-1, 0, 1):
+                    for j in (-1, 0, 1):
+                        for k in (-1, 0, 1):
+                            near.extend(cellmap.get((x + i, y + j, z + k), ()))
+                near.sort()
+                near = [(other, atoms[other], atoms[other].x, atoms[other].y, atoms[other].z)
+                        for other in near]
+                nearmap[key] = near
+
+            # Compute the distance of every candidate once, subtracting in
+            #  the same order as utilities.distance
+            ax = atom.x
+            ay = atom.y
+            az = atom.z
+            pairs = []
+            for other, partner, x2, y2, z2 in near:
+                p = x2 - ax
+                q = y2 - ay
+                r = z2 - az
+                dist2 = p*p + q*q + r*r
+                if dist2 > bound or other == index:
+                    continue
+                pairs.append((other, partner, math.sqrt(dist2)))
+
+            for analysis, cutoff, isquery, ispartner in zip(analyses, cutoffs, queries, partners):
+                if not isquery[index]:
+                    continue
+                for other, partner, dist in pairs:
+                    if dist <= cutoff and ispartner[other]:
+                        analysis.addPair(atom, partner, dist)
+
+    finally:
+        for analysis in analyses:
+            analysis.finish()
@@ -0,0 +1,379 @@
+"""
+    Cache for parsed data files
+
+    Parsing the XML and parameter files in the dat directory is a large part
+    of the cost of a small PDB2PQR run.  This module keeps the parsed objects
+    in pickled form, both in memory for the life of the process and on disk
+    for later processes, keyed by a hash of the files they were built from.
+    Changing a data file therefore invalidates its cache entry.
+
+    Since PDB2PQR modifies its reference objects while it works (patches are
+    applied to definition residues in place), getCachedData hands every
+    caller a fresh copy; getSharedData is for objects that are never
+    modified and returns the same object to every caller.
+
+    Since loading a pickle can run arbitrary code, the on-disk cache is kept
+    in a directory private to the user: $PDB2PQR_CACHE_DIR if it is set,
+    otherwise pdb2pqr under $XDG_CACHE_HOME or ~/.cache.  A directory that
+    belongs to someone else, or that others can write to, is not used.  The
+    result cache is kept in the results directory under it, or under the
+    directory given to the result functions.
+
+    Copyright (c) 2002-2011, Jens Erik Nielsen, University College Dublin; 
+    Nathan A. Baker, Battelle Memorial Institute, Developed at the Pacific 
+    Northwest National Laboratory, operated by Battelle Memorial Institute, 
+    Pacific Northwest Division for the U.S. Department Energy.; 
+    Paul Czodrowski & Gerhard Klebe, University of Marburg.
+
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, 
+    are permitted provided that the following conditions are met:
+
+        * Redistributions of source code must retain the above copyright notice, 
+          this list of conditions and the following disclaimer.
+        * Redistributions in binary form must reproduce the above copyright notice, 
+          this list of conditions and the following disclaimer in the documentation 
+          and/or other materials provided with the distribution.
+        * Neither the names of University College Dublin, Battelle Memorial Institute,
+          Pacific Northwest National Laboratory, US Department of Energy, or University
+          of Marburg nor the names of its contributors may be used to endorse or promote
+          products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND 
+    ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED 
+    WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+    IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, 
+    INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, 
+    BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, 
+    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+    LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE 
+    OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED 
+    OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+
+__date__ = "19 October 2026"
+
+import hashlib
+import os
+import pickle
+import stat
+import sys
+import tempfile
+
+from .utilities import getDatFile
+
+""" Bump this when a cached class changes in a way that breaks old pickles """
+CACHE_VERSION = 1
+
+""" The directory for the on-disk cache """
+CACHEDIR = os.environ.get("PDB2PQR_CACHE_DIR") or \
+    os.path.join(os.environ.get("XDG_CACHE_HOME") or
+                 os.path.join(os.path.expanduser("~"), ".cache"), "pdb2pqr")
+
+""" The size limit of the result cache in bytes """
+RESULTCACHE_SIZE = 256 * 1024 * 1024
+
+""" Counters for the result cache """
+resultstats = {"hits": 0, "misses": 0, "evictions": 0}
+
+_pickled = {}
+_shared = {}
+_refused = set()
+
+def checkCacheDir(cachedir):
+    """
+        Create a cache directory if needed, and check that it is safe to
+        load pickles from: a real directory owned by the current user that
+        nobody else can write to.  A directory that fails the check is
+        reported once and then skipped.
+
+        Parameters
+            cachedir:  The path of the directory (string)
+        Returns
+            safe:      True if the directory can be used (bool)
+    """
+    try:
+        os.makedirs(cachedir, mode=0o700, exist_ok=True)
+        dirstat = os.lstat(cachedir)
+    except OSError:
+        return False
+
+    if stat.S_ISDIR(dirstat.st_mode) and dirstat.st_uid == os.getuid() and \
+            not dirstat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return True
+
+    if cachedir not in _refused:
+        _refused.add(cachedir)
+        sys.stderr.write("Warning: not using cache directory %s, since it is "
+                         "not a private directory of the current user\n" % cachedir)
+    return False
+
+def hashFiles(digest, paths):
+    """
+        Add the contents of a set of files to a hash
+
+        Parameters
+            digest:  The hash object (hashlib hash)
+            paths:   The files to add (list)
+        Returns
+            found:   False if a file cannot be found (bool)
+    """
+    for path in paths:
+        datpath = getDatFile(path)
+        if datpath == "":
+            return False
+        with open(datpath, "rb") as datfile:
+            digest.update(datfile.read())
+    return True
+
+def getDataKey(name, paths, extra=""):
+    """
+        Get the cache key for a set of data files
+
+        Parameters
+            name:   The name of the cached object (string)
+            paths:  The data files the object is built from (list)
+            extra:  Any other input the object depends on (string)
+        Returns
+            key:    A hash of the cache version, name, extra input and the
+                    contents of the files, or None if a file cannot be
+                    found (string)
+    """
+    digest = hashlib.sha1(("%s %i" % (name, CACHE_VERSION)).encode())
+    digest.update(extra.encode())
+    if not hashFiles(digest, paths):
+        return None
+    return digest.hexdigest()
+
+def getCachedData(name, paths, build, extra=""):
+    """
+        Get a private copy of an object built from data files, building
+        it only if neither the in-memory nor the on-disk cache has it
+
+        Parameters
+            name:   The name of the cached object (string)
+            paths:  The data files the object is built from (list)
+            build:  A function of no arguments that builds the object
+            extra:  Any other input the object depends on (string)
+        Returns
+            data:   The object, which the caller is free to modify
+    """
+    key = getDataKey(name, paths, extra)
+    if key is None:
+        return build()
+
+    pickled = _pickled.get(name)
+    if pickled is not None and pickled[0] == key:
+        return pickle.loads(pickled[1])
+
+    # Try the on-disk cache, treating an unreadable file as a miss
+
+    if checkCacheDir(CACHEDIR):
+        cachepath = os.path.join(CACHEDIR, "%s-%s.pickle" % (name, key))
+        try:
+            with open(cachepath, "rb") as cachefile:
+                pickled = cachefile.read()
+            data = pickle.loads(pickled)
+        except Exception:
+            data = build()
+            pickled = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+            writeCacheFile(cachepath, pickled)
+    else:
+        data = build()
+        pickled = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+    _pickled[name] = (key, pickled)
+    return data
+
+def getSharedData(name, paths, build):
+    """
+        Get an object built from data files, building it once per process.
+        Every caller gets the same object, so it must not be modified.
+
+        Parameters
+            name:   The name of the shared object (string)
+            paths:  The data files the object is built from (list)
+            build:  A function of no arguments that builds the object
+        Returns
+            data:   The shared object
+    """
+    key = getDataKey(name, paths)
+    if key is None:
+        return build()
+
+    shared = _shared.get(name)
+    if shared is None or shared[0] != key:
+        shared = (key, build())
+        _shared[name] = shared
+    return shared[1]
+
+def writeCacheFile(cachepath, data):
+    """
+        Write a cache file, ignoring failures.  The file is written under
+        a temporary name first, so readers never see a partial file, and
+        nothing is written to a directory that fails checkCacheDir.
+
+        Parameters
+            cachepath:  The path of the cache file (string)
+            data:       The pickled data (bytes)
+    """
+    cachedir = os.path.dirname(cachepath)
+    if not checkCacheDir(cachedir):
+        return
+    try:
+        fd, temppath = tempfile.mkstemp(dir=cachedir)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, "wb") as cachefile:
+            cachefile.write(data)
+        os.replace(temppath, cachepath)
+    except OSError:
+        if os.path.exists(temppath):
+            os.remove(temppath)
+
+def getResultKey(data, options, paths):
+    """
+        Get the cache key for the result of a run
+
+        Parameters
+            data:     The input file contents (bytes)
+            options:  The options the result depends on (string)
+            paths:    The data and code files the result depends on (list)
+        Returns
+            key:      A hash of all of the above, or None if a file cannot
+                      be found (string)
+    """
+    digest = hashlib.sha1(("result %i" % CACHE_VERSION).encode())
+    digest.update(options.encode())
+    digest.update(b"\0")
+    digest.update(data)
+    if not hashFiles(digest, paths):
+        return None
+    return digest.hexdigest()
+
+def getResultDir(cachedir=None):
+    """
+        Get the directory of the result cache, if it is safe to use
+
+        Parameters
+            cachedir:   The cache directory, CACHEDIR if not given (string)
+        Returns
+            resultdir:  The results directory under it, or None if either
+                        of them fails checkCacheDir (string)
+    """
+    if cachedir is None:
+        cachedir = CACHEDIR
+    resultdir = os.path.join(cachedir, "results")
+    if checkCacheDir(cachedir) and checkCacheDir(resultdir):
+        return resultdir
+    return None
+
+def getCachedResult(key, cachedir=None):
+    """
+        Get the result of an earlier run from the on-disk result cache
+
+        Parameters
+            key:       The key from getResultKey (string)
+            cachedir:  The cache directory, CACHEDIR if not given (string)
+        Returns
+            result:    The stored result, or None on a miss
+    """
+    resultdir = getResultDir(cachedir)
+    if resultdir is None:
+        resultstats["misses"] += 1
+        return None
+
+    cachepath = os.path.join(resultdir, "%s.pickle" % key)
+    try:
+        with open(cachepath, "rb") as cachefile:
+            result = pickle.loads(cachefile.read())
+        # Mark the result as recently used for evictResults
+        os.utime(cachepath)
+    except Exception:
+        resultstats["misses"] += 1
+        return None
+
+    resultstats["hits"] += 1
+    return result
+
+def storeResult(key, result, maxsize=RESULTCACHE_SIZE, cachedir=None):
+    """
+        Store the result of a run in the on-disk result cache, evicting
+        the least recently used results if the cache grows too large
+
+        Parameters
+            key:       The key from getResultKey (string)
+            result:    The result to store (picklable)
+            maxsize:   The size limit of the cache in bytes (int)
+            cachedir:  The cache directory, CACHEDIR if not given (string)
+    """
+    resultdir = getResultDir(cachedir)
+    if resultdir is None:
+        return
+
+    cachepath = os.path.join(resultdir, "%s.pickle" % key)
+    writeCacheFile(cachepath, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+    evictResults(maxsize, cachedir)
+
+def evictResults(maxsize=RESULTCACHE_SIZE, cachedir=None):
+    """
+        Remove the least recently used results until the result cache
+        fits in the given size
+
+        Parameters
+            maxsize:   The size limit of the cache in bytes (int)
+            cachedir:  The cache directory, CACHEDIR if not given (string)
+    """
+    resultdir = getResultDir(cachedir)
+    if resultdir is None:
+        return
+
+    try:
+        names = os.listdir(resultdir)
+    except OSError:
+        return
+
+    paths = [os.path.join(resultdir, name) for name in names
+             if name.endswith(".pickle")]
+    resultstats["evictions"] += len(evictFiles(paths, maxsize))
+
+def evictFiles(paths, maxsize, keep=None):
+    """
+        Remove the least recently used of the given files until the rest
+        fit in the given size.  Files that cannot be examined or removed
+        are skipped.
+
+        Parameters
+            paths:    The files to choose from (list)
+            maxsize:  The size limit of the files in bytes (int)
+            keep:     A file that is never removed (string)
+        Returns
+            removed:  The files removed, least recently used first (list)
+    """
+    entries = []
+    total = 0
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+
+    entries.sort()
+    removed = []
+    for mtime, size, path in entries:
+        if total <= maxsize:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed.append(path)
+    return removed
@@ -54,6 +54,7 @@ from .pdb import *
 from .utilities import *
 from .structures import *
 from .routines import *
+from .datacache import getCachedData
 
 from .errors import PDBInternalError
 
@@ -163,7 +164,20 @@ class Definition:
     """
     def __init__(self):
         """
-            Create a new Definition Object
+            Create a new Definition Object.  The parsed definitions are
+            cached, so the XML files are only read when they change.
+        """
+        self.map, self.patches = getCachedData("definitions",
+                                               [AAPATH, NAPATH, PATCHPATH],
+                                               self.parseDefinitions)
+
+    def parseDefinitions(self):
+        """
+            Parse the definition files and apply the patches
+
+            Returns
+                map:      Definition residues by name (dict)
+                patches:  Patches by name (dict)
         """
         self.map = {}
         self.patches = {}
@@ -202,8 +216,9 @@ class Definition:
                 # Find all residues matching applyto
 
                 resnames = list(self.map.keys())
+                applyto = re.compile(patch.applyto)
                 for name in resnames:
-                    regexp = re.compile(patch.applyto).match(name)
+                    regexp = applyto.match(name)
                     if not regexp: continue
                     newname = patch.newname.replace("*", name)
                     self.addPatch(patch, name, newname)
@@ -213,6 +228,8 @@ class Definition:
             
             self.addPatch(patch, patch.applyto, patch.name)
 
+        return self.map, self.patches
+
     def addPatch(self, patch, refname, newname):
         """
             Add a patch to a definition residue.
@@ -380,6 +397,14 @@ class DefinitionAtom(Atom):
     """
         A trimmed down version of the Atom class
     """
+    __slots__ = ('bond',)  # The bonded heavy atom named in HYDROGENS.xml
+
+    # Definitions don't belong to a protein, so they keep their coordinates
+    # in the plain ATOM slots rather than in a CoordinateStore
+    x = ATOM.x
+    y = ATOM.y
+    z = ATOM.z
+
     def __init__(self, name=None, x=None, y=None, z=None):
         """
             Initialize the class
@@ -397,6 +422,12 @@ class DefinitionAtom(Atom):
         if z == None:
             self.z = 0.0
         self.bonds = []
+
+    def getCoords(self):
+        """
+            Return the x,y,z coordinates of the atom in list form
+        """
+        return [self.x, self.y, self.z]
      
     def __str__(self):
         """
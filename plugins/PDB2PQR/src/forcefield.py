@@ -59,6 +59,7 @@ import re
 from xml import sax
 from .utilities import *
 from .errors import PDBInputError, PDBInternalError
+from .datacache import getCachedData
 
 class ForcefieldHandler(sax.ContentHandler):
    
@@ -107,12 +108,12 @@ class ForcefieldHandler(sax.ContentHandler):
                        the regular expression.
         """
         list = [] 
-        regname += "$"
+        pattern = re.compile(regname + "$")
      
         # Find the existing items that match this string
 
         for name in map:
-            regexp = re.compile(regname).match(name)
+            regexp = pattern.match(name)
             if regexp:
                 list.append(regexp)
 
@@ -228,6 +229,43 @@ class Forcefield:
         """
         self.map = {}
         self.name = str(ff)
+
+        # The stock forcefields are parsed once and then loaded from the
+        #  cache.  The name mapping depends on the residue names in the
+        #  definition, so those are part of the cache key.
+
+        defpath = getFFfile(ff)
+        namespath = getNamesFile(ff)
+        if userff == None and usernames == None and defpath != "" and namespath != "":
+            self.map = getCachedData("forcefield-%s" % self.name,
+                                     [defpath, namespath],
+                                     lambda: self.parseForcefield(ff, definition, userff, usernames),
+                                     " ".join(sorted(definition.map)))
+        else:
+            self.parseForcefield(ff, definition, userff, usernames)
+
+        # Flatten the map for direct (resname, atomname) lookups
+
+        self.params = {}
+        for resname in self.map:
+            for atomname, atom in self.map[resname].atoms.items():
+                self.params[(resname, atomname)] = (atom.charge, atom.radius, atom.group)
+
+    def parseForcefield(self, ff, definition, userff, usernames):
+        """
+            Parse the forcefield parameter file and apply the name mapping
+            in the .names file
+
+            Parameters
+                ff: The name of the forcefield (string) can be None.
+                definition: The definition objects
+                userff:  A link to the file for CGI based user-defined
+                         forcefields
+                usernames:  A link to a user-defined .names file
+            Returns
+                map:  ForcefieldResidue objects by residue name (dict)
+        """
+        self.map = {}
         defpath = ""
 
         if userff == None:
@@ -299,6 +337,7 @@ class Forcefield:
                 raise PDBInputError("Please provide a valid .names file!")
             namesfile.close()
 
+        return self.map
 
     def hasResidue(self, resname):
         """
@@ -359,13 +398,10 @@ class Forcefield:
                 resname:  The residue name (string)
                 atomname: The atom name (string)
         """
-        group = ""
-        if resname in self.map:
-            resid = self.map[resname]
-            if resid.hasAtom(atomname):
-                atom = resid.atoms[atomname]
-                group = atom.group
-        return group
+        params = self.params.get((resname, atomname))
+        if params is None:
+            return ""
+        return params[2]
 
     def getParams(self, resname, atomname):
         """
@@ -381,19 +417,10 @@ class Forcefield:
                 charge:   The charge on the atom (float)
                 radius:   The radius of the atom (float)
         """
-        charge = None
-        radius = None
-
-        #print self.map.keys()
-
-        if resname in self.map:
-            resid = self.map[resname]
-            if resid.hasAtom(atomname):
-                atom = resid.atoms[atomname]
-                charge = atom.charge
-                radius = atom.radius
-                
-        return charge, radius
+        params = self.params.get((resname, atomname))
+        if params is None:
+            return None, None
+        return params[0], params[1]
 
     def getParams1(self, residue, name):
         """
@@ -52,6 +52,7 @@ from .utilities import *
 from .quatfit import *
 from .routines import *
 from . import topology
+from .datacache import getCachedData, getSharedData
 
 __date__ = "22 April 2009"
 __author__ = "Todd Dolinsky, Jens Erik Nielsen, Yong Huang"
@@ -61,6 +62,13 @@ HYDPATH = os.path.join(INSTALLDIR, 'dat', 'HYDROGENS.xml')
 TOPOLOGYPATH = os.path.join(INSTALLDIR, 'dat', 'TOPOLOGY.xml')
 ANGLE_CUTOFF = 20.0       # A - D - H(D) angle
 DIST_CUTOFF = 3.3         # H(D) to A distance
+HBOND_SEARCH_DIST = 4.3   # Donor/acceptor distance for potential hbonds
+BUMP_ENERGY = 10.0        # Penalty for H(D) too close to H(A)
+BUMP_DIST = 1.5           # H(D) to H(A) bump distance
+MAX_HBOND_ENERGY = -10.0
+MAX_ELE_ENERGY = -1.0
+DHAHA_ANGLE_CUTOFF = 110.0  # H(D) - H(A) - A angle
+MAX_ELE_DIST = 5.0        # H(D) to A electrostatic distance
 
 class HydrogenHandler(sax.ContentHandler):
     """
@@ -142,6 +150,43 @@ class HydrogenHandler(sax.ContentHandler):
         setattr(self.curobj, self.curelement, value)
       
 
+def parseHydrogenFile():
+    """
+        Parse the hydrogen optimization definitions in HYDROGENS.xml
+
+        Returns
+            map:  OptimizationHolder objects by residue name (dict)
+    """
+    handler = HydrogenHandler()
+    sax.make_parser()
+
+    defpath = getDatFile(HYDPATH)
+    if defpath == "":
+        raise PDBInternalError("Could not find %s!" % HYDPATH) 
+ 
+    hydrogenFile = open(defpath)
+    sax.parseString(hydrogenFile.read(), handler)
+    hydrogenFile.close()
+
+    return handler.map
+
+def parseTopologyFile():
+    """
+        Parse TOPOLOGY.xml
+
+        Returns
+            top:  The parsed topology (Topology)
+    """
+    toppath = getDatFile(TOPOLOGYPATH)
+    if toppath == "":
+        raise PDBInternalError("Could not find %s!" % TOPOLOGYPATH) 
+ 
+    topfile = open(toppath)
+    top = topology.Topology(topfile)
+    topfile.close()
+
+    return top
+
 class PotentialBond:
     """
         A small class containing the hbond structure
@@ -308,14 +353,14 @@ class Optimize:
         """
 
         # Initialize some variables
-        bump_energy = 10.0
-        bump_distance = 1.5
-        max_hbond_energy = -10.0
-        max_ele_energy = -1.0
+        bump_energy = BUMP_ENERGY
+        bump_distance = BUMP_DIST
+        max_hbond_energy = MAX_HBOND_ENERGY
+        max_ele_energy = MAX_ELE_ENERGY
         ADH_angle_cutoff = ANGLE_CUTOFF
-        DhAhA_angle_cutoff = 110.0
+        DhAhA_angle_cutoff = DHAHA_ANGLE_CUTOFF
         max_dha_dist = DIST_CUTOFF
-        max_ele_dist = 5.0
+        max_ele_dist = MAX_ELE_DIST
         energy = 0.0
         
         if not (donor.hdonor and acceptor.hacceptor): 
@@ -364,6 +409,166 @@ class Optimize:
                     energy += max_hbond_energy/pow(dist,2)*angleterm
                   
         return energy
+
+    @staticmethod
+    def getPairGeometry(atom):
+        """
+            Gather the coordinates getPairEnergies needs for an atom
+
+            Parameters
+                atom:      The atom in question (Atom)
+            Returns
+                geometry:  The coordinates of the atom and a tuple of the
+                           coordinates of each bonded hydrogen (tuple)
+        """
+        hcoords = tuple((bond.x, bond.y, bond.z) for bond in atom.bonds \
+                        if bond.isHydrogen())
+        return (atom.x, atom.y, atom.z), hcoords
+
+    @staticmethod
+    def getPairEnergies(donors, acceptors, cutoff=None):
+        """
+            Get the energy between every donor and every acceptor.  This
+            is the same model as getPairEnergy, but everything that only
+            depends on one side of the pair (the H(D)-D and A-H(A)
+            directions) is computed once per atom instead of once per
+            pair, so results are identical to calling getPairEnergy on
+            each pair.
+
+            Parameters
+                donors:    The getPairGeometry tuple of each donor (list)
+                acceptors: The getPairGeometry tuple of each acceptor (list)
+                cutoff:    If set, pairs whose donor and acceptor are
+                           further apart than this are skipped (float)
+            Returns
+                energies:  energies[i][j] is the energy between donor i
+                           and acceptor j (list)
+        """
+        ADH_angle_cutoff = ANGLE_CUTOFF
+        DhAhA_angle_cutoff = DHAHA_ANGLE_CUTOFF
+        max_dha_dist = DIST_CUTOFF
+        max_ele_dist = MAX_ELE_DIST
+
+        def unit(x, y, z):
+            dist = math.sqrt(pow(x,2) + pow(y,2) + pow(z,2))
+            if dist > SMALL:
+                return x/dist, y/dist, z/dist
+            return x, y, z
+
+        def toangle(dotted):
+            if dotted > 1.0:
+                dotted = 1.0
+            elif dotted < -1.0:
+                dotted = -1.0
+            angle = abs(math.acos(dotted))*180.0/math.pi
+            if angle > 180.0:
+                angle = 360.0 - angle
+            return angle
+
+        # Per-atom terms: H(D) coordinates with the H(D)-D direction, and
+        # H(A) coordinates with the A-H(A) direction
+
+        donorterms = []
+        for (dx, dy, dz), hcoords in donors:
+            hterms = [(hx, hy, hz, unit(hx - dx, hy - dy, hz - dz)) \
+                      for hx, hy, hz in hcoords]
+            donorterms.append((dx, dy, dz, hterms))
+
+        acceptorterms = []
+        for (ax, ay, az), hcoords in acceptors:
+            hterms = [(hx, hy, hz, unit(ax - hx, ay - hy, az - hz)) \
+                      for hx, hy, hz in hcoords]
+            acceptorterms.append((ax, ay, az, hterms))
+
+        energies = [[0.0] * len(acceptors) for _ in donors]
+        if not (donors and acceptors):
+            return energies
+
+        # Use a simple cell grid to only visit pairs within the cutoff
+
+        if cutoff is None:
+            pairs = ((i, j) for i in range(len(donors)) \
+                            for j in range(len(acceptors)))
+        else:
+            cells = {}
+            for j, (ax, ay, az, _) in enumerate(acceptorterms):
+                key = (ax // cutoff, ay // cutoff, az // cutoff)
+                cells.setdefault(key, []).append(j)
+
+            cutoff2 = cutoff * cutoff
+            pairs = []
+            for i, (dx, dy, dz, _) in enumerate(donorterms):
+                cx, cy, cz = dx // cutoff, dy // cutoff, dz // cutoff
+                near = []
+                for ci in (cx - 1, cx, cx + 1):
+                    for cj in (cy - 1, cy, cy + 1):
+                        for ck in (cz - 1, cz, cz + 1):
+                            near.extend(cells.get((ci, cj, ck), ()))
+                near.sort()
+                for j in near:
+                    ax, ay, az, _ = acceptorterms[j]
+                    p = ax - dx
+                    q = ay - dy
+                    r = az - dz
+                    if p*p + q*q + r*r <= cutoff2:
+                        pairs.append((i, j))
+
+        for i, j in pairs:
+            dx, dy, dz, donorhs = donorterms[i]
+            ax, ay, az, acceptorhs = acceptorterms[j]
+            if not donorhs:
+                continue
+
+            # The A-D direction is shared by every H(D) of this pair
+
+            ad = unit(ax - dx, ay - dy, az - dz)
+            energy = 0.0
+
+            for hx, hy, hz, hd in donorhs:
+                p = ax - hx
+                q = ay - hy
+                r = az - hz
+                dist = math.sqrt(p*p + q*q + r*r)
+                if dist > max_dha_dist and dist < max_ele_dist:
+                    energy += MAX_ELE_ENERGY/(dist*dist)
+                    continue
+
+                angle1 = toangle(hd[0]*ad[0] + hd[1]*ad[1] + hd[2]*ad[2])
+
+                # Case 1: Both donor and acceptor hydrogens are present
+                for ahx, ahy, ahz, aha in acceptorhs:
+
+                    # Penalize if H(D) is too close to H(A)
+                    p = ahx - hx
+                    q = ahy - hy
+                    r = ahz - hz
+                    hdist = math.sqrt(p*p + q*q + r*r)
+                    if hdist < BUMP_DIST:
+                        energy += BUMP_ENERGY
+                        continue
+
+                    # Assign energies based on angles
+                    if angle1 <= ADH_angle_cutoff:
+                        ha = unit(hx - ahx, hy - ahy, hz - ahz)
+                        angle2 = toangle(aha[0]*ha[0] + aha[1]*ha[1] + aha[2]*ha[2])
+                        if angle2 < DhAhA_angle_cutoff:
+                            angle2 = 1.0
+                        else:
+                            angle2 = (DhAhA_angle_cutoff - angle2)/DhAhA_angle_cutoff
+
+                        angleterm = (ADH_angle_cutoff - angle1)/ADH_angle_cutoff
+                        energy += MAX_HBOND_ENERGY/pow(dist,3)*angleterm*angle2
+
+                # Case 2: Only donor hydrogens are present
+                if len(acceptorhs) == 0:
+                    # Assign energies based on A-D-H(D) angle alone
+                    if angle1 <= ADH_angle_cutoff:
+                        angleterm = (ADH_angle_cutoff - angle1)/ADH_angle_cutoff
+                        energy += MAX_HBOND_ENERGY/pow(dist,2)*angleterm
+
+            energies[i][j] = energy
+
+        return energies
                 
     def makeAtomWithNoBonds(self, atom, closeatom, addname):
         """
@@ -769,6 +974,245 @@ class Optimize:
 
         return 1
 
+class PairEnergyTable:
+    """
+        A cache of getPairEnergies matrices for residue pairs.  Each matrix
+        is keyed by the geometry of the donors of the first residue and the
+        acceptors of the second, so it is reused whenever the same pair is
+        seen again in the same conformation - for instance across titration
+        state combinations that only change residues elsewhere.
+    """
+    def __init__(self, cutoff=None):
+        """
+            Initialize the class
+
+            Parameters
+                cutoff:  Passed on to Optimize.getPairEnergies (float)
+        """
+        self.cutoff = cutoff
+        self.tables = {}
+
+    def clear(self):
+        """
+            Drop all cached matrices
+        """
+        self.tables = {}
+
+    def getEnergies(self, residue1, residue2):
+        """
+            Get the pair energy matrix between two residues
+
+            Parameters
+                residue1:  The "donor" residue (Residue)
+                residue2:  The "acceptor" residue (Residue)
+            Returns
+                energies:  energies[i][j] is the energy between the ith
+                           donor of residue1 and the jth acceptor of
+                           residue2, in atom order (list)
+        """
+        return self.getGeometryEnergies(PairEnergyTable.getDonors(residue1),
+                                        PairEnergyTable.getAcceptors(residue2))
+
+    def getGeometryEnergies(self, donors, acceptors):
+        """
+            Get the pair energy matrix between two residues from the
+            geometry of their donors and acceptors
+
+            Parameters
+                donors:     The getPairGeometry tuple of each donor of the
+                            first residue (tuple)
+                acceptors:  The getPairGeometry tuple of each acceptor of
+                            the second residue (tuple)
+            Returns
+                energies:   As for getEnergies (list)
+        """
+        key = (donors, acceptors)
+        try:
+            return self.tables[key]
+        except KeyError:
+            energies = Optimize.getPairEnergies(donors, acceptors, self.cutoff)
+            self.tables[key] = energies
+            return energies
+
+    @staticmethod
+    def getDonors(residue):
+        """
+            Get the getPairGeometry tuple of each donor of a residue
+        """
+        return tuple(Optimize.getPairGeometry(atom) \
+                     for atom in residue.getAtoms() if atom.hdonor)
+
+    @staticmethod
+    def getAcceptors(residue):
+        """
+            Get the getPairGeometry tuple of each acceptor of a residue
+        """
+        return tuple(Optimize.getPairGeometry(atom) \
+                     for atom in residue.getAtoms() if atom.hacceptor)
+
+    def getInteractionEnergy(self, residue1, residue2):
+        """
+            Get the total energy of every atom pair between two residues.
+            The sum is taken in the same order as looping getPairEnergy
+            over every atom pair, so the result is identical.
+
+            Parameters
+                residue1:  The "donor" residue (Residue)
+                residue2:  The "acceptor" residue (Residue)
+            Returns
+                energy:    The interaction energy (float)
+        """
+        return PairEnergyTable.sumEnergies(self.getEnergies(residue1, residue2))
+
+    @staticmethod
+    def sumEnergies(energies):
+        """
+            Sum a pair energy matrix in row order
+        """
+        energy = 0.0
+        for row in energies:
+            for value in row:
+                energy += value
+        return energy
+
+    def getInteractionMatrix(self, residues, rows=None):
+        """
+            Get the interaction energy between every ordered pair of
+            residues as a sparse matrix.  The donors and acceptors of each
+            residue are gathered once, and with a cutoff, a bounding sphere
+            around them is used to skip whole pairs of residues that have
+            no donor and acceptor within the cutoff of each other.  Each
+            energy is identical to getInteractionEnergy on that pair.
+
+            Parameters
+                residues:  The residues (list)
+                rows:      If set, only the pairs that include one of the
+                           residues at these indices are computed (list)
+            Returns
+                matrix:    matrix[i, j] is the interaction energy with
+                           residues[i] as the "donor" and residues[j] as
+                           the "acceptor", for each pair whose energy is
+                           not zero (dict)
+        """
+        donors = [PairEnergyTable.getDonors(residue) for residue in residues]
+        acceptors = [PairEnergyTable.getAcceptors(residue) for residue in residues]
+
+        matrix = {}
+        for i, j in self.getResiduePairs(donors, acceptors, rows):
+            energy = PairEnergyTable.sumEnergies(
+                self.getGeometryEnergies(donors[i], acceptors[j]))
+            if energy != 0.0:
+                matrix[i, j] = energy
+        return matrix
+
+    def getResiduePairs(self, donors, acceptors, rows=None):
+        """
+            Find the ordered pairs of residues that can interact: the
+            first has donors, the second has acceptors, and with a cutoff,
+            the bounding spheres of the two are within the cutoff of each
+            other.  The spheres are found with a grid of cells.
+
+            Parameters
+                donors:     The donors of each residue, as for
+                            getGeometryEnergies (list)
+                acceptors:  The acceptors of each residue (list)
+                rows:       As for getInteractionMatrix (list)
+            Returns
+                pairs:      The (donor index, acceptor index) pairs (list)
+        """
+        if rows is None:
+            rowindices = range(len(donors))
+        else:
+            rows = set(rows)
+            rowindices = sorted(rows)
+
+        pairs = []
+        if self.cutoff is None:
+            for i in range(len(donors)):
+                if not donors[i]: continue
+                for j in range(len(acceptors)):
+                    if i == j or not acceptors[j]: continue
+                    if rows is None or i in rows or j in rows:
+                        pairs.append((i, j))
+            return pairs
+
+        donorspheres = [PairEnergyTable.getBoundingSphere(atoms) for atoms in donors]
+        acceptorspheres = [PairEnergyTable.getBoundingSphere(atoms) for atoms in acceptors]
+        radii = [sphere[1] for sphere in donorspheres + acceptorspheres if sphere]
+        if not radii:
+            return pairs
+        size = self.cutoff + 2 * max(radii)
+
+        def getCell(center):
+            return (center[0] // size, center[1] // size, center[2] // size)
+
+        def getNear(spheres, indices):
+            cells = {}
+            for j in indices:
+                if spheres[j] is not None:
+                    cells.setdefault(getCell(spheres[j][0]), []).append(j)
+            return cells
+
+        def search(spheres, cells, i, other):
+            (x, y, z), radius = spheres[i]
+            cx, cy, cz = getCell((x, y, z))
+            near = []
+            for ci in (cx - 1, cx, cx + 1):
+                for cj in (cy - 1, cy, cy + 1):
+                    for ck in (cz - 1, cz, cz + 1):
+                        for j in cells.get((ci, cj, ck), ()):
+                            if j == i: continue
+                            (ox, oy, oz), oradius = other[j]
+                            limit = radius + oradius + self.cutoff + SMALL
+                            p = ox - x
+                            q = oy - y
+                            r = oz - z
+                            if p*p + q*q + r*r <= limit*limit:
+                                near.append(j)
+            return near
+
+        # Every donor residue against every acceptor residue, or with rows,
+        #  the row residues as donors and then as acceptors
+
+        found = set()
+        cells = getNear(acceptorspheres, range(len(acceptors)))
+        for i in rowindices:
+            if donorspheres[i] is None: continue
+            for j in search(donorspheres, cells, i, acceptorspheres):
+                found.add((i, j))
+
+        if rows is not None:
+            cells = getNear(donorspheres, range(len(donors)))
+            for j in rowindices:
+                if acceptorspheres[j] is None: continue
+                for i in search(acceptorspheres, cells, j, donorspheres):
+                    found.add((i, j))
+
+        return sorted(found)
+
+    @staticmethod
+    def getBoundingSphere(atoms):
+        """
+            Get a sphere around the heavy atoms of a set of donors or
+            acceptors
+
+            Parameters
+                atoms:   The getPairGeometry tuple of each atom (tuple)
+            Returns
+                sphere:  The center and radius of the sphere, or None if
+                         there are no atoms (tuple)
+        """
+        if not atoms:
+            return None
+        count = len(atoms)
+        x = sum(coords[0] for coords, _ in atoms) / count
+        y = sum(coords[1] for coords, _ in atoms) / count
+        z = sum(coords[2] for coords, _ in atoms) / count
+        radius = 0.0
+        for (ax, ay, az), _ in atoms:
+            radius = max(radius, math.sqrt(pow(ax - x, 2) + pow(ay - y, 2) + pow(az - z, 2)))
+        return (x, y, z), radius
+
 class Flip(Optimize):
     """
         The holder for optimization of flippable residues.
@@ -2013,19 +2457,7 @@ class hydrogenRoutines:
         self.atomlist = []
         self.resmap = {}
         self.hydrodefs = []
-    
-        handler = HydrogenHandler()
-        sax.make_parser()
-
-        defpath = getDatFile(HYDPATH)
-        if defpath == "":
-            raise PDBInternalError("Could not find %s!" % HYDPATH) 
-     
-        hydrogenFile = open(defpath)
-        sax.parseString(hydrogenFile.read(), handler)
-        hydrogenFile.close()
-
-        self.map = handler.map
+        self.map = getCachedData("hydrogens", [HYDPATH], parseHydrogenFile)
 
     def debug(self, text):
         """
@@ -2397,37 +2829,44 @@ class hydrogenRoutines:
         progress = 0.0
         increment = 1.0/len(optlist) 
 
+        # Find every donor/acceptor pair within range in one batched query
+
+        objmap = {}
+        queryatoms = []
         for obj in optlist:
             connectivity[obj] = []
             for atom in obj.atomlist:
-                closeatoms = self.routines.cells.getNearCells(atom)
-                for closeatom in closeatoms:
-   
-                    # Conditions for continuing
-                
-                    if atom.residue == closeatom.residue: continue
-                    if not (closeatom.hacceptor or closeatom.hdonor): continue
-                    if atom.hdonor and not atom.hacceptor \
-                       and not closeatom.hacceptor: continue
-                    if atom.hacceptor and not atom.hdonor \
-                       and not closeatom.hdonor: continue
-                
-                    dist = distance(atom.getCoords(), closeatom.getCoords())
-                    if dist < 4.3:
-                        residue = atom.residue
-                        hbond = PotentialBond(atom, closeatom, dist)
+                objmap[atom] = obj
+                queryatoms.append(atom)
 
-                        # Store the potential bond
+        atoms1, atoms2, dists = self.routines.cells.getNearPairs(queryatoms,
+                                    HBOND_SEARCH_DIST,
+                                    lambda atom: atom.hacceptor or atom.hdonor)
 
-                        obj.hbonds.append(hbond)
+        optatoms = set(self.atomlist)
+        for atom, closeatom, dist in zip(atoms1, atoms2, dists):
 
-                        # Keep track of connectivity
-                    
-                        if closeatom in self.atomlist:
-                            closeobj = self.resmap[closeatom.residue]
-                            if closeobj not in connectivity[obj]:
-                                connectivity[obj].append(closeobj)
+            # Conditions for continuing
+
+            if atom.residue == closeatom.residue: continue
+            if atom.hdonor and not atom.hacceptor \
+               and not closeatom.hacceptor: continue
+            if atom.hacceptor and not atom.hdonor \
+               and not closeatom.hdonor: continue
 
+            # Store the potential bond
+
+            obj = objmap[atom]
+            obj.hbonds.append(PotentialBond(atom, closeatom, dist))
+
+            # Keep track of connectivity
+
+            if closeatom in optatoms:
+                closeobj = self.resmap[closeatom.residue]
+                if closeobj not in connectivity[obj]:
+                    connectivity[obj].append(closeobj)
+
+        for obj in optlist:
             progress += increment
             while progress >= 0.0499:
                 self.routines.write("*")
@@ -2447,13 +2886,12 @@ class hydrogenRoutines:
         # Determine the distinct networks
 
         networks = []
-        seen = []
+        seen = set()
         for obj in optlist:
             if obj.residue.fixed: continue
             if obj in seen: continue
             network = analyzeConnectivity(connectivity, obj)
-            for obj in network:
-                if obj not in seen: seen.append(obj)
+            seen.update(network)
              
             networks.append(network)
 
@@ -2600,13 +3038,7 @@ class hydrogenRoutines:
     # ------------------
     #
 
-        toppath = getDatFile(TOPOLOGYPATH)
-        if toppath == "":
-            raise PDBInternalError("Could not find %s!" % TOPOLOGYPATH) 
-     
-        topfile = open(toppath)
-        top = topology.Topology(topfile)
-        topfile.close()
+        top = getSharedData("topology", [TOPOLOGYPATH], parseTopologyFile)
 
 
         name = self.map[res].name
@@ -63,6 +63,8 @@ class BaseRecord(object):
     Base class for all records.
     Verifies the received record type
     """
+    __slots__ = ('original_text',)
+
     def __init__(self, line):
         record = str.strip(line[0:6])
         if record != self.__class__.__name__:
@@ -308,6 +310,9 @@ class ANISOU(BaseRecord):
 
         The ANISOU records present the anisotropic temperature factors.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'u00', 'u11', 'u22', 'u01', 'u02', 'u12', 'segID',
+                 'element', 'charge')
 
     def __init__(self, line):
         """
@@ -357,6 +362,9 @@ class SIGATM(BaseRecord):
         The SIGATM records present the standard deviation of atomic parameters
         as they appear in ATOM and HETATM records.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'sigX', 'sigY', 'sigZ', 'sigOcc', 'sigTemp', 'segID',
+                 'element', 'charge')
 
     def __init__(self, line):
         """
@@ -408,6 +416,10 @@ class HETATM(BaseRecord):
         within "non-standard" groups. These records are used for water
         molecules and atoms presented in HET groups.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'x', 'y', 'z', 'occupancy', 'tempFactor', 'segID',
+                 'element', 'charge', 'sybylType', 'lBondedAtoms', 'lBonds',
+                 'radius', 'isCterm', 'isNterm', 'mol2charge')
 
     def __init__(self,line,sybylType="A.aaa",lBonds=[],lBondedAtoms=[]): ### PC
         """
@@ -700,6 +712,9 @@ class ATOM(BaseRecord):
         always present on each ATOM record; segment identifier and charge are
         optional.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'x', 'y', 'z', 'occupancy', 'tempFactor', 'segID',
+                 'element', 'charge')
 
     def __init__(self, line):
         """
@@ -2275,42 +2290,98 @@ def readAtom(line):
     obj = klass(newline)
     return obj
 
-def readPDB(file):
-    """ Parse PDB-format data into array of Atom objects.
+def readAtomColumns(klass, line):
+    """
+        Fast path for the common case of a fully column-formatted ATOM or
+        HETATM line.  This does what klass(line) does without the per-field
+        method call overhead.  Any line it cannot handle raises an exception,
+        and the caller falls back to the record class and readAtom.
+
         Parameters
-          file:  open file object
-        Returns (dict, errlist)
-          dict:  a dictionary indexed by PDB record names
-          errlist:  a list of record names that couldn't be parsed
+            klass:  ATOM or HETATM (class)
+            line:   The stripped line to parse (string)
+        Returns
+            obj:    The parsed record (ATOM or HETATM)
     """
+    obj = klass.__new__(klass)
+    obj.original_text = line
+    obj.serial = int(line[6:11])
+    obj.name = line[12:16].strip()
+    obj.altLoc = line[16].strip()
+    obj.resName = line[17:20].strip()
+    obj.chainID = line[21].strip()
+    obj.resSeq = int(line[22:26])
+    obj.iCode = line[26].strip()
+    obj.x = float(line[30:38])
+    obj.y = float(line[38:46])
+    obj.z = float(line[46:54])
+    if klass is HETATM:
+        obj.sybylType, obj.lBonds, obj.lBondedAtoms = HETATM.__init__.__defaults__
+        obj.radius = 1.0
+        obj.isCterm = 0
+        obj.isNterm = 0
+    try:
+        obj.occupancy = float(line[54:60])
+        obj.tempFactor = float(line[60:66])
+        obj.segID = line[72:76].strip()
+        obj.element = line[76:78].strip()
+        obj.charge = line[78:80].strip()
+    except (ValueError, IndexError):
+        obj.occupancy = 0.00
+        obj.tempFactor = 0.00
+        obj.segID = ""
+        obj.element = ""
+        obj.charge = ""
+    return obj
 
-    pdblist = []  # Array of parsed lines (as objects)
-    errlist = []  # List of records we can't parse
+def iterPDB(file, errlist=None, records=None):
+    """ Parse PDB-format data one record at a time.  Reading stops at the
+        end of the file or at the first blank line.
+        Parameters
+          file:     open file object, in text or binary mode
+          errlist:  if given, the names of records that couldn't be parsed
+                    are appended to it (list)
+          records:  if given, only lines of these record types are parsed
+                    and all others are skipped (set)
+        Yields
+          obj:      the parsed record objects, in file order
+    """
+    if errlist is None:
+        errlist = []
 
-    #We can come up with nothing if can't get our file off the web.
     if file is None:
-        return pdblist, errlist
+        return
 
-    while 1:
-        line = file.readline()
-        try:
+    for line in file:
+        if isinstance(line, bytes):
             line = line.decode('utf-8')
-        except AttributeError:
-            pass
 
         line = line.strip()
         
         if line == '':
             break
 
+        record = line[0:6].strip()
+        if records is not None and record not in records:
+            continue
+
+        # ATOM and HETATM lines are nearly always column-formatted, so try
+        # the fast path before the generic record classes
+
+        if record == "ATOM" or record == "HETATM":
+            try:
+                yield readAtomColumns(lineParsers[record], line)
+                continue
+            except Exception:
+                pass
+
         # We assume we have a method for each PDB record and can therefore
         # parse them automatically
         try:
-            record = line[0:6].strip()
             if record not in errlist:
                 klass = lineParsers[record]
                 obj = klass(line)
-                pdblist.append(obj)
+                yield obj
         except KeyError as details:
             errlist.append(record)
             sys.stderr.write("Error parsing line: %s\n" % details)
@@ -2320,10 +2391,11 @@ def readPDB(file):
             if record == "ATOM" or record == "HETATM":
                 try:
                     obj = readAtom(line)
-                    pdblist.append(obj)
                 except Exception as details:
                     sys.stderr.write("Error parsing line: %s\n" % details)
                     sys.stderr.write("<%s>\n" % line.strip())
+                else:
+                    yield obj
             elif record == "SITE" or record == "TURN":
                 pass
             elif record == "SSBOND" or record == "LINK":
@@ -2333,8 +2405,73 @@ def readPDB(file):
                 sys.stderr.write("Error parsing line: %s\n" % details)
                 sys.stderr.write("<%s>\n" % line.strip())
 
+def readPDB(file):
+    """ Parse PDB-format data into array of Atom objects.
+        Parameters
+          file:  open file object
+        Returns (dict, errlist)
+          dict:  a dictionary indexed by PDB record names
+          errlist:  a list of record names that couldn't be parsed
+    """
+
+    errlist = []  # List of records we can't parse
+    pdblist = list(iterPDB(file, errlist))  # Array of parsed lines (as objects)
+
     return pdblist, errlist
 
+def iterModels(pdblist):
+    """ Split parsed PDB records into one record list per MODEL.  The
+        records that precede the first MODEL (HEADER, SEQRES, SSBOND, ...)
+        are shared by every model, and the MODEL/ENDMDL records themselves
+        are dropped, so each list reads like a single-model PDB file.
+        Records that fall outside of any MODEL after the first one are
+        ignored.
+        Parameters
+          pdblist:  the parsed records, e.g. a list from readPDB or the
+                    iterPDB generator itself
+        Yields (model, records)
+          model:    the model serial number, or 1 if the file has no
+                    MODEL records (int)
+          records:  the records making up that model (list)
+    """
+    header = []
+    records = None
+    model = None
+
+    for record in pdblist:
+        if isinstance(record, MODEL):
+            if records is not None:
+                yield model, records
+            model = record.serial
+            records = header[:]
+        elif isinstance(record, ENDMDL):
+            if records is not None:
+                yield model, records
+            records = None
+        elif records is not None:
+            records.append(record)
+        elif model is None:
+            header.append(record)
+
+    if records is not None:
+        yield model, records
+    elif model is None:
+        yield 1, header
+
+def getTopologyKey(pdblist):
+    """ Get a key identifying the atoms of a list of records regardless of
+        their coordinates, so that models which share a topology can be
+        recognized.
+        Parameters
+          pdblist:  the parsed records (list)
+        Returns
+          key:      the identity of every ATOM/HETATM record, in order (tuple)
+    """
+    return tuple((type(record), record.serial, record.name, record.altLoc,
+                  record.resName, record.chainID, record.resSeq, record.iCode)
+                 for record in pdblist
+                 if isinstance(record, (ATOM, HETATM)))
+
 def getRandom():
     """ Download a random PDB and return the path name.
         Returns
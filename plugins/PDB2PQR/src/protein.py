@@ -48,10 +48,13 @@
 __date__ = "13 May 2008"
 __author__ = "Todd Dolinsky, Yong Huang"
 
+from array import array
+
 from .pdb import *
 from .structures import *
 from .aa import *
 from .na import *
+from .errors import PDBInternalError
 
 class Protein:
     """
@@ -164,6 +167,12 @@ class Protein:
             for residue in chain.getResidues():
                 self.residues.append(residue)
 
+        # Keep the coordinates of every atom in one buffer, in atom order
+
+        self.coordinates = CoordinateStore()
+        for atom in self.getAtoms():
+            atom.setCoordinateStore(self.coordinates)
+
     def createResidue(self, residue, resname):
         """
             Create a residue object.  If the resname is a known residue
@@ -321,6 +330,90 @@ class Protein:
                 atomlist.append(atom)
         return atomlist
 
+    def getCoordinates(self, atomlist=None):
+        """
+            Get the coordinates of the protein in the layout used by
+            utilities.getDihedrals.  Without atomlist this is the buffer
+            the atoms keep their coordinates in, indexed by
+            Atom.coordindex, so it is not a copy and follows later moves.
+            With atomlist, it is a packed copy in atomlist order.
+
+            Parameters
+                atomlist:  The atoms to pack a copy of (list)
+            Returns
+                coords:    x, y, z of each atom (array)
+        """
+        if atomlist is None:
+            return self.coordinates.coords
+        return getCoordinateArray(atomlist)
+
+    def getQuadruplets(self, atomquadruplets):
+        """
+            Turn quadruplets of atoms into quadruplets of their indices in
+            getCoordinates, so that one set of indices serves every frame
+            of the protein
+
+            Parameters
+                atomquadruplets:  The four atoms of each dihedral (list)
+            Returns
+                quadruplets:      The four atom indices of each dihedral
+                                  (list)
+        """
+        store = self.coordinates
+        quadruplets = []
+        for atom1, atom2, atom3, atom4 in atomquadruplets:
+            for atom in (atom1, atom2, atom3, atom4):
+                if atom.coordstore is not store:
+                    raise PDBInternalError("Atom %s is not part of the protein!" % atom)
+            quadruplets.append((atom1.coordindex, atom2.coordindex,
+                                atom3.coordindex, atom4.coordindex))
+        return quadruplets
+
+    def getDihedralAngles(self, atomquadruplets, frames=None):
+        """
+            Calculate the dihedral angles of many quadruplets of atoms in
+            one batch, straight from the coordinate buffer of the protein
+
+            Parameters
+                atomquadruplets:  The four atoms of each dihedral (list)
+                frames:           Packed coordinates of each frame of an
+                                  ensemble in getCoordinates layout, the
+                                  current coordinates by default (list)
+            Returns
+                angles:           The dihedral angles (array), or one array
+                                  per frame if frames were given (list)
+        """
+        quadruplets = self.getQuadruplets(atomquadruplets)
+        if frames is None:
+            return getDihedrals(self.coordinates.coords, quadruplets)
+        return getDihedralFrames(frames, quadruplets)
+
+    def getAtomColumns(self, atomlist=None):
+        """
+            Get the atoms of the protein as columns, one list or array per
+            field, so they can be handed on without formatting PQR lines.
+            Atoms without charges or radii get 0.0, as in the PQR output.
+
+            Parameters
+                atomlist:  The atoms to include, all atoms by default (list)
+            Returns
+                columns:   The "type", "serial", "name", "resName",
+                           "chainID", "resSeq" and "iCode" lists, and the
+                           "x", "y", "z", "charge" and "radius" arrays,
+                           each in atomlist order (dict)
+        """
+        if atomlist is None:
+            atomlist = self.getAtoms()
+        columns = {}
+        for field in ("type", "serial", "name", "resName", "chainID",
+                      "resSeq", "iCode"):
+            columns[field] = [getattr(atom, field) for atom in atomlist]
+        for field in ("x", "y", "z"):
+            columns[field] = array('d', [getattr(atom, field) for atom in atomlist])
+        columns["charge"] = array('d', [atom.ffcharge or 0.0 for atom in atomlist])
+        columns["radius"] = array('d', [atom.radius or 0.0 for atom in atomlist])
+        return columns
+
     def getCharge(self):
         """
             Get the total charge on the protein
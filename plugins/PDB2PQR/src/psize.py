@@ -52,9 +52,12 @@
 __date__ = "4 June 2008"
 __author__ = "Dave Sept, Nathan Baker, Todd Dolinsky, Yong Huang"
 
-import string, sys, getopt
+import sys, getopt
 from sys import stdout, stderr
 from math import log
+from array import array
+from operator import add, sub
+from itertools import compress
 
 class Psize:
     """Master class for parsing input files and suggesting settings"""
@@ -76,51 +79,79 @@ class Psize:
 
     def parseString(self, structure):
         """ Parse the input structure as a string in PDB or PQR format """
-        lines = string.split(structure, "\n")
+        lines = structure.split("\n")
         self.parseLines(lines)
 
     def parseInput(self, filename):
         """ Parse input structure file in PDB or PQR format """
-        with open(filename, 'rU') as f:
-            self.parseLines(f.readlines())
+        with open(filename) as f:
+            self.parseLines(f)
 
     def parseLines(self, lines):
-        """ Parse the lines """
+        """ Parse the lines.  They may come in batches, e.g. as a PQR file
+            is streamed in, and each batch is sized with parseColumns.
+            Returns the columns of the ATOM and HETATM entries of the
+            batch (dict) """
+        columns = {"type": []}
+        for field in ("x", "y", "z", "charge", "radius"):
+            columns[field] = array('d')
         for line in lines:
-            if string.find(line,"ATOM") == 0:
-                subline = string.replace(line[30:], "-", " -")
-                words = string.split(subline)
-                if len(words) < 5:    
-                    continue
-                self.gotatom += 1
-                self.q = self.q + float(words[3])
-                rad = float(words[4])
-                center = []
-                for word in words[0:3]:
-                    center.append(float(word))
-                for i in range(3):
-                    if self.minlen[i] == None or center[i]-rad < self.minlen[i]:
-                        self.minlen[i] = center[i]-rad
-                    if self.maxlen[i] == None or center[i]+rad > self.maxlen[i]:
-                        self.maxlen[i] = center[i]+rad
-            elif string.find(line, "HETATM") == 0:
-                self.gothet = self.gothet + 1
-                # Special handling for no ATOM entries in the pqr file, only HETATM entries
-                if self.gotatom == 0:
-                    subline = string.replace(line[30:], "-", " -")
-                    words = string.split(subline)
-                    if len(words) < 5:    
-                        continue
-                    self.q = self.q + float(words[3])
-                    rad = float(words[4])
-                    center = []
-                    for word in words[0:3]:
-                        center.append(float(word))
-                    for i in range(3):
-                        if self.minlen[i] == None or center[i]-rad < self.minlen[i]:
-                            self.minlen[i] = center[i]-rad
-                        if self.maxlen[i] == None or center[i]+rad > self.maxlen[i]:
-                            self.maxlen[i] = center[i]+rad
+            if line.startswith("ATOM"):
+                record = "ATOM"
+            elif line.startswith("HETATM"):
+                record = "HETATM"
+            else:
+                continue
+            words = line[30:].replace("-", " -").split()
+            if len(words) < 5:
+                if record == "HETATM":
+                    self.gothet += 1
+                continue
+            columns["type"].append(record)
+            columns["x"].append(float(words[0]))
+            columns["y"].append(float(words[1]))
+            columns["z"].append(float(words[2]))
+            columns["charge"].append(float(words[3]))
+            columns["radius"].append(float(words[4]))
+        self.parseColumns(columns)
+        return columns
+
+    def parseColumns(self, columns):
+        """ Parse a batch of atoms given as columns, e.g. the "x", "y", "z",
+            "charge" and "radius" arrays of Protein.getAtomColumns.  An
+            optional "type" column holds the ATOM or HETATM record of each
+            atom; HETATM entries are only used while no ATOM entries have
+            been seen.  Without it, every atom is an ATOM entry. """
+        x = columns["x"]
+        y = columns["y"]
+        z = columns["z"]
+        charge = columns["charge"]
+        radius = columns["radius"]
+        types = columns.get("type")
+        if types is not None:
+            atoms = [type == "ATOM" for type in types]
+            hetatms = [type == "HETATM" for type in types]
+            self.gothet += hetatms.count(True)
+            count = atoms.count(True)
+            if self.gotatom == 0:
+                # Special handling for no ATOM entries, only HETATM entries
+                first = atoms.index(True) if count else len(atoms)
+                atoms[:first] = hetatms[:first]
+            self.gotatom += count
+            x, y, z, charge, radius = [list(compress(column, atoms))
+                                       for column in (x, y, z, charge, radius)]
+        else:
+            self.gotatom += len(x)
+        if not len(x):
+            return
+        self.q = sum(charge, self.q)
+        for i, column in enumerate((x, y, z)):
+            lower = min(map(sub, column, radius))
+            upper = max(map(add, column, radius))
+            if self.minlen[i] == None or lower < self.minlen[i]:
+                self.minlen[i] = lower
+            if self.maxlen[i] == None or upper > self.maxlen[i]:
+                self.maxlen[i] = upper
     
     def setConstant(self, name, value):
         """ Set a constant to a value; returns 0 if constant not found """
@@ -190,8 +221,8 @@ class Psize:
             if nsmem < self.constants["gmemceil"]: break
             else:
                 i = nsmall.index(max(nsmall))
-                nsmall[i] = 32 * ((nsmall[i] - 1)/32 - 1) + 1
-                if nsmall <= 0:
+                nsmall[i] = 32 * ((nsmall[i] - 1)//32 - 1) + 1
+                if nsmall[i] <= 0:
                     stdout.write("You picked a memory ceiling that is too small\n")
                     sys.exit(0)        
 
@@ -261,6 +292,129 @@ class Psize:
     def getProcGrid(self): return self.np
     def getFocus(self): return self.nfocus
 
+    def getMemory(self):
+        """ Get the estimated memory of a sequential solve on the fine
+            grid, in MB """
+        n = self.getFineGridPoints()
+        return 200.0 * n[0] * n[1] * n[2] / 1024 / 1024
+
+    def isParallel(self):
+        """ Whether the sequential solve would exceed the memory ceiling """
+        return self.getMemory() > self.constants["gmemceil"]
+
+    def getFineMeshSpacing(self):
+        """ Get the fine mesh spacing in each dimension, that of the global
+            mesh of the processors for a parallel solve """
+        flen = self.getFineGridDims()
+        if not self.isParallel():
+            n = self.getFineGridPoints()
+            return [flen[i]/(n[i]-1) for i in range(3)]
+        np = self.getProcGrid()
+        nsmall = self.getSmallest()
+        spacing = []
+        for i in range(3):
+            glob = np[i]*round(nsmall[i]/(1 + 2*self.constants["ofrac"]) - .001)
+            if np[i] == 1: glob = nsmall[i]
+            spacing.append(flen[i]/(glob-1))
+        return spacing
+
+    def getGridParameters(self):
+        """ Get everything that setAll calculated as one dict, e.g. to hand
+            the grid to a solver.  The extension is the distance from the
+            molecule to the fine grid boundary in each dimension. """
+        olen = self.getLength()
+        flen = self.getFineGridDims()
+        parallel = self.isParallel()
+        nsmall = self.getSmallest()
+        if parallel:
+            memory = 200.0 * nsmall[0] * nsmall[1] * nsmall[2] / 1024 / 1024
+        else:
+            memory = self.getMemory()
+        return {"atom_count": self.gotatom,
+                "hetatm_count": self.gothet,
+                "total_charge": self.getCharge(),
+                "lower_corner": list(self.getMin()),
+                "upper_corner": list(self.getMax()),
+                "length": list(olen),
+                "center": list(self.getCenter()),
+                "coarse_length": list(self.getCoarseGridDims()),
+                "fine_length": list(flen),
+                "fine_points": list(self.getFineGridPoints()),
+                "fine_spacing": self.getFineMeshSpacing(),
+                "extension": [(flen[i] - olen[i]) / 2 for i in range(3)],
+                "parallel": parallel,
+                "processors": [int(np) for np in self.getProcGrid()],
+                "processor_points": list(nsmall),
+                "focus_levels": self.getFocus(),
+                "memory": memory}
+
+    def getDomains(self):
+        """ Split the fine grid into the subdomains of a parallel solve, one
+            for each processor of setProcGrid, as APBS mg-para does.  Each
+            subdomain owns an equal part of the fine grid, and is solved on
+            that part extended by ofrac of its length into its neighbours,
+            with nsmall points.  The focus list gives the boxes to focus
+            through, from the coarse grid down to the solved part, the
+            number of levels being that of setFocus.  Returns one dict per
+            subdomain, the x index varying fastest (list) """
+        cen = self.getCenter()
+        clen = self.getCoarseGridDims()
+        flen = self.getFineGridDims()
+        nsmall = self.getSmallest()
+        np = [int(n) for n in self.getProcGrid()]
+        ofrac = self.constants["ofrac"]
+        levels = max(self.getFocus(), 2)
+
+        # The owned and solved extent of each part along each dimension
+        parts = []
+        for i in range(3):
+            glower = cen[i] - flen[i]/2
+            gupper = cen[i] + flen[i]/2
+            part = flen[i]/np[i]
+            extents = []
+            for k in range(np[i]):
+                lower = glower + k*part
+                upper = glower + (k+1)*part
+                if k == np[i] - 1: upper = gupper
+                slower = max(lower - ofrac*part, glower)
+                supper = min(upper + ofrac*part, gupper)
+                extents.append((lower, upper, slower, supper))
+            parts.append(extents)
+
+        domains = []
+        for k in range(np[2]):
+            for j in range(np[1]):
+                for i in range(np[0]):
+                    extents = (parts[0][i], parts[1][j], parts[2][k])
+                    center = [(e[2] + e[3])/2 for e in extents]
+                    length = [e[3] - e[2] for e in extents]
+                    focus = []
+                    for level in range(levels - 1):
+                        t = float(level)/(levels - 1)
+                        box = {"center": [], "length": []}
+                        for d in range(3):
+                            flength = clen[d] * pow(length[d]/clen[d], t)
+                            # Move the center along with the length, so that
+                            # each box stays inside the one before it
+                            if clen[d] > length[d]:
+                                w = (flength - length[d])/(clen[d] - length[d])
+                            else:
+                                w = 0.0
+                            box["center"].append(center[d] + w*(cen[d] - center[d]))
+                            box["length"].append(flength)
+                        focus.append(box)
+                    focus.append({"center": center, "length": length})
+                    domains.append({"index": [i, j, k],
+                                    "rank": len(domains),
+                                    "lower": [e[0] for e in extents],
+                                    "upper": [e[1] for e in extents],
+                                    "center": center,
+                                    "length": length,
+                                    "points": list(nsmall),
+                                    "spacing": [length[d]/(nsmall[d] - 1) for d in range(3)],
+                                    "focus": focus})
+        return domains
+
     def runPsize(self, filename):
         """ Parse input PQR file and set parameters """
         self.parseInput(filename)
@@ -312,18 +466,12 @@ clen[1], clen[2])
                 str = str + "Total processors required = %i\n" % (np[0]*np[1]*np[2])
                 str = str + "Proc. grid = %i x %i x %i\n" % (np[0], np[1], np[2])
                 str = str + "Grid pts. on each proc. = %i x %i x %i\n" % (nsmall[0], nsmall[1], nsmall[2])
-                xglob = np[0]*round(nsmall[0]/(1 + 2*self.constants["ofrac"]) - .001)
-                yglob = np[1]*round(nsmall[1]/(1 + 2*self.constants["ofrac"]) - .001)
-                zglob = np[2]*round(nsmall[2]/(1 + 2*self.constants["ofrac"]) - .001)
-                if np[0] == 1: xglob = nsmall[0]
-                if np[1] == 1: yglob = nsmall[1]
-                if np[2] == 1: zglob = nsmall[2]
-                str = str + "Fine mesh spacing = %g x %g x %g A\n" % (flen[0]/(xglob-1), flen[1]/(yglob-1), flen[2]/(zglob-1))
+                str = str + "Fine mesh spacing = %g x %g x %g A\n" % tuple(self.getFineMeshSpacing())
                 str = str + "Estimated mem. required for parallel solve = %.3f MB/proc.\n" % nsmem
                 ntot = nsmall[0]*nsmall[1]*nsmall[2]
 
             else:
-                str = str + "Fine mesh spacing = %g x %g x %g A\n" % (flen[0]/(n[0]-1), flen[1]/(n[1]-1), flen[2]/(n[2]-1))
+                str = str + "Fine mesh spacing = %g x %g x %g A\n" % tuple(self.getFineMeshSpacing())
                 str = str + "Estimated mem. required for sequential solve = %.3f MB\n" % gmem
                 ntot = n[0]*n[1]*n[2]
 
@@ -85,6 +85,38 @@ def findCoordinates(numpoints, refcoords, defcoords, defatomcoords):
 
     # Only return the first coordinates
     return newcoords[0]
+
+def findCoordinatesBatch(numpoints, requests):
+    """
+        Place several atoms in one call.  Requests that share the same
+        reference and definition coordinates share a single fit, and all
+        atoms placed by a fit are transformed together.
+
+        Parameters
+            numpoints:  The number of points in each list (int)
+            requests:   Tuples of (refcoords, defcoords, defatomcoords)
+                        as passed to findCoordinates (list)
+        Returns
+            newcoords:  The coordinates of each new atom in the reference
+                        frame, in request order (list)
+    """
+    fits = {}
+    order = []
+    for refcoords, defcoords, defatomcoords in requests:
+        key = (tuple(map(tuple, refcoords)), tuple(map(tuple, defcoords)))
+        if key not in fits:
+            fits[key] = (refcoords, defcoords, [])
+        fits[key][2].append(defatomcoords)
+        order.append((key, len(fits[key][2]) - 1))
+
+    placed = {}
+    for key, (refcoords, defcoords, defatoms) in fits.items():
+        refcenter, fitcenter, rotation = qfit(numpoints, refcoords, defcoords)
+        fitcoords = translate(len(defatoms), defatoms, fitcenter, 1)
+        rotated = rotmol(len(defatoms), fitcoords, rotation)
+        placed[key] = translate(len(defatoms), rotated, refcenter, 2)
+
+    return [placed[key][i] for key, i in order]
     
 def qtransform(numpoints, defcoords, refcenter, fitcenter, rotation):
     """
@@ -129,8 +161,6 @@ def qfit(numpoints, refcoords, defcoords):
     defcenter, defcoords = center(numpoints, defcoords)
 
     q, u = qtrfit(numpoints, defcoords, refcoords, nrot)
-    rotated = rotmol(numpoints, defcoords, u)    
-    newcoords = translate(numpoints, rotated, refcenter, 2)
 
     return refcenter, defcenter, u
 
@@ -272,6 +302,11 @@ def qtrfit(numpoints, defcoords, refcoords, nrot):
 
     return q,u
 
+# The (i, j) pairs swept by jacobi with the index ranges of the elements of
+#  a each rotation touches, precomputed since the matrices are always 4x4
+_JACOBIPAIRS = [(i, j, range(i), range(i+1, j), range(j+1, 4))
+                for j in range(1, 4) for i in range(j)]
+
 def jacobi(a, nrot):
     """
         Jacobi diagonalizer with sorted output, only good for 4x4 matrices
@@ -283,64 +318,61 @@ def jacobi(a, nrot):
             d:    Eigenvalues
             v:    Eigenvectors
     """
-    v = []
-    d = []
-    for j in range(4):
-        d.append(0)
-        v.append([])
-        for i in range(4):
-            v[j].append(0.0)
-        v[j][j] = 1.0
-        d[j] = a[j][j]
+    sqrt = math.sqrt
+    v = [[1.0, 0.0, 0.0, 0.0],
+         [0.0, 1.0, 0.0, 0.0],
+         [0.0, 0.0, 1.0, 0.0],
+         [0.0, 0.0, 0.0, 1.0]]
+    d = [a[0][0], a[1][1], a[2][2], a[3][3]]
+    a0, a1, a2 = a[0], a[1], a[2]
 
     for l in range(nrot):
-        dnorm = 0.0
-        onorm = 0.0
-        for j in range(4):
-            dnorm = dnorm + abs(d[j])
-            for i in range(j):
-                onorm = onorm + abs(a[i][j])
+        dnorm = abs(d[0]) + abs(d[1]) + abs(d[2]) + abs(d[3])
+        onorm = abs(a0[1]) + abs(a0[2]) + abs(a1[2]) + \
+                abs(a0[3]) + abs(a1[3]) + abs(a2[3])
 
         if dnorm != 0:
             if onorm/dnorm <= 1e-12: break
             
-        for j in range(1,4):
-            for i in range(j):
-                b = a[i][j]
-                if abs(b) > 0.0:
-                    dma = d[j] - d[i]
-                    if abs(dma) + abs(b) <= abs(dma):
-                        t = b / dma
-                    else:
-                        q = 0.5 * dma/b
-                        t = 1.0/(abs(q) + math.sqrt(1 + q*q))
-                        if q < 0:
-                            t = t * -1
-                    c = 1.0/math.sqrt(t*t + 1)
-                    s = t*c
-                    a[i][j] = 0.0
-                    for k in range(i):
-                        atemp = c * a[k][i] - s * a[k][j]
-                        a[k][j] = s * a[k][i] + c * a[k][j]
-                        a[k][i] = atemp
-                    for k in range(i+1 ,j):
-                        atemp = c * a[i][k] - s * a[k][j]
-                        a[k][j] = s * a[i][k] + c * a[k][j]
-                        a[i][k] = atemp
-                    for k in range(j+1, 4):
-                        atemp = c * a[i][k] - s * a[j][k]
-                        a[j][k] = s * a[i][k] + c * a[j][k]
-                        a[i][k] = atemp
-                    for k in range(4):
-                        vtemp = c * v[k][i] - s * v[k][j]
-                        v[k][j] = s * v[k][i] + c * v[k][j]
-                        v[k][i] = vtemp
+        for i, j, below, between, above in _JACOBIPAIRS:
+            ai = a[i]
+            b = ai[j]
+            if abs(b) > 0.0:
+                dma = d[j] - d[i]
+                if abs(dma) + abs(b) <= abs(dma):
+                    t = b / dma
+                else:
+                    q = 0.5 * dma/b
+                    t = 1.0/(abs(q) + sqrt(1 + q*q))
+                    if q < 0:
+                        t = t * -1
+                c = 1.0/sqrt(t*t + 1)
+                s = t*c
+                ai[j] = 0.0
+                for k in below:
+                    ak = a[k]
+                    atemp = c * ak[i] - s * ak[j]
+                    ak[j] = s * ak[i] + c * ak[j]
+                    ak[i] = atemp
+                for k in between:
+                    ak = a[k]
+                    atemp = c * ai[k] - s * ak[j]
+                    ak[j] = s * ai[k] + c * ak[j]
+                    ai[k] = atemp
+                aj = a[j]
+                for k in above:
+                    atemp = c * ai[k] - s * aj[k]
+                    aj[k] = s * ai[k] + c * aj[k]
+                    ai[k] = atemp
+                for vk in v:
+                    vtemp = c * vk[i] - s * vk[j]
+                    vk[j] = s * vk[i] + c * vk[j]
+                    vk[i] = vtemp
                             
-                    dtemp = c*c*d[i] + s*s*d[j] - 2.0*c*s*b
-                    d[j] = s*s*d[i] + c*c*d[j] +  2.0*c*s*b
-                    d[i] = dtemp
+                dtemp = c*c*d[i] + s*s*d[j] - 2.0*c*s*b
+                d[j] = s*s*d[i] + c*c*d[j] +  2.0*c*s*b
+                d[i] = dtemp
 
-    nrot = l
     for j in range(3):
         k = j
         dtemp = d[k]
@@ -351,10 +383,10 @@ def jacobi(a, nrot):
         if k > j:
             d[k] = d[j]
             d[j] = dtemp
-            for i in range(4):
-                dtemp = v[i][k]
-                v[i][k] = v[i][j]
-                v[i][j] = dtemp
+            for vi in v:
+                dtemp = vi[k]
+                vi[k] = vi[j]
+                vi[j] = dtemp
                         
     return d,v
 
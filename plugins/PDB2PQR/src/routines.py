@@ -64,6 +64,8 @@ NAS = ["A", "A5", "A3", "C", "C5", "C3", "G", "G5", "G3", "T", "T5", "T3", "U",
 
 import math
 import copy
+import multiprocessing
+import threading
 from .pdb import *
 from .utilities import *
 from .quatfit import *
@@ -75,9 +77,44 @@ from io import StringIO
 from .errors import PDBInputError, PDBInternalError, PDB2PKAError
 from pprint import pformat
 
+# The routines of a worker process, as given to _initHydrogenWorker
+_workerRoutines = None
+
+def _initHydrogenWorker(routines):
+    """
+        Keep the routines of a forked worker process.  The pool is forked,
+        so the routines are inherited rather than pickled.
+    """
+    global _workerRoutines
+    _workerRoutines = routines
+
+def _addChainHydrogens(chainindex):
+    """
+        Add the hydrogens to one chain in a forked worker process.  The
+        worker has its own copy of the protein, so the hydrogens are sent
+        back as the names of the new atoms and the final coordinates of
+        every atom in each residue, along with the messages written.
+    """
+    routines = _workerRoutines
+    messages = []
+
+    count = 0
+    numatoms = []
+    residues = [residue for residue in routines.protein.getChains()[chainindex].getResidues()
+                if isinstance(residue, (Amino, Nucleic))]
+    for residue in residues:
+        numatoms.append(len(residue.atoms))
+        count += routines.addResidueHydrogens(residue, messages)
+
+    results = []
+    for residue, oldcount in zip(residues, numatoms):
+        results.append(Routines.getAddedHydrogens(residue, oldcount))
+
+    return count, results, messages
+
 
 class Routines:
-    def __init__(self, protein, verbose, definition=None):
+    def __init__(self, protein, verbose, definition=None, refdistances=None):
         """
             Initialize the Routines class.  The class contains most
             of the main routines that run PDB2PQR
@@ -86,6 +123,9 @@ class Routines:
                 protein:  The protein to run PDB2PQR on (Protein)
                 verbose:  A flag to determine whether to write to
                           stdout
+                refdistances: The reference distances of the atoms of
+                          each residue by its bonds, kept from an earlier
+                          run so they are not recomputed (dict)
         """
         self.protein = protein
         self.definition = definition
@@ -93,6 +133,11 @@ class Routines:
         self.verbose = verbose
         self.warnings = []
         self.cells = {}
+        self.patched = {}
+        self.hydrogens = None
+        if refdistances is None:
+            refdistances = {}
+        self.refdistances = refdistances
         if definition != None:
             self.aadef = definition.getAA()
             self.nadef = definition.getNA()
@@ -164,6 +209,7 @@ class Routines:
         self.write("Applying the forcefield to the protein...")
         misslist = []
         hitlist = []
+        params = forcefield.params
         for residue in self.protein.getResidues():
             if isinstance(residue, (Amino, WAT, Nucleic)):
                 resname = residue.ffname
@@ -173,11 +219,10 @@ class Routines:
             # Apply the parameters
 
             for atom in residue.getAtoms():
-                atomname = atom.get("name")
-                charge, radius = forcefield.getParams(resname, atomname)
-                if charge != None and radius != None:
-                    atom.set("ffcharge", charge)
-                    atom.set("radius", radius)
+                atomparams = params.get((resname, atom.name))
+                if atomparams is not None:
+                    atom.ffcharge = atomparams[0]
+                    atom.radius = atomparams[1]
                     hitlist.append(atom)
                 else:
                     misslist.append(atom)
@@ -298,16 +343,39 @@ class Routines:
                     res2.peptideC = atom1
                 if atom2 != None:
                     res1.peptideN = atom2
+
+        for res1, res2 in self.findBackboneGaps():
+            text = "Gap in backbone detected between %s and %s!\n" % \
+                   (res1, res2)
+            self.write(text, 1)
+            self.warnings.append(text)
+            res2.peptideC = None
+            res1.peptideN = None
+
+    def findBackboneGaps(self):
+        """
+            Find the breaks in the backbone, i.e. consecutive amino acids
+            of a chain whose C and N atoms are too far apart to be bonded.
+
+            Returns
+                gaps:  (residue, next residue) pairs, in chain order (list)
+        """
+        gaps = []
+        for chain in self.protein.getChains():
+            for i in range(chain.numResidues() - 1):
+                res1 = chain.residues[i]
+                res2 = chain.residues[i + 1]
+                if not isinstance(res1, Amino) or not isinstance(res2, Amino):
+                    continue
+                atom1 = res1.getAtom("C")
+                atom2 = res2.getAtom("N")
                 if atom1 == None or atom2 == None:
                     continue
 
                 if distance(atom1.getCoords(), atom2.getCoords()) > PEPTIDE_DIST:
-                    text = "Gap in backbone detected between %s and %s!\n" % \
-                           (res1, res2)
-                    self.write(text, 1)
-                    self.warnings.append(text)
-                    res2.peptideC = None
-                    res1.peptideN = None
+                    gaps.append((res1, res2))
+
+        return gaps
 
     def applyPatch(self, patchname, residue):
         """
@@ -333,44 +401,24 @@ class Routines:
 
         self.write('PATCH INFO: %s patched with %s\n' % (residue,patchname),1)
 
-        # Make a copy of the reference, i.e. a new reference for
-        # this patch.  Two examples:
+        # Get the new reference for this patch.  Two examples:
         #     PEPTIDE is a special case, as it applies to
-        #             every residue.
+        #             every residue, so it is applied to the
+        #             reference in place.
         #     CTERM only applies to one specific residue, so a
-        #             deep copy is used.
+        #             patched copy of the reference is used.
 
+        patch = self.protein.patchmap[patchname]
         if patchname == "PEPTIDE":
             newreference = residue.reference
+            Routines.patchReference(newreference, patch)
         else:
-            newreference = copy.deepcopy(residue.reference)
-
-        patch = self.protein.patchmap[patchname]
-
-        # Add atoms from patch
-
-        for atomname in patch.map:
-            newreference.map[atomname] = patch.map[atomname]
-            for bond in patch.map[atomname].bonds:
-                if bond not in newreference.map: continue
-                if atomname not in newreference.map[bond].bonds:
-                    newreference.map[bond].bonds.append(atomname)
+            newreference = self.getPatchedReference(residue.reference, patchname)
 
         # Remove atoms as directed by patch
 
         for remove in patch.remove:
             if remove in residue.map: residue.removeAtom(remove)
-            if remove not in newreference.map: continue
-            removebonds = newreference.map[remove].bonds
-            del newreference.map[remove]
-            for bond in removebonds:
-                index = newreference.map[bond].bonds.index(remove)
-                del newreference.map[bond].bonds[index]
-
-        # Add the new dihedrals
-
-        for dihedral in patch.dihedrals:
-            newreference.dihedrals.append(dihedral)
 
         # Point at the new reference
 
@@ -390,6 +438,86 @@ class Routines:
                 atom = residue.getAtom(atomname)
                 atom.reference = newreference.map[atomname]
 
+    def getPatchedReference(self, reference, patchname):
+        """
+            Get a copy of a reference residue with a patch applied.  The
+            copy is shared by every residue given the same patch from the
+            same reference, so it is only made again if either of them has
+            been changed (i.e., by the PEPTIDE patch) in the meantime.
+
+            Parameters
+                reference:  The reference residue to patch (DefinitionResidue)
+                patchname:  The name of the patch (string)
+            Returns
+                newreference:  The patched reference (DefinitionResidue)
+        """
+        key = (id(reference), patchname)
+        signature = Routines.getReferenceSignature(reference)
+        patched = self.patched.get(key)
+        if patched is not None:
+            oldreference, oldsignature, newreference, newsignature = patched
+            if oldreference is reference and oldsignature == signature and \
+               Routines.getReferenceSignature(newreference) == newsignature:
+                return newreference
+
+        newreference = copy.deepcopy(reference)
+        Routines.patchReference(newreference, self.protein.patchmap[patchname])
+
+        # Keep the reference itself, so that its id is not reused
+        self.patched[key] = (reference, signature, newreference,
+                             Routines.getReferenceSignature(newreference))
+        return newreference
+
+    @staticmethod
+    def getReferenceSignature(reference):
+        """
+            Summarize the atoms and bonds of a reference residue, so that
+            changes made to it in place can be detected.
+
+            Parameters
+                reference:  The reference residue (DefinitionResidue)
+            Returns
+                signature:  The atom names in order with their numbers of
+                            bonds, and the number of dihedrals (tuple)
+        """
+        return (tuple((name, len(atom.bonds)) for name, atom in reference.map.items()),
+                len(reference.dihedrals))
+
+    @staticmethod
+    def patchReference(reference, patch):
+        """
+            Apply the atoms and dihedrals of a patch to a reference residue
+            in place.
+
+            Parameters
+                reference:  The reference residue (DefinitionResidue)
+                patch:      The patch (Patch)
+        """
+
+        # Add atoms from patch
+
+        for atomname in patch.map:
+            reference.map[atomname] = patch.map[atomname]
+            for bond in patch.map[atomname].bonds:
+                if bond not in reference.map: continue
+                if atomname not in reference.map[bond].bonds:
+                    reference.map[bond].bonds.append(atomname)
+
+        # Remove atoms as directed by patch
+
+        for remove in patch.remove:
+            if remove not in reference.map: continue
+            removebonds = reference.map[remove].bonds
+            del reference.map[remove]
+            for bond in removebonds:
+                index = reference.map[bond].bonds.index(remove)
+                del reference.map[bond].bonds[index]
+
+        # Add the new dihedrals
+
+        for dihedral in patch.dihedrals:
+            reference.dihedrals.append(dihedral)
+
     def setStates(self):
         """
             Set the state of each residue.  This is the last step
@@ -638,19 +766,17 @@ class Routines:
             self.write("No heavy atoms found missing - Done.\n")
 
     @staticmethod
-    def rebuildTetrahedral(residue, atomname):
+    def getTetrahedralGroup(residue, atomname):
         """
-            Rebuild a tetrahedral hydrogen group.  This is necessary
-            due to the shortcomings of the quatfit routine - given a
-            tetrahedral geometry and two existing hydrogens, the
-            quatfit routines have two potential solutions.  This function
-            uses basic tetrahedral geometry to fix this issue.
+            Find the tetrahedral hydrogen group an atom belongs to, if any
 
             Parameters
                 residue:  The residue in question (residue)
-                atomname: The atomname to add (string)
+                atomname: The hydrogen to check (string)
             Returns
-                1 if successful, 0 otherwise
+                bondname:     The atom carrying the group, or None if
+                              atomname is not in a tetrahedral group (string)
+                nextatomname: The heavy atom bonded to bondname (string)
         """
 
         hcount = 0
@@ -658,13 +784,13 @@ class Routines:
 
         atomref = residue.reference.map.get(atomname)
         if atomref is None:
-            return False
+            return None, None
         bondname = atomref.bonds[0]
 
         # Return if the bonded atom does not exist
 
         if not residue.hasAtom(bondname):
-            return False
+            return None, None
 
         # This group is tetrahedral if bondatom has 4 bonds,
         #  3 of which are hydrogens
@@ -678,10 +804,33 @@ class Routines:
         # Check if this is a tetrahedral group
 
         if hcount != 3 or nextatomname == None:
+            return None, None
+
+        return bondname, nextatomname
+
+    @staticmethod
+    def rebuildTetrahedral(residue, atomname):
+        """
+            Rebuild a tetrahedral hydrogen group.  This is necessary
+            due to the shortcomings of the quatfit routine - given a
+            tetrahedral geometry and two existing hydrogens, the
+            quatfit routines have two potential solutions.  This function
+            uses basic tetrahedral geometry to fix this issue.
+
+            Parameters
+                residue:  The residue in question (residue)
+                atomname: The atomname to add (string)
+            Returns
+                1 if successful, 0 otherwise
+        """
+
+        bondname, nextatomname = Routines.getTetrahedralGroup(residue, atomname)
+        if bondname is None:
             return False
 
         # Now rebuild according to the tetrahedral geometry
 
+        atomref = residue.reference.map[atomname]
         bondatom = residue.getAtom(bondname)
         nextatom = residue.getAtom(nextatomname)
         numbonds = len(bondatom.bonds)
@@ -771,7 +920,27 @@ class Routines:
 
             return 1
 
-    def addHydrogens(self):
+    @staticmethod
+    def createHydrogens(residue, requests):
+        """
+            Place a batch of hydrogens with quatfit and add them to the
+            residue in request order.
+
+            Parameters
+                residue:  The residue in question (residue)
+                requests: Tuples of (atomname, coords, refcoords,
+                          refatomcoords), as for findCoordinates (list)
+            Returns
+                count:    The number of atoms added (int)
+        """
+        if not requests:
+            return 0
+        newcoords = findCoordinatesBatch(3, [request[1:] for request in requests])
+        for request, coords in zip(requests, newcoords):
+            residue.createAtom(request[0], coords)
+        return len(requests)
+
+    def addHydrogens(self, processes=1):
         """
             Add the hydrogens to the protein.  This requires either
             the rebuildTetrahedral function for tetrahedral geometries
@@ -779,64 +948,245 @@ class Routines:
             nearby bonds to rebuild the atom; the closer the bonds, the
             more accurate the results.  As such the peptide bonds are
             used when available.
+
+            Placing hydrogens only looks at the residue and its peptide
+            neighbors, so with more than one process the chains are given
+            their hydrogens in parallel.  The atoms are then created here in
+            the same order and at the same coordinates as a serial run.
+            Only this stage is split up: the termini and missing heavy atoms
+            take a few hundredths of a second, and debumping and hydrogen
+            optimization look at the whole protein.  Adding hydrogens is a
+            fifth to a quarter of a full run, which bounds the speedup.
+
+            The workers are forked, so a process with other threads running,
+            e.g. an event loop with executors, adds the hydrogens itself.
+
+            Parameters
+                processes: The number of worker processes to use (int)
         """
         count = 0
         self.write("Adding hydrogens to the protein...\n")
-        for residue in self.protein.getResidues():
-            if not isinstance(residue, (Amino, Nucleic)):
-                continue
-            for atomname in residue.reference.map:
-                if not atomname.startswith("H"):
-                    continue
-                if residue.hasAtom(atomname):
-                    continue
-                if isinstance(residue, CYS) and residue.SSbonded and atomname == "HG":
+
+        chains = self.protein.getChains()
+        processes = min(processes, len(chains))
+        if processes > 1 and "fork" in multiprocessing.get_all_start_methods() and \
+                threading.active_count() == 1:
+            # The workers start from this protein without having to pickle it
+            context = multiprocessing.get_context("fork")
+            with context.Pool(processes, initializer=_initHydrogenWorker,
+                              initargs=(self,)) as pool:
+                results = pool.map(_addChainHydrogens, range(len(chains)), 1)
+
+            for chain, (chaincount, residues, messages) in zip(chains, results):
+                for message, indent in messages:
+                    self.write(message, indent)
+
+                aminos = [residue for residue in chain.getResidues()
+                          if isinstance(residue, (Amino, Nucleic))]
+                for residue, (names, coords) in zip(aminos, residues):
+                    Routines.replayHydrogens(residue, names, coords)
+
+                count += chaincount
+
+        else:
+            for residue in self.protein.getResidues():
+                if not isinstance(residue, (Amino, Nucleic)):
                     continue
+                count += self.addResidueHydrogens(residue)
+
+        self.write(" Added %i hydrogen atoms.\n" % count)
+
+    @staticmethod
+    def getAddedHydrogens(residue, oldcount):
+        """
+            Get the hydrogens added to a residue, so that they can be
+            added again with replayHydrogens
+
+            Parameters
+                residue:   The residue in question (residue)
+                oldcount:  The number of atoms before hydrogens were added (int)
+            Returns
+                names:     The names of the new atoms, in order (list)
+                coords:    The final coordinates of every atom (list)
+        """
+        return ([atom.name for atom in residue.atoms[oldcount:]],
+                [atom.getCoords() for atom in residue.atoms])
+
+    @staticmethod
+    def replayHydrogens(residue, names, coords):
+        """
+            Add hydrogens to a residue as found by getAddedHydrogens on a
+            residue with the same atoms and coordinates
+
+            Parameters
+                residue:   The residue in question (residue)
+                names:     The names of the new atoms, in order (list)
+                coords:    The final coordinates of every atom (list)
+        """
+        numatoms = len(residue.atoms)
+        for name, newcoords in zip(names, coords[numatoms:]):
+            residue.createAtom(name, newcoords)
+
+        # Tetrahedral groups may have been rotated after
+        #  their atoms were added
+        for atom, newcoords in zip(residue.atoms, coords):
+            atom.x, atom.y, atom.z = newcoords
+
+    @staticmethod
+    def getHydrogenInputs(residue):
+        """
+            Get everything that placing the hydrogens of a residue depends
+            on: its state and reference, its atoms with their coordinates
+            and bonds, and the neighboring peptide atoms.
+
+            Parameters
+                residue:  The residue in question (residue)
+            Returns
+                inputs:   The inputs, for comparing (tuple)
+        """
+        peptide = []
+        for atom in (residue.peptideN, residue.peptideC):
+            if atom is None:
+                peptide.append(None)
+            else:
+                peptide.append((atom.x, atom.y, atom.z))
+        atoms = tuple((atom.name, atom.x, atom.y, atom.z,
+                       tuple(bond.name for bond in atom.bonds))
+                      for atom in residue.atoms)
+        return (residue.__class__, residue.name, tuple(residue.patches),
+                residue.isNterm, residue.isCterm, getattr(residue, "SSbonded", None),
+                Routines.getReferenceSignature(residue.reference),
+                tuple(peptide), atoms)
+
+    def enableHydrogenReplay(self):
+        """
+            Keep the hydrogens placed on each residue from now on.  The
+            hydrogens last placed on the residue at the same position are
+            then reused if nothing they depend on has changed since, as
+            when the resinter extensions protonate the same protein again
+            in each titration state.
+        """
+        if self.hydrogens is None:
+            self.hydrogens = {}
+
+    def addResidueHydrogens(self, residue, messages=None):
+        """
+            Add the missing hydrogens to a single residue, replaying them if
+            enableHydrogenReplay has been called and they are unchanged
+
+            Parameters
+                residue:  The residue in question (residue)
+                messages: If given, the messages are added to this list as
+                          (message, indent) pairs instead of being
+                          written (list)
+            Returns
+                count:    The number of hydrogens added (int)
+        """
+        placed = []
+        if self.hydrogens is None:
+            count = self.placeResidueHydrogens(residue, placed)
+        else:
+            position = (residue.chainID, residue.resSeq, residue.iCode)
+            inputs = Routines.getHydrogenInputs(residue)
+            last = self.hydrogens.get(position)
+            if last is not None and last[0] == inputs:
+                names, coords, placed = last[1]
+                Routines.replayHydrogens(residue, names, coords)
+                count = len(names)
+            else:
+                oldcount = len(residue.atoms)
+                count = self.placeResidueHydrogens(residue, placed)
+                names, coords = Routines.getAddedHydrogens(residue, oldcount)
+                self.hydrogens[position] = (inputs, (names, coords, placed))
+
+        if messages is not None:
+            messages.extend(placed)
+        else:
+            for message, indent in placed:
+                self.write(message, indent)
+        return count
+
+    def placeResidueHydrogens(self, residue, messages):
+        """
+            Place the missing hydrogens of a single residue
+
+            Parameters
+                residue:  The residue in question (residue)
+                messages: The messages are added to this list as
+                          (message, indent) pairs (list)
+            Returns
+                count:    The number of hydrogens added (int)
+        """
+        count = 0
+        # Hydrogens placed by quatfit are collected and placed in one
+        #  batch.  The batch is flushed before anything that could see
+        #  its atoms, so they are created in the same order and from the
+        #  same references as when placing them one at a time.
+
+        pending = []
+        pendingnames = set()
+        for atomname in residue.reference.map:
+            if not atomname.startswith("H"):
+                continue
+            if residue.hasAtom(atomname):
+                continue
+            if isinstance(residue, CYS) and residue.SSbonded and atomname == "HG":
+                continue
 
-                # If this hydrogen is part of a tetrahedral group,
-                #  follow a different codepath
+            # If this hydrogen is part of a tetrahedral group,
+            #  follow a different codepath
 
+            if Routines.getTetrahedralGroup(residue, atomname)[0] is not None:
+                count += Routines.createHydrogens(residue, pending)
+                pending = []
+                pendingnames = set()
                 if Routines.rebuildTetrahedral(residue, atomname):
                     count += 1
                     continue
 
-                # Otherwise use the standard quatfit methods
+            # Otherwise use the standard quatfit methods
 
-                coords = []
-                refcoords = []
+            coords = []
+            refcoords = []
 
-                refatomcoords = residue.reference.map[atomname].getCoords()
-                bondlist = residue.reference.getNearestBonds(atomname)
+            refatomcoords = residue.reference.map[atomname].getCoords()
+            bondlist = residue.reference.getNearestBonds(atomname)
 
-                for bond in bondlist:
-                    if bond == "N+1":
-                        atom = residue.peptideN
-                    elif bond == "C-1":
-                        atom = residue.peptideC
-                    else:
-                        atom = residue.getAtom(bond)
+            for bond in bondlist:
+                if bond in pendingnames:
+                    count += Routines.createHydrogens(residue, pending)
+                    pending = []
+                    pendingnames = set()
 
-                    if atom == None:
-                        continue
+                if bond == "N+1":
+                    atom = residue.peptideN
+                elif bond == "C-1":
+                    atom = residue.peptideC
+                else:
+                    atom = residue.getAtom(bond)
 
-                    # Get coordinates, reference coordinates
+                if atom == None:
+                    continue
 
-                    coords.append(atom.getCoords())
-                    refcoords.append(residue.reference.map[bond].getCoords())
+                # Get coordinates, reference coordinates
 
-                    # Exit if we have enough atoms
+                coords.append(atom.getCoords())
+                refcoords.append(residue.reference.map[bond].getCoords())
 
-                    if len(coords) == 3:
-                        break
+                # Exit if we have enough atoms
 
                 if len(coords) == 3:
-                    newcoords = findCoordinates(3, coords, refcoords, refatomcoords)
-                    residue.createAtom(atomname, newcoords)
-                    count += 1
-                else:
-                    self.write("Couldn't rebuild %s in %s!\n" % (atomname, residue), 1)
+                    break
 
-        self.write(" Added %i hydrogen atoms.\n" % count)
+            if len(coords) == 3:
+                pending.append((atomname, coords, refcoords, refatomcoords))
+                pendingnames.add(atomname)
+            else:
+                messages.append(("Couldn't rebuild %s in %s!\n" % (atomname, residue), 1))
+
+        count += Routines.createHydrogens(residue, pending)
+
+        return count
 
     def removeHydrogens(self):
         self.write("Stripping hydrogens from the protein...\n")
@@ -924,7 +1274,7 @@ class Routines:
             Set the distance to the CA atom in the residue.
             This is necessary for determining which atoms are
             allowed to move during rotations.  Uses the
-            shortestPath algorithm found in utilities.py.
+            shortestPathLengths algorithm found in utilities.py.
         """
         for residue in self.protein.getResidues():
             if not isinstance(residue, Amino): continue
@@ -938,14 +1288,26 @@ class Routines:
                 text = "Cannot set references to %s without CA atom!\n"
                 raise PDBInputError(text)
 
+            # The distances only depend on the bonds within the residue,
+            #  so residues with the same atoms and bonds share them
+
+            atoms = residue.getAtoms()
+            graph = Routines.getBondGraph(residue)
+            key = (residue.isNterm, residue.isCterm, graph)
+            if graph is not None and key in self.refdistances:
+                for atom, refdistance in zip(atoms, self.refdistances[key]):
+                    atom.refdistance = refdistance
+                continue
+
             # Set up the linked map
 
-            for atom in residue.getAtoms():
+            for atom in atoms:
                 map[atom] = atom.bonds
 
             # Run the algorithm
 
-            for atom in residue.getAtoms():
+            lengths = shortestPathLengths(map, caatom)
+            for atom in atoms:
                 if atom.isBackbone():
                     atom.refdistance = -1
                 elif residue.isCterm and atom.name == "HO":   # special case for HO in Cterm
@@ -953,7 +1315,34 @@ class Routines:
                 elif residue.isNterm and (atom.name == "H3" or atom.name == "H2"):  # special case for H2 or H3 in Nterm
                     atom.refdistance = 2
                 else:
-                    atom.refdistance = len(shortestPath(map, atom, caatom)) - 1
+                    atom.refdistance = lengths[atom]
+
+            if graph is not None:
+                self.refdistances[key] = [atom.refdistance for atom in atoms]
+
+    @staticmethod
+    def getBondGraph(residue):
+        """
+            Get the bonds within a residue by atom name, so that residues
+            with the same topology can be recognized regardless of their
+            coordinates.  Bonds to atoms of other residues are kept as
+            bonds to an unnamed atom.
+
+            Parameters
+                residue:  The residue in question (residue)
+            Returns
+                graph:    The name of each atom, in order, with the sorted
+                          names of its bonded atoms, or None if the atom
+                          names are not unique (tuple)
+        """
+        atoms = residue.getAtoms()
+        inside = set(atoms)
+        if len(set([atom.name for atom in atoms])) != len(atoms):
+            return None
+        return tuple((atom.name,
+                      tuple(sorted([bond.name if bond in inside else ""
+                                    for bond in atom.bonds])))
+                     for atom in atoms)
 
     def getbumpscore(self, residue):
         """Get an bump score for the current structure"""
@@ -1214,22 +1603,39 @@ class Routines:
     def calculateDihedralAngles(self):
         """
             Calculate the dihedral angle for every residue within the protein
+
+            The quadruplets of every residue are gathered first, as
+            indices into the coordinate buffer of the protein, and
+            calculated in one batch over that buffer.
         """
+        residues = []
+        slots = []
+        quadruplets = []
         for residue in self.protein.getResidues():
             if not isinstance(residue, Amino): continue
+            residues.append(residue)
+
+            atommap = residue.map
+            for di in residue.reference.dihedrals:
+                quadruplet = []
+                for atomname in di.split()[:4]:
+                    atom = atommap.get(atomname)
+                    if atom is not None:
+                        quadruplet.append(atom.coordindex)
+
+                if len(quadruplet) == 4:
+                    slots.append(len(quadruplets))
+                    quadruplets.append(quadruplet)
+                else: slots.append(None)
+
+        angles = getDihedrals(self.protein.getCoordinates(), quadruplets)
+        slots = iter(slots)
+        for residue in residues:
             residue.dihedrals = []
-
-            refangles = residue.reference.dihedrals
-            for di in refangles:
-                coords = []
-                atoms = di.split()
-                for i in range(4):
-                    atomname = atoms[i]
-                    if residue.hasAtom(atomname):
-                        coords.append(residue.getAtom(atomname).getCoords())
-
-                if len(coords) == 4: angle = getDihedral(coords[0], coords[1], coords[2], coords[3])
-                else: angle = None
+            for di in residue.reference.dihedrals:
+                slot = next(slots)
+                if slot is None: angle = None
+                else: angle = angles[slot]
 
                 residue.addDihedralAngle(angle)
 
@@ -1797,21 +2203,21 @@ class Cells:
 
         x = atom.get("x")
         if x < 0:
-            x = (int(x) - 1) / size * size
+            x = (int(x) - 1) // size * size
         else:
-            x = int(x) / size * size
+            x = int(x) // size * size
 
         y = atom.get("y")
         if y < 0:
-            y = (int(y) - 1) / size * size
+            y = (int(y) - 1) // size * size
         else:
-            y = int(y) / size * size
+            y = int(y) // size * size
 
         z = atom.get("z")
         if z < 0:
-            z = (int(z) - 1) / size * size
+            z = (int(z) - 1) // size * size
         else:
-            z = int(z) / size * size
+            z = int(z) // size * size
 
         key = (x, y, z)
         try:
@@ -1862,3 +2268,74 @@ class Cells:
                         except KeyError: pass
 
             return closeatoms
+
+    def getNearPairs(self, atoms, cutoff, candidate=None):
+        """
+            Find every atom within a cutoff distance of each of the given
+            atoms in a single pass.  The neighboring cells of each occupied
+            cell are gathered (and filtered) only once, no matter how many
+            of the query atoms share that cell.
+
+            Pairs are returned in the same order that calling getNearCells
+            on each atom in turn and checking the distance would produce.
+
+            Parameters
+                atoms:      The atoms to find neighbors for (list)
+                cutoff:     Only pairs strictly closer than this
+                            distance are kept (float)
+                candidate:  Optional function taking an atom and returning
+                            whether it may appear as a partner (function)
+            Returns
+                atoms1:     The query atom of each pair (list)
+                atoms2:     The partner atom of each pair (list)
+                dists:      The distance between each pair (list)
+        """
+        size = self.cellsize
+        cellmap = self.cellmap
+        offsets = list(range(-1 * size, 2 * size, size))
+        # Pad the squared cutoff so the final comparison can be made on the
+        # true distance, exactly as the per-pair distance() checks do.
+        bound = cutoff * cutoff * 1.000001
+        nearmap = {}
+        atoms1 = []
+        atoms2 = []
+        dists = []
+
+        for atom in atoms:
+            cell = atom.cell
+            if cell is None:
+                continue
+
+            try:
+                nearatoms = nearmap[cell]
+            except KeyError:
+                nearatoms = []
+                x, y, z = cell
+                for i in offsets:
+                    for j in offsets:
+                        for k in offsets:
+                            newatoms = cellmap.get((x + i, y + j, z + k))
+                            if not newatoms:
+                                continue
+                            for atom2 in newatoms:
+                                if candidate is None or candidate(atom2):
+                                    nearatoms.append((atom2, atom2.x, atom2.y, atom2.z))
+                nearmap[cell] = nearatoms
+
+            ax = atom.x
+            ay = atom.y
+            az = atom.z
+            for atom2, x2, y2, z2 in nearatoms:
+                p = x2 - ax
+                q = y2 - ay
+                r = z2 - az
+                dist2 = p*p + q*q + r*r
+                if dist2 > bound or atom2 is atom:
+                    continue
+                dist = math.sqrt(dist2)
+                if dist < cutoff:
+                    atoms1.append(atom)
+                    atoms2.append(atom2)
+                    dists.append(dist)
+
+        return atoms1, atoms2, dists
@@ -51,6 +51,7 @@ __author__ = "Todd Dolinsky"
 BACKBONE = ["N","CA","C","O","O2","HA","HN","H","tN"]
 
 import string
+from array import array
 from .pdb import *
 from .utilities import *
 from .quatfit import *
@@ -368,9 +369,11 @@ class Residue:
         bonds = atom.bonds
         del self.map[atomname]
 
-        # Delete the atom from the list
+        # Delete the atom from the list, and free its place in the
+        # coordinates of the protein
 
         self.atoms.remove(atom)
+        atom.setCoordinateStore(CoordinateStore())
 
         # Delete all instances of the atom as a bond
         
@@ -555,6 +558,57 @@ class Residue:
     def letterCode(self):
         return 'X'
 
+class CoordinateStore:
+    """
+        CoordinateStore class
+
+        A packed buffer of atom coordinates, x, y and z of the atom in
+        slot i being stored at 3i, 3i+1 and 3i+2 of coords.  A Protein
+        keeps the coordinates of all of its atoms in one store, which the
+        Atom x, y and z attributes read and write, so geometry can be
+        calculated over the whole buffer without copying it.  The slots
+        of removed atoms are reused.
+    """
+    __slots__ = ('coords', 'free')
+
+    def __init__(self):
+        """
+            Initialize an empty store
+        """
+        self.coords = array('d')
+        self.free = []
+
+    def add(self, x, y, z):
+        """
+            Store the coordinates of an atom
+
+            Parameters
+                x, y, z:  The coordinates (float)
+            Returns
+                index:    The slot of the atom (int)
+        """
+        coords = self.coords
+        if self.free:
+            index = self.free.pop()
+            coords[3*index] = x
+            coords[3*index+1] = y
+            coords[3*index+2] = z
+            return index
+        index = len(coords) // 3
+        coords.append(x)
+        coords.append(y)
+        coords.append(z)
+        return index
+
+    def remove(self, index):
+        """
+            Free the slot of an atom, to be reused by the next one added
+
+            Parameters
+                index:  The slot of the atom (int)
+        """
+        self.free.append(index)
+
 class Atom(ATOM):
     """
         Class Atom
@@ -564,10 +618,18 @@ class Atom(ATOM):
         Also simplifies code by combining ATOM and HETATM objects into a
         single class.
     """
-    
+    __slots__ = ('type', 'bonds', 'reference', 'residue', 'radius',
+                 'ffcharge', 'hdonor', 'hacceptor', 'cell', 'added',
+                 'optimizeable', 'refdistance', 'id', 'mol2charge',
+                 'sybylType', 'formalcharge', 'titratableH',
+                 'coordstore', 'coordindex')
+
     def __init__(self, atom, type, residue):
         """
-            Initialize the new Atom object by using the old object.
+            Initialize the new Atom object by using the old object.  The
+            coordinates go into the CoordinateStore of the old object if
+            it is an Atom, otherwise into that of the atoms already in
+            the residue.
 
             Parameters
                 atom:    The original ATOM object (ATOM)
@@ -585,9 +647,15 @@ class Atom(ATOM):
         self.chainID = atom.chainID
         self.resSeq = atom.resSeq
         self.iCode = atom.iCode
-        self.x = atom.x
-        self.y = atom.y
-        self.z = atom.z
+        store = getattr(atom, "coordstore", None)
+        if store is None:
+            siblings = getattr(residue, "atoms", None)
+            if siblings:
+                store = siblings[0].coordstore
+            else:
+                store = CoordinateStore()
+        self.coordstore = store
+        self.coordindex = store.add(atom.x, atom.y, atom.z)
         self.occupancy = atom.occupancy
         self.tempFactor = atom.tempFactor
         self.segID = atom.segID
@@ -812,6 +880,29 @@ class Atom(ATOM):
             message = "Unable to set object \"%s\" in class Atom" % name
             raise PDBInternalError(message)   
 
+    def _getX(self):
+        return self.coordstore.coords[3*self.coordindex]
+
+    def _setX(self, value):
+        self.coordstore.coords[3*self.coordindex] = value
+
+    def _getY(self):
+        return self.coordstore.coords[3*self.coordindex+1]
+
+    def _setY(self, value):
+        self.coordstore.coords[3*self.coordindex+1] = value
+
+    def _getZ(self):
+        return self.coordstore.coords[3*self.coordindex+2]
+
+    def _setZ(self, value):
+        self.coordstore.coords[3*self.coordindex+2] = value
+
+    # The coordinates live in the CoordinateStore, not in the atom
+    x = property(_getX, _setX)
+    y = property(_getY, _setY)
+    z = property(_getZ, _setZ)
+
     def getCoords(self):
         """
             Return the x,y,z coordinates of the atom in list form
@@ -819,7 +910,23 @@ class Atom(ATOM):
             Returns
                 List of the coordinates (list)
         """
-        return [self.x, self.y, self.z]
+        i = 3*self.coordindex
+        return self.coordstore.coords[i:i+3].tolist()
+
+    def setCoordinateStore(self, store):
+        """
+            Move the coordinates of the atom into another store, e.g.
+            that of its protein, freeing its slot in the old one
+
+            Parameters
+                store:  The new store (CoordinateStore)
+        """
+        if store is self.coordstore:
+            return
+        x, y, z = self.getCoords()
+        self.coordstore.remove(self.coordindex)
+        self.coordstore = store
+        self.coordindex = store.add(x, y, z)
 
     def addBond(self, bondedatom):
         """
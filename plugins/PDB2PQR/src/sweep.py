@@ -0,0 +1,227 @@
+"""
+    Titration combination sweeps
+
+    The resinter extensions try the protein in many combinations of residue
+    titration states.  Run one after another, each combination starts from
+    the atoms left by the previous one, since debumping and hydrogen
+    optimization move atoms.  sweepCombinations instead starts every
+    combination from the same prepared protein, so that combinations are
+    independent of each other.  They can then be run in worker processes,
+    and an interrupted sweep can be resumed from a checkpoint file.
+
+    Copyright (c) 2002-2011, Jens Erik Nielsen, University College Dublin; 
+    Nathan A. Baker, Battelle Memorial Institute, Developed at the Pacific 
+    Northwest National Laboratory, operated by Battelle Memorial Institute, 
+    Pacific Northwest Division for the U.S. Department Energy.; 
+    Paul Czodrowski & Gerhard Klebe, University of Marburg.
+
+    All rights reserved.
+
+    Redistribution and use in source and binary forms, with or without modification, 
+    are permitted provided that the following conditions are met:
+
+        * Redistributions of source code must retain the above copyright notice, 
+          this list of conditions and the following disclaimer.
+        * Redistributions in binary form must reproduce the above copyright notice, 
+          this list of conditions and the following disclaimer in the documentation 
+          and/or other materials provided with the distribution.
+        * Neither the names of University College Dublin, Battelle Memorial Institute,
+          Pacific Northwest National Laboratory, US Department of Energy, or University
+          of Marburg nor the names of its contributors may be used to endorse or promote
+          products derived from this software without specific prior written permission.
+
+    THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND 
+    ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED 
+    WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. 
+    IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, 
+    INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, 
+    BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, 
+    DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+    LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE 
+    OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED 
+    OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""
+
+__date__ = "19 October 2026"
+
+import hashlib
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import traceback
+
+from .errors import PDBInternalError
+
+""" Bump this when the checkpoint file format changes """
+CHECKPOINT_VERSION = 1
+
+def _runCombination(routines, combination, process, connection):
+    """
+        Run one combination in a forked worker process, which starts from
+        the protein as it was before the sweep, and send back the result
+        along with the messages written.
+    """
+    messages = []
+    routines.write = lambda message, indent=0: messages.append((message, indent))
+    try:
+        result = process(routines, combination)
+    except Exception:
+        connection.send((None, None, traceback.format_exc()))
+    else:
+        connection.send((result, messages, None))
+    connection.close()
+
+def readCheckpoint(path, header):
+    """
+        Read the results of the combinations finished by an earlier sweep
+
+        Parameters
+            path:     The checkpoint file (string)
+            header:   What the sweep depends on, which must match the
+                      header of the checkpoint (dict)
+        Returns
+            done:     The results keyed by combination index (dict)
+    """
+    done = {}
+    if path is None or not os.path.isfile(path):
+        return done
+
+    with open(path) as checkfile:
+        try:
+            if json.loads(checkfile.readline()) != header:
+                return done
+        except ValueError:
+            return done
+        for line in checkfile:
+            # The last line is incomplete if the sweep was killed while
+            #  writing it
+            try:
+                index, result = json.loads(line)
+            except ValueError:
+                break
+            done[index] = result
+    return done
+
+def getProteinDigest(protein):
+    """
+        Get a hash of the atoms of a protein and their coordinates, so that
+        a checkpoint is only used for the protein it was written for
+
+        Parameters
+            protein:  The protein in question (Protein)
+        Returns
+            digest:   The hex digest (string)
+    """
+    digest = hashlib.sha1()
+    for atom in protein.getAtoms():
+        digest.update(("%s %s %r %r %r\n" % (atom.residue, atom.name, atom.x, atom.y, atom.z)).encode())
+    return digest.hexdigest()
+
+def sweepCombinations(routines, combinations, process, processes=1,
+                      checkpoint=None, settings=None):
+    """
+        Run every combination from the protein as it is now, and yield the
+        results in the order of the combinations.
+
+        The combinations are run in forked worker processes, one process per
+        combination, and the protein here is not changed.  Where processes
+        cannot be forked they are run on the protein here one after another,
+        each from the atoms left by the previous one.
+
+        Each result is added to the checkpoint file as it comes in, and a
+        later sweep with the same combinations and settings reuses the
+        results in the file rather than running those combinations again.
+        The file is removed once the sweep is finished.
+
+        Parameters
+            routines:      The routines of the prepared protein (Routines)
+            combinations:  The combinations, each of which must be JSON
+                           serializable (list)
+            process:       Runs one combination on the routines and returns
+                           its result, which must also be JSON serializable
+                           (function)
+            processes:     The number of worker processes to use (int)
+            checkpoint:    The path of the checkpoint file, or None (string)
+            settings:      Anything else the results depend on, which is
+                           kept in the checkpoint (dict)
+        Returns
+            results:       Pairs of combination index and result (generator)
+    """
+    # Compare combinations as they will be read back from the checkpoint,
+    #  with tuples as lists
+    combinations = json.loads(json.dumps(list(combinations)))
+    header = {"version": CHECKPOINT_VERSION,
+              "protein": getProteinDigest(routines.protein),
+              "combinations": combinations,
+              "settings": settings}
+    done = readCheckpoint(checkpoint, header)
+    if done:
+        routines.write("Resuming with %i of %i combinations done\n" % (len(done), len(combinations)))
+
+    checkfile = None
+    if checkpoint is not None:
+        checkfile = open(checkpoint, "w")
+        checkfile.write(json.dumps(header) + "\n")
+        for index in sorted(done):
+            checkfile.write(json.dumps([index, done[index]]) + "\n")
+        checkfile.flush()
+
+    pending = [index for index in range(len(combinations)) if index not in done]
+    pending.reverse()
+    results = {}
+    workers = {}
+    forked = "fork" in multiprocessing.get_all_start_methods()
+    try:
+        for index in range(len(combinations)):
+            if index in done:
+                result = done[index]
+
+            else:
+                while forked and index not in results:
+                    while pending and len(workers) < max(processes, 1):
+                        nextindex = pending.pop()
+                        receiver, sender = multiprocessing.Pipe(False)
+                        worker = multiprocessing.get_context("fork").Process(
+                            target=_runCombination,
+                            args=(routines, combinations[nextindex], process, sender))
+                        worker.start()
+                        sender.close()
+                        workers[receiver] = (nextindex, worker)
+
+                    for receiver in multiprocessing.connection.wait(list(workers)):
+                        doneindex, worker = workers.pop(receiver)
+                        try:
+                            results[doneindex] = receiver.recv()
+                        except EOFError:
+                            results[doneindex] = (None, None, "The worker process exited with code %s\n" % worker.exitcode)
+                        receiver.close()
+                        worker.join()
+
+                if forked:
+                    result, messages, error = results.pop(index)
+                    if error is not None:
+                        raise PDBInternalError("Combination %i failed in a worker process:\n%s" % (index + 1, error))
+                    for message, indent in messages:
+                        routines.write(message, indent)
+                else:
+                    result = process(routines, combinations[index])
+
+                if checkfile is not None:
+                    checkfile.write(json.dumps([index, result]) + "\n")
+                    checkfile.flush()
+
+            routines.write("Finished combination %i of %i\n" % (index + 1, len(combinations)))
+            yield index, result
+
+    finally:
+        for receiver, (doneindex, worker) in workers.items():
+            worker.terminate()
+            worker.join()
+            receiver.close()
+        if checkfile is not None:
+            checkfile.close()
+
+    if checkpoint is not None:
+        os.remove(checkpoint)
@@ -51,6 +51,8 @@ DIHEDRAL = 57.2958
 
 import math
 import os
+from array import array
+from collections import deque
 from os.path import splitext 
 import sys
 from .aconf import INSTALLDIR, TMPDIR
@@ -181,9 +183,8 @@ def sortDictByValue(inputdict):
 
 def shortestPath(graph, start, end, path=[]):
     """
-        Uses recursion to find the shortest path from one node to
-        another in an unweighted graph.  Adapted from
-        http://www.python.org/doc/essays/graphs.html .
+        Find the shortest path from one node to another in an
+        unweighted graph with a breadth-first search.
 
         Parameters:
             graph: A mapping of the graph to analyze, of the form
@@ -191,8 +192,8 @@ def shortestPath(graph, start, end, path=[]):
                    of edges.
             start: The ID of the key to start the analysis from
             end:   The ID of the key to end the analysis
-            path:  Optional argument used during the recursive step
-                   to keep the current path up to that point
+            path:  Optional list of nodes leading up to start, which
+                   the path may not pass through again
 
         Returns:
             (variable): Returns a list of the shortest path (list)
@@ -200,19 +201,58 @@ def shortestPath(graph, start, end, path=[]):
                         connected
     """
 
-    path = path + [start]
-    if start == end:
-        return path
-    if start not in graph:
-        return None
-    shortest = None
-    for node in graph[start]:
-        if node not in path:
-            newpath = shortestPath(graph, node, end, path)
-            if newpath:
-                if not shortest or len(newpath) < len(shortest):
-                    shortest = newpath
-    return shortest
+    previous = {start: None}
+    for node in path:
+        previous.setdefault(node, None)
+
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        if node == end:
+            found = []
+            while node is not None:
+                found.append(node)
+                node = previous[node]
+            found.reverse()
+            return path + found
+        for nextnode in graph.get(node, ()):
+            if nextnode not in previous:
+                previous[nextnode] = node
+                queue.append(nextnode)
+    return None
+
+def shortestPathLengths(graph, end):
+    """
+        Find the length of the shortest path from every node of a graph
+        to one node, as shortestPath would, in a single breadth-first
+        search backwards from that node.
+
+        Parameters:
+            graph: A mapping of the graph to analyze, as for shortestPath
+            end:   The ID of the key to end the analysis
+
+        Returns:
+            lengths: The number of edges from each connected node to
+                     end (dict)
+    """
+
+    # Walk the edges backwards; only the keys of the graph have edges
+    #  leading out of them
+
+    incoming = {}
+    for node, edges in graph.items():
+        for nextnode in edges:
+            incoming.setdefault(nextnode, []).append(node)
+
+    lengths = {end: 0}
+    queue = deque([end])
+    while queue:
+        node = queue.popleft()
+        for prevnode in incoming.get(node, ()):
+            if prevnode not in lengths:
+                lengths[prevnode] = lengths[node] + 1
+                queue.append(prevnode)
+    return lengths
 
 def analyzeConnectivity(map, key):
     """
@@ -222,22 +262,22 @@ def analyzeConnectivity(map, key):
             map:  The map to analyze (dict)
             key:  The key value (variable)
         Returns
-            list: A list of connected values to the key (list)
-    """
-    list = []
-    keys = [key]
-    while len(keys) > 0:
-        key = keys[0]
-        if key not in list:
-            list.append(key)
-            # The following 4 lines are modified by Greg Cipriano as a bug fix
-            if key in map:
-                for value in map[key]:
-                    if value not in list:
-                        keys.append(value)
-    
-        keys.pop(keys.index(key))
-        
+            list: A list of connected values to the key, in the order
+                  they are reached from it (list)
+    """
+    list = [key]
+    seen = set(list)
+    keys = deque(list)
+    while keys:
+        key = keys.popleft()
+        # The following 4 lines are modified by Greg Cipriano as a bug fix
+        if key in map:
+            for value in map[key]:
+                if value not in seen:
+                    seen.add(value)
+                    list.append(value)
+                    keys.append(value)
+
     return list
 
 def getAngle(coords1, coords2, coords3):
@@ -372,15 +412,10 @@ def distance(coords1, coords2):
         Returns
             dist:  Distance between the two coordinates (float)
     """
-    dist = 0.0
-    list = []
-
     p = coords2[0] - coords1[0]
     q = coords2[1] - coords1[1]
     r = coords2[2] - coords1[2]
-    dist = math.sqrt(p*p + q*q + r*r)
-
-    return dist
+    return math.sqrt(p*p + q*q + r*r)
 
 def add(coords1, coords2):
     """
@@ -422,12 +457,10 @@ def cross(coords1, coords2):
         Returns
             list:  Cross product coords2 and coords1 (list)
     """
-    list = []
     x = coords1[1]*coords2[2] -  coords1[2]*coords2[1]
     y = coords1[2]*coords2[0] -  coords1[0]*coords2[2]
     z = coords1[0]*coords2[1] -  coords1[1]*coords2[0]
-    list = [x,y,z]
-    return list
+    return [x,y,z]
 
 def dot(coords1, coords2):
     """
@@ -439,10 +472,7 @@ def dot(coords1, coords2):
         Returns
             value:  Dot product coords2 and coords1 (float)
     """
-    value = 0.0
-    for i in range(3):
-        value += coords1[i]*coords2[i]
-    return value
+    return coords1[0]*coords2[0] + coords1[1]*coords2[1] + coords1[2]*coords2[2]
 
 def normalize(coords):
     """
@@ -453,16 +483,10 @@ def normalize(coords):
         Returns
             list: normalized coordinates (list)
     """
-    list = []
     dist = math.sqrt(pow(coords[0],2) + pow(coords[1],2) + pow(coords[2],2))
     if dist > SMALL:
-        a = coords[0]/dist
-        b = coords[1]/dist
-        c = coords[2]/dist
-        list = [a,b,c]
-    else:
-        list = coords
-    return list
+        return [coords[0]/dist, coords[1]/dist, coords[2]/dist]
+    return coords
 
 def factorial(n):
     """
@@ -483,18 +507,46 @@ def getDihedral(coords1, coords2, coords3, coords4):
         Returns
             value: Size of the angle (float)
     """
-    value = 0.0
-    
-    list43 = subtract(coords4, coords3)
-    list32 = subtract(coords3, coords2)
-    list12 = subtract(coords1, coords2)
-
-    A = cross(list12, list32)
-    Anorm = normalize(A)
-    B = cross(list43, list32)
-    Bnorm = normalize(B)
-    
-    scal = dot(Anorm, Bnorm)
+    return _dihedral(coords1[0], coords1[1], coords1[2],
+                     coords2[0], coords2[1], coords2[2],
+                     coords3[0], coords3[1], coords3[2],
+                     coords4[0], coords4[1], coords4[2])
+
+def _dihedral(x1, y1, z1, x2, y2, z2, x3, y3, z3, x4, y4, z4):
+    """
+        getDihedral on unpacked coordinates.  This is the same arithmetic
+        as going through subtract, cross, normalize and dot, written out so
+        that batched callers don't build a list for every intermediate.
+    """
+    x43 = x4 - x3
+    y43 = y4 - y3
+    z43 = z4 - z3
+    x32 = x3 - x2
+    y32 = y3 - y2
+    z32 = z3 - z2
+    x12 = x1 - x2
+    y12 = y1 - y2
+    z12 = z1 - z2
+
+    ax = y12*z32 - z12*y32
+    ay = z12*x32 - x12*z32
+    az = x12*y32 - y12*x32
+    dist = math.sqrt(pow(ax,2) + pow(ay,2) + pow(az,2))
+    if dist > SMALL:
+        ax = ax/dist
+        ay = ay/dist
+        az = az/dist
+
+    bx = y43*z32 - z43*y32
+    by = z43*x32 - x43*z32
+    bz = x43*y32 - y43*x32
+    dist = math.sqrt(pow(bx,2) + pow(by,2) + pow(bz,2))
+    if dist > SMALL:
+        bx = bx/dist
+        by = by/dist
+        bz = bz/dist
+
+    scal = ax*bx + ay*by + az*bz
     if abs(scal + 1.0) < SMALL:
         value = 180.0
     elif abs(scal - 1.0) < SMALL:
@@ -502,8 +554,63 @@ def getDihedral(coords1, coords2, coords3, coords4):
     else:
         value = DIHEDRAL * math.acos(scal)
 
-    chiral = dot(cross(Anorm, Bnorm),list32)
+    chiral = (ay*bz - az*by)*x32 + (az*bx - ax*bz)*y32 + (ax*by - ay*bx)*z32
     if chiral < 0:
         value = value * -1.0
     return value
+
+def getCoordinateArray(atoms):
+    """
+        Pack the coordinates of a list of atoms into a single contiguous
+        array of doubles, x, y and z of the ith atom being stored at
+        3i, 3i+1 and 3i+2.  The index of an atom in the list is its index
+        for getDihedrals.
+
+        Parameters
+            atoms:   The atoms to pack (list)
+        Returns
+            coords:  The packed coordinates (array)
+    """
+    coords = array('d')
+    for atom in atoms:
+        coords.append(atom.x)
+        coords.append(atom.y)
+        coords.append(atom.z)
+    return coords
+
+def getDihedrals(coords, quadruplets):
+    """
+        Calculate many dihedral angles in one call
+
+        Parameters
+            coords:       Packed coordinates from getCoordinateArray (array)
+            quadruplets:  The four atom indices of each dihedral (list)
+        Returns
+            angles:       The getDihedral value of each quadruplet (array)
+    """
+    angles = array('d')
+    for i, j, k, l in quadruplets:
+        i *= 3
+        j *= 3
+        k *= 3
+        l *= 3
+        angles.append(_dihedral(coords[i], coords[i+1], coords[i+2],
+                                coords[j], coords[j+1], coords[j+2],
+                                coords[k], coords[k+1], coords[k+2],
+                                coords[l], coords[l+1], coords[l+2]))
+    return angles
+
+def getDihedralFrames(frames, quadruplets):
+    """
+        Calculate the same dihedral angles in every frame of an ensemble,
+        such as the models of an NMR structure, which share their atom
+        indices
+
+        Parameters
+            frames:       Packed coordinates of each frame (list of arrays)
+            quadruplets:  The four atom indices of each dihedral (list)
+        Returns
+            angles:       The getDihedrals array of each frame (list)
+    """
+    return [getDihedrals(coords, quadruplets) for coords in frames]
     
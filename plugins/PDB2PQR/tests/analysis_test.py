@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+
+from plugins.PDB2PQR.extensions import runExtensions, extDict
+from plugins.PDB2PQR.src.utilities import distance, getDihedral
+from protein_data import prepare
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+EXTENSIONS = {'hbond': '.hbond', 'contact': '.con', 'salt': '.salt'}
+
+HBOND_OPTIONS = [
+    dict(whatif=False, angle_cutoff=30.0, distance_cutoff=3.4, old_distance_method=False),
+    dict(whatif=True, angle_cutoff=30.0, distance_cutoff=3.4, old_distance_method=False),
+    dict(whatif=False, angle_cutoff=30.0, distance_cutoff=3.4, old_distance_method=True),
+    dict(whatif=False, angle_cutoff=40.0, distance_cutoff=4.0, old_distance_method=False),
+]
+
+def setup_output():
+    global routines, outdir
+    routines = prepare()
+    outdir = tempfile.mkdtemp()
+
+
+def teardown_output():
+    shutil.rmtree(outdir)
+
+
+def read_output(outroot, names):
+    outputs = {}
+    for name in names:
+        with open(outroot + EXTENSIONS[name]) as outfile:
+            outputs[name] = outfile.read()
+    return outputs
+
+
+def exhaustive(name, options):
+    '''The report of an analysis given every pair of atoms, the way the
+    extensions used to search for them
+    '''
+    outroot = os.path.join(outdir, 'exhaustive')
+    analysis = extDict[name].create_analysis(routines, outroot, options)
+    atoms = routines.protein.getAtoms()
+    try:
+        for atom in atoms:
+            if not analysis.isQuery(atom):
+                continue
+            for partner in atoms:
+                if partner is atom or not analysis.isPartner(partner):
+                    continue
+                dist = distance(atom.getCoords(), partner.getCoords())
+                if dist <= analysis.cutoff:
+                    analysis.addPair(atom, partner, dist)
+    finally:
+        analysis.finish()
+    return read_output(outroot, [name])[name]
+
+
+@with_setup(setup_output, teardown_output)
+def test_shared_pass_matches_exhaustive_search():
+    '''Shared Pass Matches Separate Searches
+
+    The hbond, contact and salt reports are the same from one shared pass,
+    from a pass of their own, and from checking every pair of atoms.
+    '''
+    for hbond in HBOND_OPTIONS:
+        options = SimpleNamespace(**hbond)
+        together = os.path.join(outdir, 'together')
+        runExtensions(routines, together, options, sorted(EXTENSIONS))
+        outputs = read_output(together, EXTENSIONS)
+        assert_true(outputs['contact'])
+        if not options.whatif:
+            assert_true(outputs['hbond'])
+
+        for name in EXTENSIONS:
+            alone = os.path.join(outdir, name)
+            runExtensions(routines, alone, options, [name])
+            assert_equal(read_output(alone, [name])[name], outputs[name])
+            assert_equal(exhaustive(name, options), outputs[name])
+
+
+def reference_rama():
+    '''The rama report with one getDihedral call per angle, the way it
+    used to be written
+    '''
+    lines = []
+    for residue in routines.protein.getResidues():
+        if not all(residue.hasAtom(name) for name in ('N', 'CA', 'C')):
+            continue
+        pepn = getattr(residue, 'peptideN', None)
+        pepc = getattr(residue, 'peptideC', None)
+        if pepn is None or pepc is None:
+            continue
+        n, ca, c = [residue.getAtom(name).getCoords() for name in ('N', 'CA', 'C')]
+        phi = getDihedral(pepc.getCoords(), n, ca, c)
+        psi = getDihedral(n, ca, c, pepn.getCoords())
+        lines.append('%s\t%.4f\t%.4f\n' % (residue, phi, psi))
+    return ''.join(lines)
+
+
+def reference_chi():
+    '''The chi report with one getDihedral call per angle
+    '''
+    lines = []
+    for residue in routines.protein.getResidues():
+        if not all(residue.hasAtom(name) for name in ('N', 'CA', 'CB')):
+            continue
+        gammas = [name for name in ('CG', 'OG', 'SG') if residue.hasAtom(name)]
+        if not gammas:
+            continue
+        coords = [residue.getAtom(name).getCoords()
+                  for name in ('N', 'CA', 'CB', gammas[0])]
+        lines.append('%s\t%.4f\n' % (residue, getDihedral(*coords)))
+    return ''.join(lines)
+
+
+@with_setup(setup_output, teardown_output)
+def test_dihedral_outputs():
+    '''Batched Angles Match One Angle At A Time
+
+    The rama and chi reports give the angles getDihedral gives for each
+    residue.
+    '''
+    outroot = os.path.join(outdir, 'angles')
+    options = SimpleNamespace(rama_output='rama')
+    runExtensions(routines, outroot, options, ['rama', 'chi'])
+
+    with open(outroot + '.rama') as outfile:
+        rama = outfile.read()
+    assert_true(rama)
+    assert_equal(rama, reference_rama())
+
+    with open(outroot + '.chi') as outfile:
+        chi = outfile.read()
+    assert_true(chi)
+    assert_equal(chi, reference_chi())
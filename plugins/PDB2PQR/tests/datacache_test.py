@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import os
+import shutil
+import tempfile
+
+from plugins.PDB2PQR.src import datacache
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+def setup_cache():
+    global cachedir, saved, builds
+    saved = datacache.CACHEDIR
+    cachedir = tempfile.mkdtemp()
+    datacache.CACHEDIR = os.path.join(cachedir, 'pdb2pqr')
+    datacache._pickled.clear()
+    builds = []
+
+
+def teardown_cache():
+    datacache.CACHEDIR = saved
+    datacache._pickled.clear()
+    shutil.rmtree(cachedir)
+
+
+def build():
+    builds.append(1)
+    return {'built': len(builds)}
+
+
+def get(extra=''):
+    return datacache.getCachedData('test', [], build, extra)
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_hit_and_miss():
+    '''Cached Data Hits And Misses
+
+    The object is built once and then found in memory, then on disk by a
+    new process, until its inputs change.
+    '''
+    first = get()
+    assert_equal(first, {'built': 1})
+    assert_equal(os.stat(datacache.CACHEDIR).st_mode & 0o777, 0o700)
+
+    first['changed'] = True
+    assert_equal(get(), {'built': 1})
+
+    datacache._pickled.clear()
+    assert_equal(get(), {'built': 1})
+    assert_equal(len(builds), 1)
+
+    assert_equal(get('other input'), {'built': 2})
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_shared_directory_refused():
+    '''Shared Cache Directory Is Not Used
+
+    Nothing is read from or written to a directory that others can write
+    to.
+    '''
+    os.mkdir(datacache.CACHEDIR, 0o777)
+    os.chmod(datacache.CACHEDIR, 0o777)
+    assert_false(datacache.checkCacheDir(datacache.CACHEDIR))
+
+    get()
+    datacache._pickled.clear()
+    get()
+    assert_equal(len(builds), 2)
+    assert_equal(os.listdir(datacache.CACHEDIR), [])
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_symlink_refused():
+    '''Symbolic Link Cache Directory Is Not Used
+    '''
+    target = os.path.join(cachedir, 'elsewhere')
+    os.mkdir(target, 0o700)
+    os.symlink(target, datacache.CACHEDIR)
+    assert_false(datacache.checkCacheDir(datacache.CACHEDIR))
+
+    get()
+    assert_equal(os.listdir(target), [])
+
+
+def results():
+    return sorted(os.listdir(os.path.join(datacache.CACHEDIR, 'results')))
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_result_hit_and_miss():
+    '''Cached Result Hits And Misses
+    '''
+    stats = dict(datacache.resultstats)
+    key = datacache.getResultKey(b'input', '--ff=amber', [])
+    assert_not_equal(key, datacache.getResultKey(b'input', '--ff=parse', []))
+    assert_not_equal(key, datacache.getResultKey(b'other', '--ff=amber', []))
+
+    assert_is_none(datacache.getCachedResult(key))
+    datacache.storeResult(key, ('header', ['line']))
+    assert_equal(datacache.getCachedResult(key), ('header', ['line']))
+    assert_equal(datacache.resultstats['misses'], stats['misses'] + 1)
+    assert_equal(datacache.resultstats['hits'], stats['hits'] + 1)
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_result_eviction():
+    '''Least Recently Used Results Are Evicted
+    '''
+    result = 'x' * 1000
+    for key, mtime in (('old', 1000), ('used', 2000), ('new', 3000)):
+        datacache.storeResult(key, result)
+        path = os.path.join(datacache.CACHEDIR, 'results', key + '.pickle')
+        os.utime(path, (mtime, mtime))
+    size = os.path.getsize(path)
+
+    datacache.getCachedResult('used')
+    datacache.evictResults(2 * size)
+    assert_equal(results(), ['new.pickle', 'used.pickle'])
+
+    datacache.storeResult('newest', result, maxsize=2 * size)
+    assert_equal(results(), ['newest.pickle', 'used.pickle'])
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_result_directory():
+    '''Result Cache Directory
+
+    The result cache can be moved, and is not used if others can write to
+    it.
+    '''
+    other = os.path.join(cachedir, 'other')
+    datacache.storeResult('key', 'result', cachedir=other)
+    assert_equal(datacache.getCachedResult('key', cachedir=other), 'result')
+    assert_is_none(datacache.getCachedResult('key'))
+
+    os.chmod(os.path.join(other, 'results'), 0o777)
+    assert_is_none(datacache.getCachedResult('key', cachedir=other))
+    datacache.storeResult('another', 'result', cachedir=other)
+    assert_equal(os.listdir(os.path.join(other, 'results')), ['key.pickle'])
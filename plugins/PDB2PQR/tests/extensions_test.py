@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import os
+import shutil
+import sys
+import tempfile
+from unittest.mock import patch
+
+from plugins.PDB2PQR.extensions import (extDict, getExtensionOptions,
+                                        runExtensions, forkExtensions)
+from protein_data import prepare
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+def setup_output():
+    global routines, outdir
+    routines = prepare()
+    outdir = tempfile.mkdtemp()
+
+
+def teardown_output():
+    shutil.rmtree(outdir)
+
+
+def test_extensions_imported_when_used():
+    '''Extensions Are Imported When First Used
+    '''
+    assert_raises(KeyError, extDict.__getitem__, 'nonsense')
+    module = extDict['salt']
+    assert_is(extDict['salt'], module)
+    assert_in('plugins.PDB2PQR.extensions.salt', sys.modules)
+
+
+def test_extension_options():
+    '''Extension Options Without A Command Line
+
+    The options get the defaults the extensions give them, and the values
+    given override them.
+    '''
+    options = getExtensionOptions(['hbond', 'newresinter'])
+    assert_equal((options.whatif, options.angle_cutoff, options.distance_cutoff),
+                 (False, 30.0, 3.4))
+    assert_is_none(options.newresinter_cutoff)
+
+    options = getExtensionOptions(['hbond'], {'whatif': True, 'clean': False})
+    assert_equal((options.whatif, options.clean), (True, False))
+
+
+@with_setup(setup_output, teardown_output)
+def test_forked_extensions():
+    '''Forked Extensions Match Running Them Here
+
+    The forked process writes what the extensions write when run in this
+    one, and reports the error of one that fails.
+    '''
+    names = ['contact', 'hbond', 'summary']
+    options = getExtensionOptions(names)
+    here = os.path.join(outdir, 'here')
+    runExtensions(routines, here, options, names)
+
+    forked = os.path.join(outdir, 'forked')
+    worker, receiver = forkExtensions(routines, forked, options, names)
+    assert_is_none(receiver.recv())
+    worker.join()
+    for suffix in ('.con', '.hbond', '.summary'):
+        with open(here + suffix) as expected, open(forked + suffix) as found:
+            assert_equal(found.read(), expected.read())
+
+    missing = os.path.join(outdir, 'missing', 'forked')
+    worker, receiver = forkExtensions(routines, missing, options, names)
+    assert_in('No such file or directory', receiver.recv())
+    worker.join()
+
+
+@with_setup(setup_output, teardown_output)
+def test_unforked_extensions():
+    '''Extensions Run Here Where Processes Cannot Be Forked
+
+    They run on a copy of the routines, so an extension that changes the
+    protein, as resinter does, leaves it as it was.
+    '''
+    names = ['resinter']
+    options = getExtensionOptions(names)
+    for name, value in dict(clean=False, neutraln=False, neutralc=False,
+                            ligand=None, assign_only=False, chain=False,
+                            debump=True, opt=True,
+                            residue_combinations=True).items():
+        setattr(options, name, value)
+    before = routines.protein.printAtoms(routines.protein.getAtoms())
+    with patch('multiprocessing.get_all_start_methods', return_value=['spawn']):
+        worker, receiver = forkExtensions(routines, os.path.join(outdir, 'here'),
+                                          options, names)
+    assert_is_none(worker)
+    assert_is_none(receiver.recv())
+    assert_true(os.path.getsize(os.path.join(outdir, 'here.resinter')))
+    assert_equal(routines.protein.printAtoms(routines.protein.getAtoms()), before)
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import shutil
+import tempfile
+
+from plugins.PDB2PQR.src import datacache
+from plugins.PDB2PQR.src.definitions import Definition
+from plugins.PDB2PQR.src.forcefield import Forcefield
+from plugins.PDB2PQR.src.utilities import getFFfile, getNamesFile
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+FORCEFIELDS = ['amber', 'charmm', 'parse', 'peoepb', 'swanson', 'tyl06']
+
+def setup_cache():
+    global cachedir, saved, definition
+    saved = datacache.CACHEDIR
+    cachedir = tempfile.mkdtemp()
+    datacache.CACHEDIR = cachedir
+    datacache._pickled.clear()
+    definition = Definition()
+
+
+def teardown_cache():
+    datacache.CACHEDIR = saved
+    datacache._pickled.clear()
+    shutil.rmtree(cachedir)
+
+
+def parameters(ffmap):
+    '''Every atom's parameters, read the long way through the residues
+    '''
+    return {(resname, atomname): (atom.charge, atom.radius, atom.group)
+            for resname, residue in ffmap.items()
+            for atomname, atom in residue.atoms.items()}
+
+
+def parsed(ff):
+    '''A forcefield parsed without the cache
+    '''
+    forcefield = Forcefield.__new__(Forcefield)
+    forcefield.name = ff
+    return forcefield.parseForcefield(ff, definition, None, None)
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_cached_forcefields_match_parsing():
+    '''Cached Forcefields Match Parsing
+
+    Each stock forcefield is the same whether it was just parsed, built
+    into the cache, or loaded from the cache by a new process.
+    '''
+    for ff in FORCEFIELDS:
+        expected = parameters(parsed(ff))
+        assert_equal(parameters(Forcefield(ff, definition, None).map), expected)
+
+        datacache._pickled.clear()
+        forcefield = Forcefield(ff, definition, None)
+        assert_equal(parameters(forcefield.map), expected)
+        assert_equal(forcefield.params, expected)
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_user_forcefield_matches_stock():
+    '''User Forcefield Files Are Parsed Directly
+    '''
+    with open(getFFfile('amber')) as userff, \
+            open(getNamesFile('amber')) as usernames:
+        forcefield = Forcefield('amber', definition, userff, usernames)
+    assert_equal(forcefield.params, parameters(parsed('amber')))
+
+
+@with_setup(setup_cache, teardown_cache)
+def test_flat_lookups():
+    '''Flat Parameter Lookups
+
+    getParams and getGroup give what the residue walk gives, including for
+    names the forcefield does not have.
+    '''
+    forcefield = Forcefield('parse', definition, None)
+    for resname, residue in forcefield.map.items():
+        for atomname, atom in residue.atoms.items():
+            assert_equal(forcefield.getParams(resname, atomname),
+                         (atom.charge, atom.radius))
+            assert_equal(forcefield.getGroup(resname, atomname), atom.group)
+
+    assert_equal(forcefield.getParams('ALA', 'XX'), (None, None))
+    assert_equal(forcefield.getParams('XXX', 'CA'), (None, None))
+    assert_equal(forcefield.getGroup('XXX', 'CA'), '')
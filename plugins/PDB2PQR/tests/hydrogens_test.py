@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+from itertools import permutations, product
+
+from plugins.PDB2PQR.src.hydrogens import Optimize, PairEnergyTable
+from protein_data import prepare
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+def setup_protein():
+    global residues
+    residues = prepare().protein.getResidues()
+
+
+def pair_energy(residue1, residue2):
+    '''The interaction energy the way resinter used to sum it
+    '''
+    energy = 0.0
+    for donor, acceptor in product(residue1.getAtoms(), residue2.getAtoms()):
+        energy += Optimize.getPairEnergy(donor, acceptor)
+    return energy
+
+
+@with_setup(setup_protein)
+def test_interaction_energy():
+    '''Test Batched Pair Energies
+
+    PairEnergyTable gives the same energy as summing getPairEnergy over every
+    atom pair, including when the matrix comes from the cache.
+    '''
+    table = PairEnergyTable()
+    for residue1, residue2 in permutations(residues, 2):
+        expected = pair_energy(residue1, residue2)
+        assert_equal(table.getInteractionEnergy(residue1, residue2), expected)
+        assert_equal(table.getInteractionEnergy(residue1, residue2), expected)
+    assert_true(any(table.tables.values()))
+
+
+@with_setup(setup_protein)
+def test_interaction_matrix():
+    '''Test Sparse Interaction Matrices
+
+    Every entry of the matrix, with or without a cutoff and for all
+    residues or only some rows, is the energy of that pair on its own.
+    '''
+    for cutoff in (None, 3.0, 6.0):
+        table = PairEnergyTable(cutoff)
+        expected = {}
+        for (i, residue1), (j, residue2) in permutations(enumerate(residues), 2):
+            energy = PairEnergyTable(cutoff).getInteractionEnergy(residue1, residue2)
+            if cutoff is None:
+                assert_equal(energy, pair_energy(residue1, residue2))
+            if energy != 0.0:
+                expected[i, j] = energy
+        assert_equal(table.getInteractionMatrix(residues), expected)
+
+        rows = [0, 5]
+        assert_equal(PairEnergyTable(cutoff).getInteractionMatrix(residues, rows),
+                     {(i, j): energy for (i, j), energy in expected.items()
+                      if i in rows or j in rows})
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import copy
+import io
+import shutil
+import tempfile
+import threading
+from unittest.mock import patch
+
+from plugins.PDB2PQR.main import runPDB2PQR, runPDB2PQRModels, processPDB
+from plugins.PDB2PQR.src import datacache
+from plugins.PDB2PQR.src.pdb import readPDB, iterModels, ATOM, HETATM, TER
+from plugins.PDB2PQR.src.utilities import getFFfile, getNamesFile
+from protein_data import PDB_FILE, read_model
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+def read_models():
+    with open(PDB_FILE) as f:
+        pdblist, errlist = readPDB(f)
+    return iterModels(pdblist)
+
+
+def two_chains():
+    '''The two models of PDB_FILE as chains A and B of one structure
+    '''
+    records = read_model(1)
+    for record in read_model(2):
+        if isinstance(record, (ATOM, HETATM, TER)):
+            record = copy.copy(record)
+            record.chainID = 'B'
+            if not isinstance(record, TER):
+                record.serial += 1000
+                record.x += 30.0
+            records.append(record)
+    return records
+
+
+def test_user_forcefield_models():
+    '''User Forcefield For Every Model
+
+    Each model reads its own copy of the user forcefield and names files,
+    and gets the parameters the stock forcefield gives it.
+    '''
+    with open(getFFfile('amber')) as userff, \
+            open(getNamesFile('amber')) as usernames:
+        user = [(model, lines) for model, header, lines, missed in
+                runPDB2PQRModels(read_models(), None, userff=userff,
+                                 usernames=usernames)]
+    stock = [(model, lines) for model, header, lines, missed in
+             runPDB2PQRModels(read_models(), 'amber')]
+    assert_equal([model for model, lines in user], [1, 2])
+    assert_equal(user, stock)
+
+
+def test_models_match_separate_runs():
+    '''Models Match Separate Runs
+
+    Reusing a model's topology, or the reference distances of its residues,
+    gives every model the output of running it on its own.
+    '''
+    for options in ({}, {'assign_only': True}, {'clean': True}):
+        separate = [(model, runPDB2PQR(records, 'amber', **options)[1])
+                    for model, records in read_models()]
+        together = [(model, lines) for model, header, lines, missed in
+                    runPDB2PQRModels(read_models(), 'amber', **options)]
+        assert_equal(together, separate)
+
+
+def test_process_pdb_user_forcefield():
+    '''In-process Runs With A User Forcefield
+
+    Every model of every run reads the user forcefield files afresh.
+    '''
+    with open(PDB_FILE) as f:
+        pdblist, errlist = readPDB(f)
+    user = {'userff': getFFfile('amber'), 'usernames': getNamesFile('amber'),
+            'models': True}
+    stock = {'ff': 'amber', 'models': True}
+
+    expected = [(metadata['model'], metadata['lines'], atoms['charge'])
+                for atoms, metadata in processPDB(pdblist, stock)]
+    assert_equal([model for model, lines, charge in expected], [1, 2])
+    for run in range(2):
+        assert_equal([(metadata['model'], metadata['lines'], atoms['charge'])
+                      for atoms, metadata in processPDB(pdblist, user)],
+                     expected)
+
+
+def test_process_pdb_result_cache():
+    '''In-process Runs From The Result Cache
+
+    A second run on the same file and options gives the same models from
+    the result cache, without routines, and one that keeps its routines
+    is always run in full.
+    '''
+    with open(PDB_FILE, 'rb') as f:
+        data = f.read()
+    pdblist, errlist = readPDB(io.BytesIO(data))
+    cachedir = tempfile.mkdtemp()
+    options = {'ff': 'amber', 'models': True, 'cache_dir': cachedir}
+    try:
+        expected = [(metadata['model'], metadata['lines'], list(atoms['x']))
+                    for atoms, metadata in processPDB(pdblist, options, data=data)]
+        hits = datacache.resultstats['hits']
+        cached = list(processPDB(pdblist, options, data=data))
+        assert_equal(datacache.resultstats['hits'], hits + 1)
+        assert_equal([(metadata['model'], metadata['lines'], list(atoms['x']))
+                      for atoms, metadata in cached], expected)
+        assert_equal([metadata['routines'] for atoms, metadata in cached],
+                     [None, None])
+
+        kept = list(processPDB(pdblist, options, keep=True, data=data))
+        assert_equal(datacache.resultstats['hits'], hits + 1)
+        assert_true(all(metadata['routines'] for atoms, metadata in kept))
+    finally:
+        shutil.rmtree(cachedir)
+
+
+def test_parallel_chains_match_serial():
+    '''Parallel Chains Match A Serial Run
+
+    Adding the hydrogens of each chain in its own process gives the same
+    output as adding them all in this one.
+    '''
+    serial = runPDB2PQR(two_chains(), 'amber', processes=1, chain=True)
+    parallel = runPDB2PQR(two_chains(), 'amber', processes=2, chain=True)
+    assert_equal(parallel, serial)
+    assert_equal(set(line[21] for line in serial[1] if line.startswith('ATOM')),
+                 set('AB'))
+
+
+def test_parallel_chains_with_threads():
+    '''Parallel Chains With Other Threads Running
+
+    A process with other threads running is not forked, and adds the
+    hydrogens of every chain itself.
+    '''
+    serial = runPDB2PQR(two_chains(), 'amber', processes=1, chain=True)
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        with patch('multiprocessing.context.ForkContext.Pool') as pool:
+            threaded = runPDB2PQR(two_chains(), 'amber', processes=2, chain=True)
+    finally:
+        stop.set()
+        thread.join()
+    assert_false(pool.called)
+    assert_equal(threaded, serial)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import copy
+import io
+import pickle
+
+from plugins.PDB2PQR.src.pdb import *
+from plugins.PDB2PQR.src.definitions import Definition
+from plugins.PDB2PQR.src.protein import Protein
+from plugins.PDB2PQR.src.structures import Atom
+from plugins.PDB2PQR.src.utilities import getCoordinateArray
+from plugins.PDB2PQR.src.errors import PDBInternalError
+from plugins.ParsePDB import pdb as parsepdb
+from protein_data import PDB_FILE, read_model, prepare
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+ATOM_LINE = 'ATOM      2  CA  ILE A   1      -5.843  -3.553   3.104  1.00  0.00           C'
+HETATM_LINE = 'HETATM  203  N   NH2 A  14       4.110  -0.373  -4.546  1.00  0.00           N'
+
+# Atom lines the column reader has to treat the way the record classes do
+ATOM_LINES = [
+    ATOM_LINE,
+    HETATM_LINE,
+    'ATOM   1234 HD21 ASNBB1000A     12.345-123.456  99.999  0.50 99.99      SEG1 N1-',
+    'ATOM      2  CA  ILE A   1      -5.843  -3.553   3.104  1.00  0.00',
+    'ATOM      2  CA  ILE A   1      -5.843  -3.553   3.104  1.00',
+    'ATOM      2  CA  ILE A   1      -5.843  -3.553   3.104',
+    'HETATM99999 ZN    ZN     1       0.000   0.000   0.000  1.00  0.00          ZN2+',
+]
+
+
+def fields(record):
+    '''The type and every field of a parsed record
+    '''
+    values = dict(getattr(record, '__dict__', {}))
+    for klass in type(record).__mro__:
+        for name in getattr(klass, '__slots__', ()):
+            if hasattr(record, name):
+                values[name] = getattr(record, name)
+    return type(record), values
+
+
+def reference_records(lines):
+    '''Parse lines through the record classes alone, as readPDB used to
+    '''
+    records = []
+    for line in lines:
+        line = line.strip()
+        if line == '':
+            break
+        records.append(lineParsers[line[0:6].strip()](line))
+    return records
+
+def test_records_have_no_dict():
+    '''Test Slotted Atom Records
+
+    Atom records and atoms keep their fields in slots, not a __dict__.
+    '''
+    atom = ATOM(ATOM_LINE)
+    hetatm = HETATM(HETATM_LINE)
+    for record in (atom, hetatm, Atom(atom, 'ATOM', None)):
+        assert_false(hasattr(record, '__dict__'))
+
+
+def test_atom_fields():
+    '''Test Slotted Atom Fields
+
+    Atoms are copied from their records, get and set work on every field,
+    and unknown fields are still reported as PDBInternalError.
+    '''
+    atom = Atom(ATOM(ATOM_LINE), 'ATOM', None)
+    assert_equal((atom.name, atom.resName, atom.resSeq), ('CA', 'ILE', 1))
+    assert_equal(atom.getCoords(), [-5.843, -3.553, 3.104])
+    atom.set('ffcharge', 0.5)
+    assert_equal(atom.get('ffcharge'), 0.5)
+    assert_raises(PDBInternalError, atom.get, 'nonsense')
+
+
+def test_coordinate_store():
+    '''Test The Protein Coordinate Buffer
+
+    The atoms of a protein keep their coordinates in one buffer, which
+    getCoordinates returns without copying.  Removed atoms take their
+    coordinates with them, and free their place for new atoms.
+    '''
+    protein = Protein(read_model(), Definition())
+    atoms = protein.getAtoms()
+    coords = protein.getCoordinates()
+    assert_is(protein.getCoordinates(), coords)
+    assert_equal(coords, getCoordinateArray(atoms))
+    assert_true(all(atom.coordstore is protein.coordinates for atom in atoms))
+
+    atom = atoms[5]
+    atom.x = 1.5
+    atom.set('z', -2.0)
+    assert_equal(coords[3*atom.coordindex:3*atom.coordindex+3].tolist(),
+                 [1.5, atom.y, -2.0])
+
+    residue = atom.residue
+    where = atom.getCoords()
+    residue.removeAtom(atom.name)
+    assert_is_not(atom.coordstore, protein.coordinates)
+    assert_equal(atom.getCoords(), where)
+    assert_equal(len(coords), 3 * len(atoms))
+
+    residue.createAtom('HX', [7.0, 8.0, 9.0])
+    added = residue.getAtom('HX')
+    assert_is(added.coordstore, protein.coordinates)
+    assert_equal(len(coords), 3 * len(atoms))
+    assert_equal(added.getCoords(), [7.0, 8.0, 9.0])
+
+
+def test_prepared_atoms_pickle():
+    '''Test Copying Slotted Atoms
+
+    Prepared atoms, with the attributes added along the way, survive
+    pickling and deep copies, as the worker processes and patches need.
+    '''
+    residues = prepare().protein.getResidues()
+    for residue in (copy.deepcopy(residues), pickle.loads(pickle.dumps(residues))):
+        for old, new in zip(residues, residue):
+            assert_equal([(a.name, a.getCoords(), a.hdonor, a.hacceptor) for a in old.getAtoms()],
+                         [(a.name, a.getCoords(), a.hdonor, a.hacceptor) for a in new.getAtoms()])
+
+
+def test_atom_columns_match_records():
+    '''Test The Fast Atom Path
+
+    readAtomColumns gives the same record as the ATOM and HETATM classes.
+    '''
+    for line in ATOM_LINES:
+        klass = lineParsers[line[0:6].strip()]
+        assert_equal(fields(readAtomColumns(klass, line)), fields(klass(line)))
+
+
+def test_parse_pdb_record_columns():
+    '''Test The ParsePDB Fast Atom Path
+
+    The ParsePDB reader gives the same ATOM and HETATM records as its own
+    record classes.
+    '''
+    for line in ATOM_LINES:
+        record = line[0:6].strip()
+        klass = parsepdb.lineParsers[record]
+        parsed = parsepdb.parsePDBRecord(line)
+        assert_equal(parsed[0], record)
+        assert_equal(fields(parsed[1]), fields(klass(line.strip())))
+
+
+def test_read_pdb_matches_record_classes():
+    '''Test Streaming PDB Reader
+
+    readPDB and iterPDB, from text or bytes, give the records the record
+    classes give line by line, and a record filter only drops records.
+    '''
+    with open(PDB_FILE) as f:
+        lines = f.readlines()
+    expected = [fields(record) for record in reference_records(lines)]
+
+    pdblist, errlist = readPDB(io.StringIO(''.join(lines)))
+    assert_equal([fields(record) for record in pdblist], expected)
+    assert_equal(errlist, [])
+
+    binary = iterPDB(io.BytesIO(''.join(lines).encode()))
+    assert_equal([fields(record) for record in binary], expected)
+
+    filtered = iterPDB(io.StringIO(''.join(lines)), records={'ATOM', 'MODEL'})
+    assert_equal([fields(record) for record in filtered],
+                 [record for record in expected
+                  if record[0] in (ATOM, MODEL)])
+
+
+def test_read_pdb_stops_at_blank_line():
+    '''Test Reading Stops At A Blank Line
+    '''
+    pdblist, errlist = readPDB(io.StringIO(ATOM_LINE + '\n\n' + HETATM_LINE + '\n'))
+    assert_equal([fields(record) for record in pdblist], [fields(ATOM(ATOM_LINE))])
+
+
+def test_iter_models():
+    '''Test Splitting Models
+
+    Each model gets the records before the first MODEL and its own records,
+    without the MODEL and ENDMDL records, whether it is given a list or the
+    reader itself.
+    '''
+    with open(PDB_FILE) as f:
+        pdblist, errlist = readPDB(f)
+    starts = [i for i, record in enumerate(pdblist) if isinstance(record, MODEL)]
+    ends = [i for i, record in enumerate(pdblist) if isinstance(record, ENDMDL)]
+    header = pdblist[:starts[0]]
+
+    models = list(iterModels(pdblist))
+    assert_equal([model for model, records in models], [1, 2])
+    for (model, records), start, end in zip(models, starts, ends):
+        assert_equal(records, header + pdblist[start + 1:end])
+
+    with open(PDB_FILE) as f:
+        streamed = list(iterModels(iterPDB(f)))
+    assert_equal([(model, [fields(record) for record in records])
+                  for model, records in streamed],
+                 [(model, [fields(record) for record in records])
+                  for model, records in models])
+
+
+def test_iter_models_without_model_records():
+    '''Test A File Without Models Is One Model
+    '''
+    pdblist, errlist = readPDB(io.StringIO(ATOM_LINE + '\n' + HETATM_LINE + '\n'))
+    assert_equal(list(iterModels(pdblist)), [(1, pdblist)])
+
+
+def test_topology_key():
+    '''Test Topology Keys
+
+    Models with the same atoms share a key whatever their coordinates, and
+    a missing or renamed atom changes it.
+    '''
+    with open(PDB_FILE) as f:
+        models = [records for model, records in iterModels(iterPDB(f))]
+    key = getTopologyKey(models[0])
+    assert_equal(getTopologyKey(models[1]), key)
+    assert_equal(len(key), len([record for record in models[0]
+                                if isinstance(record, (ATOM, HETATM))]))
+
+    atoms = [i for i, record in enumerate(models[0]) if isinstance(record, ATOM)]
+    missing = models[0][:atoms[5]] + models[0][atoms[5] + 1:]
+    assert_not_equal(getTopologyKey(missing), key)
+
+    renamed = copy.copy(models[0][atoms[5]])
+    renamed.name = 'XX'
+    assert_not_equal(getTopologyKey(models[0][:atoms[5]] + [renamed] +
+                                    models[0][atoms[5] + 1:]), key)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+'''Test data shared by the PDB2PQR tests
+
+The tests are run by nose from the tests directory, so they import this
+directly.
+'''
+
+import os
+import types
+
+from plugins.PDB2PQR.src.pdb import iterPDB, iterModels
+from plugins.PDB2PQR.src.definitions import Definition
+from plugins.PDB2PQR.src.protein import Protein
+from plugins.PDB2PQR.src.routines import Routines
+from plugins.PDB2PQR.src.hydrogens import hydrogenRoutines
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+# The first two models of an NMR ensemble of a 13 residue peptide
+PDB_FILE = os.path.join(DATA_DIR, '1A1P.pdb')
+
+def read_model(model=1):
+    '''Read the records of one model of PDB_FILE
+    '''
+    with open(PDB_FILE) as f:
+        for serial, records in iterModels(iterPDB(f)):
+            if serial == model:
+                return records
+
+
+def override(routines, **methods):
+    '''Replace methods of one Routines object, e.g. with an older version
+    of a step to compare against, or with one that fails
+    '''
+    for name, method in methods.items():
+        setattr(routines, name, types.MethodType(method, routines))
+    return routines
+
+
+def prepare(model=1, **methods):
+    '''Run the PDB2PQR steps up to hydrogen optimization on a model,
+    optionally with some methods of its Routines replaced (see override)
+    '''
+    routines = override(Routines(Protein(read_model(model), Definition()), 0),
+                        **methods)
+    routines.setTermini(False, False)
+    routines.updateBonds()
+    routines.findMissingHeavy()
+    routines.updateSSbridges()
+    routines.debumpProtein()
+    routines.addHydrogens()
+    hydRoutines = hydrogenRoutines(routines)
+    routines.debumpProtein()
+    hydRoutines.setOptimizeableHydrogens()
+    hydRoutines.initializeFullOptimization()
+    hydRoutines.optimizeHydrogens()
+    hydRoutines.cleanup()
+    return routines
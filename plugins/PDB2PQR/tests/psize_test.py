@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import os
+import shutil
+import tempfile
+
+from plugins.PDB2PQR.src.psize import Psize
+from protein_data import prepare
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+def setup_pqr():
+    '''PQR lines of a prepared protein, with charges and radii made up from
+    the serial numbers, and a few HETATM entries before and among them
+    '''
+    global protein, pqrlines, lines
+    protein = prepare().protein
+    for atom in protein.getAtoms():
+        atom.ffcharge = (atom.serial % 7 - 3) / 4.0
+        atom.radius = 1.0 + (atom.serial % 5) / 4.0
+    pqrlines = [atom.getPQRString() + '\n' for atom in protein.getAtoms()]
+    lines = ([hetatm(line) for line in pqrlines[:3]] + pqrlines[:50] +
+             [hetatm(line) for line in pqrlines[50:53]] + pqrlines[53:] +
+             ['TER\n', 'HETATM  short\n', 'END\n'])
+
+
+def hetatm(line):
+    return 'HETATM' + line[6:]
+
+
+def reference_sizes(lines):
+    '''The totals and bounds the per-line loop of the old parseLines found
+    '''
+    gotatom = 0
+    gothet = 0
+    q = 0.0
+    minlen = [None, None, None]
+    maxlen = [None, None, None]
+    for line in lines:
+        if line.find('ATOM') == 0:
+            atom = True
+        elif line.find('HETATM') == 0:
+            gothet += 1
+            atom = False
+            if gotatom != 0:
+                continue
+        else:
+            continue
+        words = line[30:].replace('-', ' -').split()
+        if len(words) < 5:
+            continue
+        if atom:
+            gotatom += 1
+        q = q + float(words[3])
+        rad = float(words[4])
+        center = [float(word) for word in words[0:3]]
+        for i in range(3):
+            if minlen[i] == None or center[i]-rad < minlen[i]:
+                minlen[i] = center[i]-rad
+            if maxlen[i] == None or center[i]+rad > maxlen[i]:
+                maxlen[i] = center[i]+rad
+    return gotatom, gothet, q, minlen, maxlen
+
+
+def sizes(size):
+    return size.gotatom, size.gothet, size.q, size.minlen, size.maxlen
+
+
+@with_setup(setup_pqr)
+def test_parse_columns():
+    '''Test Sizing By Columns
+
+    Parsing a PQR as one string, as a file, in batches of lines, or as the
+    columns of the protein finds what the per-line loop did.
+    '''
+    expected = reference_sizes(lines)
+    assert_true(expected[0])
+
+    size = Psize()
+    size.parseString(''.join(lines))
+    assert_equal(sizes(size), expected)
+
+    outdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(outdir, 'protein.pqr')
+        with open(filename, 'w') as f:
+            f.writelines(lines)
+        size = Psize()
+        size.runPsize(filename)
+        assert_equal(sizes(size), expected)
+    finally:
+        shutil.rmtree(outdir)
+
+    for batch in (1, 2, 17, 1000):
+        size = Psize()
+        for i in range(0, len(lines), batch):
+            size.parseLines(lines[i:i + batch])
+        assert_equal(sizes(size), expected)
+
+    size = Psize()
+    size.parseColumns(protein.getAtomColumns())
+    assert_equal(sizes(size), reference_sizes(pqrlines))
+
+    # HETATM entries are sized only while there are no ATOM entries
+    atomlines = [line for line in pqrlines if line.startswith('ATOM')]
+    hetlines = [hetatm(line) for line in atomlines]
+    size = Psize()
+    size.parseLines(hetlines)
+    assert_equal(sizes(size), reference_sizes(hetlines))
+    size.parseLines(atomlines)
+    assert_equal(sizes(size), reference_sizes(hetlines + atomlines))
+
+
+@with_setup(setup_pqr)
+def test_grid_parameters():
+    '''Test Grid Parameters
+
+    The grid parameters are the values of the psize report, for both
+    sequential and parallel solves.
+    '''
+    for gmemceil in (400, 10):
+        size = Psize()
+        size.setConstant('gmemceil', gmemceil)
+        size.parseLines(lines)
+        size.setAll()
+        grid = size.getGridParameters()
+        assert_equal(grid['parallel'], gmemceil == 10)
+
+        report = size.printResults()
+        assert_in('Total charge = %.3f e' % grid['total_charge'], report)
+        assert_in('Fine mesh spacing = %g x %g x %g A' % tuple(grid['fine_spacing']),
+                  report)
+        if grid['parallel']:
+            assert_in('Proc. grid = %i x %i x %i' % tuple(grid['processors']),
+                      report)
+            assert_in('parallel solve = %.3f MB/proc.' % grid['memory'], report)
+        else:
+            assert_in('sequential solve = %.3f MB' % grid['memory'], report)
+
+
+def parallel_size():
+    size = Psize()
+    size.setConstant('gmemceil', 10)
+    size.parseColumns(protein.getAtomColumns())
+    size.setAll()
+    return size
+
+
+@with_setup(setup_pqr)
+def test_domains():
+    '''Test Subdomains Of A Parallel Solve
+
+    The owned parts tile the fine grid, each solved box covers its part
+    within the fine grid, and each focusing chain runs from the coarse grid
+    to the solved box, every box inside the one before it.
+    '''
+    size = parallel_size()
+    np = [int(n) for n in size.getProcGrid()]
+    cen = size.getCenter()
+    clen = size.getCoarseGridDims()
+    flen = size.getFineGridDims()
+    redfac = size.getConstant('redfac')
+    domains = size.getDomains()
+    assert_equal(len(domains), np[0] * np[1] * np[2])
+    assert_true(len(domains) > 1)
+
+    volume = 0.0
+    for rank, domain in enumerate(domains):
+        assert_equal(domain['rank'], rank)
+        i, j, k = domain['index']
+        assert_equal(rank, i + np[0] * (j + np[1] * k))
+        part = 1.0
+        for d in range(3):
+            lower = domain['center'][d] - domain['length'][d] / 2
+            upper = domain['center'][d] + domain['length'][d] / 2
+            assert_almost_equal(lower, max(lower, cen[d] - flen[d] / 2))
+            assert_almost_equal(upper, min(upper, cen[d] + flen[d] / 2))
+            assert_true(lower <= domain['lower'][d] + 1e-9)
+            assert_true(domain['upper'][d] <= upper + 1e-9)
+            part *= domain['upper'][d] - domain['lower'][d]
+        volume += part
+
+        focus = domain['focus']
+        assert_equal(len(focus), max(size.getFocus(), 2))
+        assert_equal(focus[0]['length'], clen)
+        for d in range(3):
+            assert_almost_equal(focus[0]['center'][d], cen[d])
+        assert_equal(focus[-1]['length'], domain['length'])
+        for outer, inner in zip(focus, focus[1:]):
+            for d in range(3):
+                assert_true(inner['length'][d] <= outer['length'][d])
+                assert_true(inner['length'][d] >= redfac * outer['length'][d])
+                assert_true(inner['center'][d] - inner['length'][d] / 2 >=
+                            outer['center'][d] - outer['length'][d] / 2 - 1e-9)
+                assert_true(inner['center'][d] + inner['length'][d] / 2 <=
+                            outer['center'][d] + outer['length'][d] / 2 + 1e-9)
+    assert_almost_equal(volume, flen[0] * flen[1] * flen[2])
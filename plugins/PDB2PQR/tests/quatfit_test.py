@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import math
+
+from plugins.PDB2PQR.src.quatfit import findCoordinates, findCoordinatesBatch
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+REFCOORDS = [[1.0, 2.0, 3.0], [2.4, 2.1, 3.3], [1.2, 3.5, 2.9]]
+DEFCOORDS = [[0.0, 0.0, 0.0], [1.45, 0.0, 0.0], [0.0, 1.52, 0.1]]
+DEFATOMS = [[0.5, 0.5, 0.9], [-0.9, 0.3, -0.4]]
+
+# What the unbatched fit placed DEFATOMS at, before it was sped up
+PLACED = [[1.3660066410443807, 2.6637314359464344, 3.9071614294200554],
+          [0.2626874510880619, 2.3005148533068276, 2.3772070251420248]]
+
+def test_fit_unchanged():
+    '''Test Quaternion Fit Results
+
+    The fit places atoms exactly where it did before it was reworked.
+    '''
+    for defatom, placed in zip(DEFATOMS, PLACED):
+        assert_equal(findCoordinates(3, REFCOORDS, DEFCOORDS, defatom), placed)
+
+
+def test_fit_recovers_transform():
+    '''Test Quaternion Fit of a Rigid Motion
+
+    Atoms moved rigidly with their references are put back where they went.
+    '''
+    angle = 0.7
+    c, s = math.cos(angle), math.sin(angle)
+    def move(point):
+        x, y, z = point
+        return [c*x - s*y + 4.0, s*x + c*y - 1.0, z + 2.5]
+
+    refcoords = [move(point) for point in DEFCOORDS]
+    for defatom in DEFATOMS:
+        placed = findCoordinates(3, refcoords, DEFCOORDS, defatom)
+        for found, expected in zip(placed, move(defatom)):
+            assert_almost_equal(found, expected)
+
+
+def test_batch_matches_single_fits():
+    '''Test Batched Quaternion Fits
+
+    Placing atoms in a batch, with shared and separate references, gives
+    exactly what one findCoordinates call per atom gives.
+    '''
+    other = [[point[0] + 0.3, point[1], point[2] - 0.2] for point in REFCOORDS]
+    requests = [(REFCOORDS, DEFCOORDS, DEFATOMS[0]),
+                (other, DEFCOORDS, DEFATOMS[0]),
+                (REFCOORDS, DEFCOORDS, DEFATOMS[1])]
+    assert_equal(findCoordinatesBatch(3, requests),
+                 [findCoordinates(3, *request) for request in requests])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+from io import StringIO
+from types import SimpleNamespace
+
+from plugins.PDB2PQR.extensions import resinter, newresinter
+from plugins.PDB2PQR.src.hydrogens import PairEnergyTable
+from protein_data import prepare
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+OPTIONS = SimpleNamespace(clean=False, neutraln=False, neutralc=False,
+                          ligand=None, assign_only=False, chain=False,
+                          debump=True, opt=True, resinter_cutoff=None,
+                          resinter_processes=None, newresinter_cutoff=None,
+                          newresinter_processes=None)
+
+def resinter_output(model, **methods):
+    outfile = StringIO()
+    resinter.create_resinter_output(prepare(model, **methods), outfile, OPTIONS,
+                                    residue_combinations=True)
+    return outfile.getvalue()
+
+
+def newresinter_output(model, **methods):
+    outfile = StringIO()
+    processor = newresinter.ResInter(prepare(model, **methods), outfile, OPTIONS)
+    processor.generate_all()
+    processor.write_resinter_output()
+    return outfile.getvalue()
+
+
+def energies(output):
+    return [line for line in output.splitlines() if not line.startswith('#')]
+
+
+def test_runs_are_independent():
+    '''Test That Nothing Is Kept Between Proteins
+
+    The energies of one model must not turn up in the output for the next,
+    as they would if cached or saved results outlived a run.
+    '''
+    for output in (resinter_output, newresinter_output):
+        first = output(1)
+        second = output(2)
+        assert_not_equal(energies(second), energies(first))
+        assert_equal(output(2), second)
+
+
+def test_tables_belong_to_runs():
+    '''Test That Pair Energy Tables Belong To One Run
+
+    Each run gets its own table, and no table is left at module level to
+    grow from one protein to the next.
+    '''
+    routines = prepare()
+    first = newresinter.ResInter(routines, StringIO(), OPTIONS)
+    second = newresinter.ResInter(routines, StringIO(), OPTIONS)
+    assert_is_not(first.pairEnergyTable, second.pairEnergyTable)
+    first.generate_all()
+    assert_true(first.pairEnergyTable.tables)
+    assert_false(second.pairEnergyTable.tables)
+
+    for module in (resinter, newresinter):
+        assert_false([value for value in vars(module).values()
+                      if isinstance(value, PairEnergyTable)])
+
+
+def test_replayed_hydrogens():
+    '''Test Replaying Hydrogens Between Combinations
+
+    Reusing the hydrogens of unchanged residues gives the output of placing
+    them all again, and only the combination loops keep them.
+    '''
+    assert_is_none(prepare().hydrogens)
+    for output in (resinter_output, newresinter_output):
+        # Without replay, every hydrogen is placed again for each combination
+        assert_equal(output(1), output(1, enableHydrogenReplay=lambda self: None))
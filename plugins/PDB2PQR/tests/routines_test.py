@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import copy
+import math
+
+from plugins.PDB2PQR.src.aa import Amino
+from plugins.PDB2PQR.src.definitions import Definition
+from plugins.PDB2PQR.src.protein import Protein
+from plugins.PDB2PQR.src.routines import Routines, Cells
+from plugins.PDB2PQR.src.utilities import getDihedral
+from protein_data import read_model, prepare, override
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+def setup_protein():
+    global protein, routines
+    protein = Protein(read_model(), Definition())
+    routines = Routines(protein, 0)
+
+
+def distance(atom1, atom2):
+    return math.sqrt((atom1.x - atom2.x)**2 + (atom1.y - atom2.y)**2 +
+                     (atom1.z - atom2.z)**2)
+
+
+@with_setup(setup_protein)
+def test_near_pairs_match_near_cells():
+    '''Test Batched Neighbor Search
+
+    getNearPairs returns the same pairs, in the same order, as checking the
+    getNearCells of each atom in turn, with and without a partner filter.
+    '''
+    cells = Cells(5)
+    cells.assignCells(protein)
+    atoms = protein.getAtoms()
+
+    for candidate in (None, lambda atom: atom.name.startswith('O')):
+        expected = []
+        for atom in atoms:
+            for closeatom in cells.getNearCells(atom):
+                if candidate and not candidate(closeatom):
+                    continue
+                dist = distance(atom, closeatom)
+                if dist < 4.3:
+                    expected.append((atom, closeatom, dist))
+
+        atoms1, atoms2, dists = cells.getNearPairs(atoms, 4.3, candidate)
+        assert_equal([(a, b) for a, b, d in expected], list(zip(atoms1, atoms2)))
+        for (a, b, dist), found in zip(expected, dists):
+            assert_almost_equal(dist, found)
+
+
+@with_setup(setup_protein)
+def test_near_pairs_match_exhaustive_search():
+    '''Test Batched Neighbor Search Against All Pairs
+
+    Within the cell size, no pair is missed by the cell search.
+    '''
+    cells = Cells(5)
+    cells.assignCells(protein)
+    atoms = protein.getAtoms()
+
+    expected = set((a, b) for a in atoms for b in atoms
+                   if a is not b and distance(a, b) < 5.0)
+    atoms1, atoms2, dists = cells.getNearPairs(atoms, 5.0)
+    assert_equal(len(atoms1), len(expected))
+    assert_equal(set(zip(atoms1, atoms2)), expected)
+
+
+class Forgetful(dict):
+    '''A reference distance cache that never keeps anything
+    '''
+    def __setitem__(self, key, value):
+        pass
+
+
+def reference_distances(model, refdistances):
+    routines = Routines(Protein(read_model(model), Definition()), 0,
+                        refdistances=refdistances)
+    routines.setTermini(False, False)
+    routines.updateBonds()
+    routines.setReferenceDistance()
+    return [(str(atom.residue), atom.name, atom.refdistance)
+            for atom in routines.protein.getAtoms()]
+
+
+def test_shared_reference_distances():
+    '''Test Sharing Reference Distances
+
+    Residues with the same bonds, in the same model or a later one, get
+    the reference distances they would get on their own.
+    '''
+    refdistances = {}
+    for model in (1, 2):
+        expected = reference_distances(model, Forgetful())
+        assert_equal(reference_distances(model, refdistances), expected)
+    assert_true(refdistances)
+
+
+def copy_patched_reference(routines, reference, patchname):
+    '''Copy the reference for every patch, as Routines used to
+    '''
+    newreference = copy.deepcopy(reference)
+    Routines.patchReference(newreference, routines.protein.patchmap[patchname])
+    return newreference
+
+
+def describe(reference):
+    return ([(name, atom.bonds) for name, atom in reference.map.items()],
+            reference.dihedrals)
+
+
+def test_shared_patched_references():
+    '''Test Sharing Patched References
+
+    Residues given the same patch share one reference, which matches a copy
+    made for each of them.
+    '''
+    routines = prepare()
+    copying = prepare(getPatchedReference=copy_patched_reference)
+
+    residues = [residue for residue in routines.protein.getResidues()
+                if hasattr(residue, 'patches')]
+    copied = [residue for residue in copying.protein.getResidues()
+              if hasattr(residue, 'patches')]
+    for residue, expected in zip(residues, copied):
+        assert_equal(str(residue), str(expected))
+        assert_equal(residue.patches, expected.patches)
+        assert_equal(describe(residue.reference), describe(expected.reference))
+    assert_equal(routines.protein.printAtoms(routines.protein.getAtoms()),
+                 copying.protein.printAtoms(copying.protein.getAtoms()))
+
+    assert_less(len(set(id(residue.reference) for residue in residues)),
+                len(set(id(residue.reference) for residue in copied)))
+
+
+@with_setup(setup_protein)
+def test_changed_reference_is_copied_again():
+    '''Test Patching A Changed Reference
+
+    A reference changed in place since it was patched gets a new copy.
+    '''
+    reference = copy.deepcopy(protein.getResidues()[1].reference)
+    first = routines.getPatchedReference(reference, 'CTERM')
+    assert_is(routines.getPatchedReference(reference, 'CTERM'), first)
+
+    Routines.patchReference(reference, protein.patchmap['PEPTIDE'])
+    second = routines.getPatchedReference(reference, 'CTERM')
+    assert_is_not(second, first)
+
+    expected = copy.deepcopy(reference)
+    Routines.patchReference(expected, protein.patchmap['CTERM'])
+    assert_equal(describe(second), describe(expected))
+
+
+def fail_placing_hydrogens(routines, residue, messages):
+    '''Fail part way through placing the hydrogens of a residue
+    '''
+    messages.append(('Placing\n', 1))
+    raise ValueError(residue)
+
+
+def test_hydrogen_messages():
+    '''Test Hydrogen Placement Messages
+
+    The messages of a residue are collected when asked for, and a failure
+    while placing its hydrogens leaves nothing behind.
+    '''
+    routines = Routines(Protein(read_model(), Definition()), 0)
+    routines.setTermini(False, False)
+    routines.updateBonds()
+    routines.findMissingHeavy()
+    residue = routines.protein.getResidues()[1]
+
+    # With nothing but its CA, none of the hydrogens can be rebuilt
+    for atom in residue.getAtoms()[:]:
+        if atom.name != 'CA':
+            residue.removeAtom(atom.name)
+    residue.peptideN = residue.peptideC = None
+    messages = []
+    routines.addResidueHydrogens(residue, messages)
+    assert_in(("Couldn't rebuild HA in %s!\n" % residue, 1), messages)
+
+    failing = override(Routines(routines.protein, 0),
+                       placeResidueHydrogens=fail_placing_hydrogens)
+    failing.enableHydrogenReplay()
+    assert_raises(ValueError, failing.addResidueHydrogens, residue)
+    assert_not_in('write', vars(failing))
+    assert_equal(failing.hydrogens, {})
+
+
+def test_dihedral_angles():
+    '''Test Batched Residue Dihedral Angles
+
+    Every residue gets the angles of its reference dihedrals that
+    getDihedral gives one at a time, and None for those missing an atom.
+    '''
+    routines = prepare()
+    residue = routines.protein.getResidues()[1]
+    residue.removeAtom('CB')
+    routines.calculateDihedralAngles()
+
+    missing = 0
+    for residue in routines.protein.getResidues():
+        if not isinstance(residue, Amino):
+            continue
+        expected = []
+        for dihedral in residue.reference.dihedrals:
+            names = dihedral.split()
+            if all(residue.hasAtom(name) for name in names):
+                coords = [residue.getAtom(name).getCoords() for name in names]
+                expected.append(getDihedral(*coords))
+            else:
+                expected.append(None)
+                missing += 1
+        assert_equal(residue.dihedrals, expected)
+    assert_true(missing)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import json
+import os
+import shutil
+import tempfile
+
+from plugins.PDB2PQR.src.definitions import Definition
+from plugins.PDB2PQR.src.errors import PDBInternalError
+from plugins.PDB2PQR.src.protein import Protein
+from plugins.PDB2PQR.src.routines import Routines
+from plugins.PDB2PQR.src.sweep import sweepCombinations
+from protein_data import read_model
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+COMBINATIONS = [[i, i + 1] for i in range(6)]
+
+def setup_sweep():
+    global routines, checkdir, checkpoint
+    routines = Routines(Protein(read_model(), Definition()), 0)
+    checkdir = tempfile.mkdtemp()
+    checkpoint = os.path.join(checkdir, 'sweep.checkpoint')
+
+
+def teardown_sweep():
+    shutil.rmtree(checkdir)
+
+
+def tagged(tag, crash=None):
+    '''A combination process that marks its results with the run they
+    came from, and optionally exits or fails on one combination
+    '''
+    def process(routines, combination):
+        if combination == crash:
+            os._exit(3)
+        if combination == [crash]:
+            raise ValueError('bad combination')
+        return [tag, sum(combination)]
+    return process
+
+
+def sweep(process, combinations=COMBINATIONS, settings=None, stop=None):
+    '''Run a sweep in two processes, stopping it as if it were killed
+    after the given number of results
+    '''
+    results = []
+    sweeper = sweepCombinations(routines, combinations, process, processes=2,
+                                checkpoint=checkpoint, settings=settings)
+    try:
+        for index, result in sweeper:
+            results.append(result)
+            if len(results) == stop:
+                break
+    finally:
+        sweeper.close()
+    return results
+
+
+def expected(tags):
+    return [[tag, sum(combination)] for tag, combination in zip(tags, COMBINATIONS)]
+
+
+@with_setup(setup_sweep, teardown_sweep)
+def test_sweep():
+    '''Sweep Results In Order
+
+    The results come back in the order of the combinations, as a serial
+    run gives them, and the checkpoint is removed at the end.
+    '''
+    assert_equal(sweep(tagged('run')), expected(['run'] * 6))
+    assert_equal(list(sweepCombinations(routines, COMBINATIONS, tagged('serial'))),
+                 list(enumerate(expected(['serial'] * 6))))
+    assert_false(os.path.exists(checkpoint))
+
+
+@with_setup(setup_sweep, teardown_sweep)
+def test_resume_after_partial_line():
+    '''Resuming After A Partly Written Result
+
+    An interrupted sweep keeps its finished results, and a result cut off
+    while it was written is run again.
+    '''
+    assert_equal(sweep(tagged('first'), stop=3), expected(['first'] * 3))
+    with open(checkpoint) as checkfile:
+        lines = checkfile.readlines()
+    assert_equal(len(lines), 4)
+    with open(checkpoint, 'w') as checkfile:
+        checkfile.writelines(lines[:3])
+        checkfile.write(lines[3][:len(lines[3]) // 2])
+
+    assert_equal(sweep(tagged('second')), expected(['first'] * 2 + ['second'] * 4))
+    assert_false(os.path.exists(checkpoint))
+
+
+@with_setup(setup_sweep, teardown_sweep)
+def test_resume_with_changes():
+    '''Resuming With Different Combinations Or Settings
+
+    A checkpoint written for other combinations, settings or coordinates is
+    not used.
+    '''
+    sweep(tagged('first'), stop=3)
+    changed = [list(reversed(combination)) for combination in COMBINATIONS]
+    assert_equal(sweep(tagged('second'), changed, stop=3), expected(['second'] * 3))
+
+    assert_equal(sweep(tagged('third'), settings={'cutoff': 4.0}, stop=3),
+                 expected(['third'] * 3))
+
+    routines.protein.getAtoms()[0].x += 1.0
+    assert_equal(sweep(tagged('fourth')), expected(['fourth'] * 6))
+
+
+@with_setup(setup_sweep, teardown_sweep)
+def test_worker_crash():
+    '''A Worker Crashing Mid-sweep
+
+    The sweep stops with an error naming the combination, keeps what was
+    finished before it, and can then be resumed.
+    '''
+    assert_raises_regexp(PDBInternalError, '(?s)Combination 4 failed.*exited with code 3',
+                         sweep, tagged('first', crash=COMBINATIONS[3]))
+    with open(checkpoint) as checkfile:
+        done = [json.loads(line)[0] for line in list(checkfile)[1:]]
+    assert_equal(done, [0, 1, 2])
+
+    assert_equal(sweep(tagged('second')), expected(['first'] * 3 + ['second'] * 3))
+
+
+@with_setup(setup_sweep, teardown_sweep)
+def test_worker_error():
+    '''A Combination Failing In A Worker
+
+    The traceback from the worker is reported.
+    '''
+    combinations = COMBINATIONS + [[6]]
+    assert_raises_regexp(PDBInternalError, '(?s)Combination 7 failed.*bad combination',
+                         sweep, tagged('first', crash=6), combinations)
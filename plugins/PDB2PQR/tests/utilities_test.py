@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import math
+import random
+
+from plugins.PDB2PQR.src.definitions import Definition
+from plugins.PDB2PQR.src.errors import PDBInternalError
+from plugins.PDB2PQR.src.protein import Protein
+from plugins.PDB2PQR.src.utilities import *
+from protein_data import read_model, prepare
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+def setup_protein():
+    global protein
+    protein = Protein(read_model(), Definition())
+
+
+def reference_dihedral(coords1, coords2, coords3, coords4):
+    '''getDihedral as it was written on top of the vector helpers
+    '''
+    def subtract(a, b):
+        return [a[0] - b[0], a[1] - b[1], a[2] - b[2]]
+    def cross(a, b):
+        return [a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0]]
+    def dot(a, b):
+        value = 0.0
+        for i in range(3):
+            value += a[i]*b[i]
+        return value
+    def normalize(a):
+        dist = math.sqrt(pow(a[0], 2) + pow(a[1], 2) + pow(a[2], 2))
+        return [a[0]/dist, a[1]/dist, a[2]/dist] if dist > SMALL else a
+
+    list43 = subtract(coords4, coords3)
+    list32 = subtract(coords3, coords2)
+    list12 = subtract(coords1, coords2)
+    Anorm = normalize(cross(list12, list32))
+    Bnorm = normalize(cross(list43, list32))
+    scal = dot(Anorm, Bnorm)
+    if abs(scal + 1.0) < SMALL:
+        value = 180.0
+    elif abs(scal - 1.0) < SMALL:
+        value = 0.0
+    else:
+        value = DIHEDRAL * math.acos(scal)
+    if dot(cross(Anorm, Bnorm), list32) < 0:
+        value = value * -1.0
+    return value
+
+
+@with_setup(setup_protein)
+def test_packed_dihedrals():
+    '''Test Packed Dihedral Angles
+
+    getDihedral and getDihedrals over packed coordinates give exactly the
+    angles of the original vector helper implementation.
+    '''
+    atoms = protein.getAtoms()
+    coords = protein.getCoordinates()
+    assert_equal(len(coords), 3 * len(atoms))
+    assert_equal(list(coords[3:6]), atoms[1].getCoords())
+
+    quadruplets = [(i, i + 1, i + 2, i + 3) for i in range(len(atoms) - 3)]
+    angles = getDihedrals(coords, quadruplets)
+    for quadruplet, angle in zip(quadruplets, angles):
+        points = [atoms[i].getCoords() for i in quadruplet]
+        expected = reference_dihedral(*points)
+        assert_equal(getDihedral(*points), expected)
+        assert_equal(angle, expected)
+
+
+@with_setup(setup_protein)
+def test_dihedral_frames():
+    '''Test Dihedral Angles Of Every Frame
+
+    The angles of each model of the ensemble are those of each model on
+    its own, through the indices of the first.
+    '''
+    second = Protein(read_model(2), Definition())
+    atoms = protein.getAtoms()
+    assert_equal([(atom.resSeq, atom.name) for atom in second.getAtoms()],
+                 [(atom.resSeq, atom.name) for atom in atoms])
+
+    atomquadruplets = [atoms[i:i + 4] for i in range(len(atoms) - 3)]
+    frames = [protein.getCoordinates(), second.getCoordinates()]
+    angles = protein.getDihedralAngles(atomquadruplets, frames)
+    assert_equal(len(angles), 2)
+    assert_equal(list(angles[0]), list(protein.getDihedralAngles(atomquadruplets)))
+    for model, frame in zip((protein, second), angles):
+        modelatoms = model.getAtoms()
+        expected = [getDihedral(*[modelatoms[i + j].getCoords() for j in range(4)])
+                    for i in range(len(atoms) - 3)]
+        assert_equal(list(frame), expected)
+    assert_not_equal(list(angles[0]), list(angles[1]))
+
+    assert_raises(PDBInternalError, protein.getDihedralAngles,
+                  [second.getAtoms()[:4]])
+
+
+def reference_shortest_path(graph, start, end, path=[]):
+    '''The recursive shortestPath that the breadth-first search replaced
+    '''
+    path = path + [start]
+    if start == end:
+        return path
+    if start not in graph:
+        return None
+    shortest = None
+    for node in graph[start]:
+        if node not in path:
+            newpath = reference_shortest_path(graph, node, end, path)
+            if newpath:
+                if not shortest or len(newpath) < len(shortest):
+                    shortest = newpath
+    return shortest
+
+
+def reference_connectivity(map, key):
+    '''analyzeConnectivity as it was written with lists
+    '''
+    list = []
+    keys = [key]
+    while len(keys) > 0:
+        key = keys[0]
+        if key not in list:
+            list.append(key)
+            if key in map:
+                for value in map[key]:
+                    if value not in list:
+                        keys.append(value)
+        keys.pop(keys.index(key))
+    return list
+
+
+def random_graphs():
+    '''Small directed graphs with cycles, and nodes with no edges out
+    '''
+    rand = random.Random(1)
+    for size in range(1, 10):
+        for trial in range(20):
+            yield {node: rand.sample(range(size + 2), rand.randint(0, 3))
+                   for node in range(size)}
+
+
+def test_shortest_paths():
+    '''Test Breadth-first Shortest Paths
+
+    shortestPath and shortestPathLengths find paths as long as the
+    recursive search did, and the same nodes unreachable.
+    '''
+    for graph in random_graphs():
+        nodes = range(len(graph) + 2)
+        for end in nodes:
+            lengths = shortestPathLengths(graph, end)
+            for start in nodes:
+                expected = reference_shortest_path(graph, start, end)
+                path = shortestPath(graph, start, end)
+                if expected is None:
+                    assert_is_none(path)
+                    assert_not_in(start, lengths)
+                    continue
+                assert_equal(len(path), len(expected))
+                assert_equal((path[0], path[-1]), (start, end))
+                for node, nextnode in zip(path, path[1:]):
+                    assert_in(nextnode, graph[node])
+                assert_equal(lengths[start], len(expected) - 1)
+
+            # A path leading up to start may not be crossed again
+            expected = reference_shortest_path(graph, 0, end, [1])
+            path = shortestPath(graph, 0, end, [1])
+            assert_equal(path is None, expected is None)
+            if path is not None:
+                assert_equal(len(path), len(expected))
+                assert_not_in(1, path[1:])
+
+
+def test_connectivity():
+    '''Test Connectivity Order
+
+    analyzeConnectivity reaches the same values in the same order.
+    '''
+    for graph in random_graphs():
+        for key in range(len(graph) + 2):
+            assert_equal(analyzeConnectivity(graph, key),
+                         reference_connectivity(graph, key))
+
+
+def test_reference_distances():
+    '''Test Reference Distances
+
+    The distances from a single search match searching from every atom.
+    '''
+    routines = prepare()
+    routines.setReferenceDistance()
+    for residue in routines.protein.getResidues():
+        caatom = residue.getAtom('CA')
+        if caatom is None:
+            continue
+        map = {atom: atom.bonds for atom in residue.getAtoms()}
+        for atom in residue.getAtoms():
+            if atom.isBackbone() or atom.name in ('HO', 'H2', 'H3'):
+                continue
+            path = reference_shortest_path(map, atom, caatom)
+            assert_equal(atom.refdistance, len(path) - 1)
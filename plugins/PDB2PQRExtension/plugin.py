@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+import asyncio
+import logging
+
+from sphinx.plugin import BasePlugin
+from ..PDB2PQR.extensions import getExtensionOptions, forkExtensions
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+_log = logging.getLogger()
+
+def _receive(receiver):
+    '''Wait for the result of extensions started by forkExtensions
+    '''
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def ready():
+        loop.remove_reader(receiver.fileno())
+        try:
+            future.set_result(receiver.recv())
+        except EOFError:
+            future.set_result('The extension process exited without a result.')
+
+    # Without fork the extensions have already run, and the result is waiting
+    if receiver.poll():
+        ready()
+    else:
+        loop.add_reader(receiver.fileno(), ready)
+
+    return future
+
+
+class PDB2PQRExtension(BasePlugin):
+    '''Plugin for running PDB2PQR extensions, e.g. hbond or resinter
+
+    Each model of the protein that PDB2PQR prepared is analyzed in a process
+    forked for it.  All of the extension branches of a pipeline therefore
+    share the one prepared protein without copying it, and run at the same
+    time.
+    '''
+    def __init__(self, extensions, output, settings=None, **kwargs):
+        '''Extension plug-in
+
+        extensions are the names of the extensions to run, as in the
+        PDB2PQR extensions package, and output is the root of their output
+        file names.  settings holds the values of extension options, named
+        as the option destinations, e.g., {'whatif': True}.
+        '''
+        if isinstance(extensions, str):
+            extensions = [extensions]
+        self._extensions = list(extensions)
+        self._output = output
+        self._settings = settings or {}
+        super().__init__(**kwargs)
+        _log.info("PDB2PQRExtension plug-in initialized.")
+
+
+    @classmethod
+    def script_name(cls):
+        return "pdb2pqr_extension"
+
+
+    @classmethod
+    def sinks(cls):
+        return ['pdb2pqr_protein']
+
+
+    @classmethod
+    def sources(cls):
+        return None
+
+
+    async def run(self):
+        _log.info("PDB2PQRExtension started: {}".format(', '.join(self._extensions)))
+        running = []
+        while True:
+            data = await self.read_data()
+            if not data:
+                # End of input
+                break
+
+            protein = data['pdb2pqr_protein']
+            outroot = self._output
+            if protein['model'] is not None:
+                outroot = '{}_model{}'.format(outroot, protein['model'])
+
+            # Some extensions look at how PDB2PQR was run
+            run = protein['options']
+            clean = run.get('clean', False)
+            assign_only = run.get('assign_only', False)
+            values = {'clean': clean,
+                      'neutraln': run.get('neutraln', False),
+                      'neutralc': run.get('neutralc', False),
+                      'ligand': run.get('ligand'),
+                      'assign_only': assign_only,
+                      'chain': run.get('chain', False),
+                      'debump': not (run.get('nodebump', False) or assign_only or clean),
+                      'opt': not run.get('noopt', False)}
+            values.update(self._settings)
+            options = getExtensionOptions(self._extensions, values)
+
+            worker, receiver = forkExtensions(protein['routines'], outroot,
+                                              options, self._extensions)
+            running.append((outroot, worker, receiver))
+
+        for outroot, worker, receiver in running:
+            error = await _receive(receiver)
+            receiver.close()
+            if worker is not None:
+                worker.join()
+
+            if error is None:
+                _log.info("PDB2PQRExtension: wrote {}.*".format(outroot))
+            else:
+                _log.error("PDB2PQRExtension: {} failed:\n{}".format(outroot, error))
+
+
+    def xform_data(self, data, to_type):
+        return data
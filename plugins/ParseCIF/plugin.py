@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+import asyncio
+import logging
+
+from sphinx.plugin import BasePlugin
+from sphinx.utils import PdbxReader
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+_log = logging.getLogger()
+
+def define_types(tm):
+    '''Define a type for a batch of atom_site rows
+
+    The atoms are sent as columns, keyed by the atom_site attribute names in
+    the file, rather than as one object per atom.  Numeric attributes are
+    converted to numbers, and unknown ('?') or inapplicable ('.') values are
+    None.  A batch holds atoms of a single model, given in 'model'.
+    '''
+    tm.define_type('cif_atoms',
+                   { 'model': {'type': ['integer', 'null']},
+                     'atoms': {
+                         'type': 'object',
+                         'additionalProperties': {'type': 'array'}}})
+
+
+BATCH_SIZE = 10000
+
+class ParseCIF(BasePlugin):
+    '''Plugin for parsing the atoms of mmCIF files
+
+    Only the atom_site rows are read, and they are sent on in batches as they
+    are read, so that even very large files are parsed in bounded memory.
+    The file is read here rather than from a read_file plugin, since text
+    lines queued for us would be held in memory until we got to them.
+    '''
+    def __init__(self, file, batch_size=BATCH_SIZE, **kwargs):
+        super().__init__(**kwargs)
+
+        self._file = file
+        self._batch_size = batch_size
+
+        # Convert the attributes the schema says are numbers
+        schema = self._tm.get_schema('atom_site')['properties']
+        self._types = {name: int if value.get('type') == 'integer' else float
+                       for name, value in schema.items()
+                       if value.get('type') in ('integer', 'number')}
+
+        _log.info("ParseCIF plug-in initialized.")
+
+
+    @classmethod
+    def script_name(cls):
+        return "parse_cif"
+
+
+    @classmethod
+    def sinks(cls):
+        return None
+
+
+    @classmethod
+    def sources(cls):
+        return ['cif_atoms', 'text']
+
+
+    async def run(self):
+        with open(self._file, 'r') as f:
+            attributes = None
+            model = None
+            model_index = None
+            rows = []
+
+            for attribute_list, row in PdbxReader(f).readRows('atom_site'):
+                if attribute_list is not attributes:
+                    # A new data block, with its own set of attributes
+                    await self.send(attributes, model, rows)
+                    attributes = attribute_list
+                    model = None
+                    model_index = None
+                    rows = []
+                    if 'pdbx_PDB_model_num' in attributes:
+                        model_index = attributes.index('pdbx_PDB_model_num')
+
+                if model_index is not None and row[model_index] != model:
+                    await self.send(attributes, model, rows)
+                    model = row[model_index]
+                    rows = []
+
+                rows.append(row)
+                if len(rows) == self._batch_size:
+                    await self.send(attributes, model, rows)
+                    rows = []
+
+            await self.send(attributes, model, rows)
+
+        await self.done()
+
+
+    async def send(self, attributes, model, rows):
+        '''Publish rows as columns
+
+        We sleep after each batch so that the plugins downstream can get on
+        with it before we read the next.
+        '''
+        if not rows:
+            return
+
+        atoms = {}
+        for name, column in zip(attributes, zip(*rows)):
+            to_number = self._types.get(name)
+            atoms[name] = (self.to_numbers(column, to_number) if to_number
+                           else [None if v in ('?', '.') else v for v in column])
+
+        model = self.to_numbers([model], int)[0] if model else None
+        await self.publish(self._tm.new_cif_atoms(model=model, atoms=atoms))
+        await asyncio.sleep(0)
+
+
+    @staticmethod
+    def to_numbers(column, to_number):
+        try:
+            return list(map(to_number, column))
+        except ValueError:
+            return [None if v in ('?', '.') else to_number(v) for v in column]
+
+
+    def xform_data(self, data, to_type):
+        if to_type == 'cif_atoms':
+            return data
+
+        elif to_type == 'text':
+            atoms = data['cif_atoms']['atoms']
+            lines = []
+            if data['cif_atoms']['model'] is not None:
+                lines.append('model: ' + str(data['cif_atoms']['model']))
+            for values in zip(*atoms.values()):
+                atom = ''
+                for x, y in zip(atoms, values):
+                    atom += x + ': ' + str(y) + '\t'
+
+                lines.append(atom)
+
+            return self._tm.new_text(lines=lines)
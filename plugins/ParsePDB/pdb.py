@@ -58,6 +58,8 @@ class BaseRecord(object):
     Base class for all records.
     Verifies the received record type
     """
+    __slots__ = ('original_text',)
+
     def __init__(self, line):
         record = line[0:6].strip()
         if record != self.__class__.__name__:
@@ -303,6 +305,9 @@ class ANISOU(BaseRecord):
 
         The ANISOU records present the anisotropic temperature factors.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'u00', 'u11', 'u22', 'u01', 'u02', 'u12', 'segID',
+                 'element', 'charge')
 
     def __init__(self, line):
         """
@@ -352,6 +357,9 @@ class SIGATM(BaseRecord):
         The SIGATM records present the standard deviation of atomic parameters
         as they appear in ATOM and HETATM records.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'sigX', 'sigY', 'sigZ', 'sigOcc', 'sigTemp', 'segID',
+                 'element', 'charge')
 
     def __init__(self, line):
         """
@@ -403,6 +411,10 @@ class HETATM(BaseRecord):
         within "non-standard" groups. These records are used for water
         molecules and atoms presented in HET groups.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'x', 'y', 'z', 'occupancy', 'tempFactor', 'segID',
+                 'element', 'charge', 'sybylType', 'lBondedAtoms', 'lBonds',
+                 'radius', 'isCterm', 'isNterm', 'mol2charge')
 
     def __init__(self,line,sybylType="A.aaa",lBonds=[],lBondedAtoms=[]): ### PC
         """
@@ -695,6 +707,9 @@ class ATOM(BaseRecord):
         always present on each ATOM record; segment identifier and charge are
         optional.
     """
+    __slots__ = ('serial', 'name', 'altLoc', 'resName', 'chainID', 'resSeq',
+                 'iCode', 'x', 'y', 'z', 'occupancy', 'tempFactor', 'segID',
+                 'element', 'charge')
 
     def __init__(self, line):
         """
@@ -2270,6 +2285,50 @@ def readAtom(line):
     obj = klass(newline)
     return obj
 
+def readAtomColumns(klass, line):
+    """
+        Fast path for the common case of a fully column-formatted ATOM or
+        HETATM line.  This does what klass(line) does without the per-field
+        method call overhead.  Any line it cannot handle raises an exception,
+        and the caller falls back to the record class and readAtom.
+
+        Parameters
+            klass:  ATOM or HETATM (class)
+            line:   The stripped line to parse (string)
+        Returns
+            obj:    The parsed record (ATOM or HETATM)
+    """
+    obj = klass.__new__(klass)
+    obj.original_text = line
+    obj.serial = int(line[6:11])
+    obj.name = line[12:16].strip()
+    obj.altLoc = line[16].strip()
+    obj.resName = line[17:20].strip()
+    obj.chainID = line[21].strip()
+    obj.resSeq = int(line[22:26])
+    obj.iCode = line[26].strip()
+    obj.x = float(line[30:38])
+    obj.y = float(line[38:46])
+    obj.z = float(line[46:54])
+    if klass is HETATM:
+        obj.sybylType, obj.lBonds, obj.lBondedAtoms = HETATM.__init__.__defaults__
+        obj.radius = 1.0
+        obj.isCterm = 0
+        obj.isNterm = 0
+    try:
+        obj.occupancy = float(line[54:60])
+        obj.tempFactor = float(line[60:66])
+        obj.segID = line[72:76].strip()
+        obj.element = line[76:78].strip()
+        obj.charge = line[78:80].strip()
+    except (ValueError, IndexError):
+        obj.occupancy = 0.00
+        obj.tempFactor = 0.00
+        obj.segID = ""
+        obj.element = ""
+        obj.charge = ""
+    return obj
+
 def parsePDBRecord(line):
     """ Parse PDB-format data into array of Atom objects.
         Parameters
@@ -2293,6 +2352,15 @@ def parsePDBRecord(line):
             record = line[0:6].strip()
 
             klass = lineParsers[record]
+
+            # ATOM and HETATM lines are nearly always column-formatted, so
+            # try the fast path before the record classes
+            if record == "ATOM" or record == "HETATM":
+                try:
+                    return record, readAtomColumns(klass, line)
+                except Exception:
+                    pass
+
             record_obj = klass(line)
 
         except KeyError as details:
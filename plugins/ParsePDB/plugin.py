@@ -53,9 +53,13 @@ def define_types(tm):
     We need a type to hold a PDB file -- at least the interesting bits.  This
     is purposely sparse in the interest in time and efficiency.  Our purpose
     is not to convert to mmCIF, and we'll add more if necessary.
+
+    Files with several models, e.g., NMR ensembles or trajectories, yield one
+    pdb_file per model, with 'model' set to the model's serial number.
     '''
     tm.define_type('pdb_file',
                    { 'idCode': {'$ref': '#/definitions/entry/properties/id'},
+                     'model': {'$ref': '#/definitions/atom_site/properties/pdbx_PDB_model_num'},
                      'atoms' : {
                          'type': 'array',
                          'items' : {'$ref': '#/definitions/atom_site'}}})
@@ -68,6 +72,7 @@ class ParsePDB(BasePlugin):
         super().__init__(**kwargs)
 
         self._pdb = {'idCode': None, 'atoms': []}
+        self._models = 0
 
         _log.info("ParsePDB plug-in initialized.")
 
@@ -97,6 +102,18 @@ class ParsePDB(BasePlugin):
                     if record_type == 'HEADER':
                         self._pdb['idCode'] = record_data.idCode
 
+                    elif record_type == 'MODEL':
+                        self._pdb = {'idCode': self._pdb['idCode'],
+                                     'model': record_data.serial,
+                                     'atoms': []}
+
+                    elif record_type == 'ENDMDL':
+                        # Each model is complete by now, so send it on rather
+                        # than holding the whole ensemble in memory.
+                        await self.publish(self._pdb)
+                        self._models += 1
+                        self._pdb = {'idCode': self._pdb['idCode'], 'atoms': []}
+
                     elif record_type == 'COMPND':
                         # TODO: This is defined piecemeal across multiple lines. It
                         # maps MOL_ID to ATOM entries -- somehow.  It's not clear
@@ -121,25 +138,29 @@ class ParsePDB(BasePlugin):
                                 'label_entity_id': "1"} # TODO: Fix this.  See COMPND, above.
                         if record_data.charge:
                             atom['pdbx_formal_charge'] = record_data.charge
+                        if 'model' in self._pdb:
+                            atom['pdbx_PDB_model_num'] = self._pdb['model']
 
                         self._pdb['atoms'].append(atom)
 
             else:
                 break
 
-        # We need to wait until the entire PDB file is read before we can publish.
-        await self.publish(self._pdb)
+        # Without MODEL records we need to wait until the entire PDB file is
+        # read before we can publish.
+        if not self._models or self._pdb['atoms']:
+            await self.publish(self._pdb)
         await self.done()
 
 
     def xform_data(self, data, to_type):
-        record_type, record_data = data
-
         if to_type == 'pdb_file':
-            return self._tm.new_pdb(data)
+            return self._tm.new_pdb_file(data)
 
         elif to_type == 'text':
             lines = ['id: ' + data['idCode']]
+            if 'model' in data:
+                lines.append('model: ' + str(data['model']))
             for a in data['atoms']:
                 atom = ''
                 for x, y in a.items():
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+import logging
+
+from sphinx.plugin import BasePlugin
+from ..PDB2PQR.src.psize import Psize as PsizeEngine
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+_log = logging.getLogger()
+
+def define_types(tm):
+    '''Define a type for the grid that psize suggests for a structure
+
+    One is sent for each model, along with the atoms it was sized from, so
+    that a solver has the grid and the atoms to solve on it in one message.
+    Lengths are in Angstroms, memory in MB, and the vectors are x, y, z.
+
+    A grid that is decomposed for a parallel solve has 'domains', the
+    subdomains that APBS mg-para would solve separately, see
+    Psize.getDomains.  They are a plan only: no solver here takes a box.
+    '''
+    numbers = {'type': 'array', 'items': {'type': 'number'}}
+    integers = {'type': 'array', 'items': {'type': 'integer'}}
+    box = {'type': 'object',
+           'properties': {
+               'center': numbers,
+               'length': numbers}}
+
+    tm.define_type('grid_parameters',
+                   { 'model': {'type': ['integer', 'null']},
+                     'atom_count': {'type': 'integer'},
+                     'hetatm_count': {'type': 'integer'},
+                     'total_charge': {'type': 'number'},
+                     'lower_corner': numbers,
+                     'upper_corner': numbers,
+                     'length': numbers,
+                     'center': numbers,
+                     'coarse_length': numbers,
+                     'fine_length': numbers,
+                     'fine_points': integers,
+                     'fine_spacing': numbers,
+                     'extension': numbers,
+                     'parallel': {'type': 'boolean'},
+                     'processors': integers,
+                     'processor_points': integers,
+                     'focus_levels': {'type': 'integer'},
+                     'memory': {'type': 'number'},
+                     'domains': {
+                         'type': 'array',
+                         'items': {
+                             'type': 'object',
+                             'properties': {
+                                 'index': integers,
+                                 'rank': {'type': 'integer'},
+                                 'lower': numbers,
+                                 'upper': numbers,
+                                 'center': numbers,
+                                 'length': numbers,
+                                 'points': integers,
+                                 'spacing': numbers,
+                                 'focus': {'type': 'array', 'items': box}}}},
+                     'atoms': {
+                         'type': 'object',
+                         'properties': {
+                             'x': numbers,
+                             'y': numbers,
+                             'z': numbers,
+                             'charge': numbers,
+                             'radius': numbers}}})
+
+
+class Psize(BasePlugin):
+    '''Plugin for sizing the grid of an electrostatics calculation
+
+    The atoms are sized in batches as they arrive, either as the columns that
+    PDB2PQR sends, or as PQR text streamed from a file, so no intermediate
+    PQR file is needed.  A multi-model PQR is sized one model at a time.
+
+    Grids that need a parallel solve are decomposed into subdomains, unless
+    'decompose' is False.  With 'decompose' True, every grid is.
+    '''
+    def __init__(self, constants=None, decompose=None, **kwargs):
+        # Override the psize defaults, e.g. {'space': 0.25}
+        self._constants = constants or {}
+        self._decompose = decompose
+        super().__init__(**kwargs)
+
+        _log.info("Psize plug-in initialized.")
+
+
+    @classmethod
+    def script_name(cls):
+        return "psize"
+
+
+    @classmethod
+    def sinks(cls):
+        return ['pqr_atoms', 'text']
+
+
+    @classmethod
+    def sources(cls):
+        return ['grid_parameters', 'text']
+
+
+    def _new_size(self):
+        size = PsizeEngine()
+        for name, value in self._constants.items():
+            size.setConstant(name, value)
+
+        return size
+
+
+    async def _publish_size(self, size, model, atoms):
+        if size.minlen[0] is None:
+            _log.info("Psize: no atoms in model {}.".format(model))
+            return
+
+        size.setAll()
+        await self.publish((size, model, atoms))
+
+
+    async def run(self):
+        try:
+            size = None
+            model = None
+            models = 0
+            atoms = None
+            while True:
+                data = await self.read_data()
+                if data and 'pqr_atoms' in data:
+                    # A whole model at once, straight from PDB2PQR
+                    value = data['pqr_atoms']
+                    model_size = self._new_size()
+                    model_size.parseColumns(value['atoms'])
+                    await self._publish_size(model_size, value['model'],
+                                             value['atoms'])
+
+                elif data:
+                    # A batch of PQR lines.  Each ENDMDL ends a model.
+                    lines = data['text']['lines']
+                    start = 0
+                    for end, line in enumerate(lines):
+                        if line.startswith('MODEL'):
+                            words = line.split()
+                            model = int(words[1]) if len(words) > 1 else models + 1
+
+                        elif line.startswith('ENDMDL'):
+                            size, atoms = self._parse_lines(size, atoms,
+                                                            lines[start:end])
+                            models += 1
+                            await self._publish_size(size, model, atoms)
+                            size = None
+                            model = None
+                            start = end + 1
+
+                    size, atoms = self._parse_lines(size, atoms, lines[start:])
+
+                else:
+                    break
+
+            if size is not None:
+                await self._publish_size(size, model, atoms)
+
+            await self.done()
+        except Exception as e:
+            _log.exception('Unhandled exception:')
+
+
+    def _parse_lines(self, size, atoms, lines):
+        '''Size a batch of lines, and add their atoms to those of the model
+        '''
+        if size is None:
+            size = self._new_size()
+            atoms = {'x': [], 'y': [], 'z': [], 'charge': [], 'radius': []}
+
+        columns = size.parseLines(lines)
+        for field, column in atoms.items():
+            column.extend(columns[field])
+
+        return size, atoms
+
+
+    def xform_data(self, data, to_type):
+        if not isinstance(data, tuple):
+            return data
+
+        size, model, atoms = data
+        parameters = size.getGridParameters()
+        decompose = self._decompose
+        if decompose is None:
+            decompose = parameters['parallel']
+
+        if to_type == 'grid_parameters':
+            columns = {}
+            for field in ('x', 'y', 'z', 'charge', 'radius'):
+                columns[field] = list(atoms[field])
+
+            if decompose:
+                parameters['domains'] = size.getDomains()
+
+            return self._tm.new_grid_parameters(model=model, atoms=columns,
+                                                **parameters)
+
+        elif to_type == 'text':
+            lines = size.printResults().split('\n')
+            if decompose:
+                lines[-1:] = self._domain_lines(size.getDomains())
+
+            return self._tm.new_text(lines=lines)
+
+
+    def _domain_lines(self, domains):
+        '''Describe the subdomains of a parallel solve
+        '''
+        lines = ["################# DOMAIN DECOMPOSITION ####################"]
+        for domain in domains:
+            lines.append("Domain %i (%i, %i, %i): center = %.3f x %.3f x %.3f A, "
+                         "length = %.3f x %.3f x %.3f A, %i focusing levels" %
+                         tuple([domain['rank']] + domain['index'] +
+                               domain['center'] + domain['length'] +
+                               [len(domain['focus'])]))
+        lines += ["", ""]
+
+        return lines
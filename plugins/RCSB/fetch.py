@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+'''Asynchronous downloads into a local mirror
+
+Entries, e.g. '1abc.pdb', are stored in the mirror by the hash of their
+contents, with a small reference file naming the hash of each entry.  The
+least recently used contents are evicted when the mirror grows too large.
+The mirror is a private directory of the current user, and one that others
+can write to is refused.
+Downloads use asyncio streams, so they don't stall the event loop, and are
+written to the mirror in chunks as they arrive.
+'''
+
+import asyncio
+import hashlib
+import logging
+import os
+import stat
+import tempfile
+import urllib.parse
+
+from ..PDB2PQR.src.datacache import evictFiles
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+_log = logging.getLogger()
+
+# Where entries are downloaded from.  A local stand-in server can be used
+# instead, e.g. 'http://127.0.0.1:8000/{id}.{format}'.
+RCSB_URL = 'https://files.rcsb.org/download/{id}.{format}'
+
+MIRROR_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                          os.path.join(os.path.expanduser('~'), '.cache'),
+                          'rcsb-mirror')
+MIRROR_SIZE = 1024 * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+REDIRECTS = 5
+
+# Seconds to wait for a connection, or for the next data on one
+TIMEOUT = 60
+
+
+class FetchError(Exception):
+    pass
+
+
+class Mirror:
+    '''A content addressed store of downloaded entries
+    '''
+    def __init__(self, path=MIRROR_DIR, max_size=MIRROR_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._objects = os.path.join(path, 'objects')
+        self._refs = os.path.join(path, 'refs')
+
+
+    def _object_path(self, digest):
+        return os.path.join(self._objects, digest[:2], digest)
+
+
+    def _ref_path(self, entry):
+        return os.path.join(self._refs, entry.lower())
+
+
+    def _check_path(self):
+        '''Create the mirror if needed, and check that it is a directory of
+        the current user that nobody else can write to
+        '''
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            pathstat = os.lstat(self.path)
+        except OSError as e:
+            raise FetchError('Mirror {} is not available: {}'.format(self.path, e))
+
+        if not stat.S_ISDIR(pathstat.st_mode) or \
+                pathstat.st_uid != os.getuid() or \
+                pathstat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+            raise FetchError('Mirror {} is not a private directory of the '
+                             'current user'.format(self.path))
+
+
+    def lookup(self, entry):
+        '''Get the path of the contents of an entry, or None if the mirror
+        doesn't have it.  The contents are marked as recently used.
+        '''
+        self._check_path()
+        try:
+            with open(self._ref_path(entry)) as ref:
+                path = self._object_path(ref.read().strip())
+            os.utime(path)
+        except OSError:
+            return None
+
+        return path
+
+
+    def writer(self, entry):
+        '''Get a MirrorWriter to store the contents of an entry with
+        '''
+        self._check_path()
+        os.makedirs(self._objects, exist_ok=True)
+        return MirrorWriter(self, entry)
+
+
+    def _commit(self, entry, temppath, digest):
+        '''Move downloaded contents into place, and refer the entry to them
+        '''
+        path = self._object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temppath, path)
+
+        os.makedirs(self._refs, exist_ok=True)
+        fd, refpath = tempfile.mkstemp(dir=self._refs)
+        with os.fdopen(fd, 'w') as ref:
+            ref.write(digest)
+        os.replace(refpath, self._ref_path(entry))
+
+        self.evict(keep=path)
+        return path
+
+
+    def evict(self, keep=None):
+        '''Remove the least recently used contents until the mirror fits in
+        its size.  References to removed contents are left to be found
+        missing by lookup.
+        '''
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(self._objects):
+            paths.extend(os.path.join(dirpath, name) for name in filenames)
+
+        for path in evictFiles(paths, self.max_size, keep=keep):
+            _log.info('Mirror: evicted {}.'.format(path))
+
+
+class MirrorWriter:
+    '''Write the contents of an entry to the mirror, as it is downloaded
+    '''
+    def __init__(self, mirror, entry):
+        self._mirror = mirror
+        self._entry = entry
+        self._digest = hashlib.sha1()
+        fd, self._temppath = tempfile.mkstemp(dir=mirror._objects)
+        self._file = os.fdopen(fd, 'wb')
+
+
+    def write(self, chunk):
+        self._digest.update(chunk)
+        self._file.write(chunk)
+
+
+    def commit(self):
+        '''Finish writing, and return the path of the stored contents
+        '''
+        self._file.close()
+        return self._mirror._commit(self._entry, self._temppath,
+                                    self._digest.hexdigest())
+
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._temppath):
+            os.remove(self._temppath)
+
+
+async def wait_for(url, coroutine, timeout):
+    '''Wait for part of a download, failing with a FetchError if it takes
+    longer than timeout seconds
+    '''
+    try:
+        return await asyncio.wait_for(coroutine, timeout)
+    except asyncio.TimeoutError:
+        raise FetchError('{} timed out after {}s'.format(url, timeout))
+
+
+async def open_url(url, redirects=REDIRECTS, timeout=TIMEOUT):
+    '''Send an HTTP GET request, following redirects
+
+    Returns the reader and writer of the connection, the reader positioned
+    at the start of the body, and the response headers by lower case name.
+    Connecting, and each line of the response, must each take no longer
+    than timeout seconds.
+    '''
+    parts = urllib.parse.urlsplit(url)
+    secure = parts.scheme == 'https'
+    port = parts.port or (443 if secure else 80)
+    reader, writer = await wait_for(url, asyncio.open_connection(
+        parts.hostname, port, ssl=secure or None), timeout)
+    try:
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        # HTTP/1.0 keeps the body plain: no chunked transfer encoding, and
+        # it ends when the server closes the connection.
+        request = ('GET {} HTTP/1.0\r\nHost: {}\r\n'
+                   'Accept-Encoding: identity\r\n\r\n').format(path, parts.netloc)
+        writer.write(request.encode('latin-1'))
+
+        status = (await wait_for(url, reader.readline(), timeout)).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await wait_for(url, reader.readline(), timeout)).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if len(status) < 2 or not status[1].isdigit():
+            raise FetchError('{} sent a malformed status line: {}'.format(
+                url, ' '.join(status)))
+
+        code = int(status[1])
+        if code in (301, 302, 303, 307, 308) and 'location' in headers \
+                and redirects > 0:
+            writer.close()
+            return await open_url(urllib.parse.urljoin(url, headers['location']),
+                                  redirects - 1, timeout)
+
+        if code != 200:
+            raise FetchError('{} returned {}'.format(url, ' '.join(status[1:])))
+
+    except:
+        writer.close()
+        raise
+
+    return reader, writer, headers
+
+
+async def download(url, mirror, entry, timeout=TIMEOUT):
+    '''Download an entry into the mirror, and return the path of its contents
+
+    A download that ends short of the Content-Length the server gave, or
+    that stalls for longer than timeout seconds, is dropped, rather than
+    stored as the entry.
+    '''
+    reader, writer, headers = await open_url(url, timeout=timeout)
+    try:
+        out = mirror.writer(entry)
+        try:
+            received = 0
+            while True:
+                chunk = await wait_for(url, reader.read(CHUNK_SIZE), timeout)
+                if not chunk:
+                    break
+                out.write(chunk)
+                received += len(chunk)
+
+            length = headers.get('content-length')
+            if length is not None and length.isdigit() and \
+                    received != int(length):
+                raise FetchError('{} ended after {} of {} bytes'.format(
+                    url, received, length))
+
+        except:
+            out.abort()
+            raise
+
+        return out.commit()
+
+    finally:
+        writer.close()
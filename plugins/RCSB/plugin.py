@@ -1,19 +1,39 @@
+import asyncio
 import logging
-import os, urllib
-import urllib.request
+from collections import deque
 
 from sphinx.plugin import BasePlugin
+from .fetch import (Mirror, FetchError, download, RCSB_URL, MIRROR_DIR,
+                    MIRROR_SIZE, TIMEOUT)
 
 _log = logging.getLogger()
 
+LINE_COUNT = 100
+
 
 class RCSB(BasePlugin):
     '''Plugin for fetching proteins from RCSB database.
+
+    'file' is a PDB ID, or a list of them.  Up to 'prefetch' of them are
+    downloaded at once into a local mirror, ahead of the one being sent on,
+    and each is then sent as text, LINE_COUNT lines at a time, in the order
+    given.  Entries that are already in the mirror aren't downloaded again,
+    and with 'offline' set they only come from the mirror.  A download that
+    stalls for 'timeout' seconds fails, and an entry that fails is logged
+    and skipped.
     '''
-    def __init__(self, file, **kwargs):
+    def __init__(self, file, format='pdb', prefetch=4, mirror=MIRROR_DIR,
+                 mirror_size=MIRROR_SIZE, offline=False, url=RCSB_URL,
+                 timeout=TIMEOUT, **kwargs):
         super().__init__(**kwargs)
 
-        self.protein = file
+        self.proteins = [file] if isinstance(file, str) else list(file)
+        self._format = format
+        self._prefetch = max(prefetch, 1)
+        self._mirror = Mirror(mirror, mirror_size)
+        self._offline = offline
+        self._url = url
+        self._timeout = timeout
 
         _log.info("RCSB plug-in initialized.")
 
@@ -33,30 +53,85 @@ class RCSB(BasePlugin):
         return ['text']
 
 
+    async def fetch(self, protein):
+        '''Get the path of a protein in the mirror, downloading it if needed
+        '''
+        entry = '{}.{}'.format(protein.lower(), self._format)
+        path = self._mirror.lookup(entry)
+        if path:
+            _log.info("RCSB: {} found in the mirror.".format(entry))
+            return path
 
-    async def run(self):
+        if self._offline:
+            raise FetchError("{} is not in the mirror".format(entry))
+
+        url = self._url.format(id=protein, format=self._format)
+        path = await download(url, self._mirror, entry, self._timeout)
+        _log.info("RCSB: downloaded {}.".format(url))
+        return path
 
-        protein = self.protein
-        URLpath = "http://www.rcsb.org/pdb/cgi/export.cgi/" + protein + \
-                                      ".pdb?format=PDB&pdbId=" + protein + "&compression=None"
-        file = urllib.request.urlopen(URLpath)
 
-        if file.getcode() != 200 or 'nosuchfile' in file.geturl() :
-            err = "{} does not exist, or is not available".format(protein)
-            _log.error(err)
-            raise PDBDoesntExist(err)
-            #Not sure how this error should be handled
+    async def send(self, path):
+        '''Send the contents of a protein on, a few lines at a time
+        '''
+        with open(path, encoding='utf-8', errors='replace') as file:
+            lines = []
+            for line in file:
+                lines.append(line.rstrip('\n'))
+                if len(lines) == LINE_COUNT:
+                    await self.publish(self._tm.new_text(lines=lines))
+                    await asyncio.sleep(0)
+                    lines = []
 
+            if lines:
+                await self.publish(self._tm.new_text(lines=lines))
+
+
+    async def run(self):
+        # A bounded queue of downloads, the first being the one to send next
+        pending = deque()
+        proteins = iter(self.proteins)
+
+        def prefetch():
+            while len(pending) < self._prefetch:
+                protein = next(proteins, None)
+                if protein is None:
+                    break
+                task = asyncio.ensure_future(self.fetch(protein))
+                pending.append((protein, task))
+
+        try:
+            prefetch()
+            while pending:
+                protein, task = pending.popleft()
+                prefetch()
+                try:
+                    path = await task
+                    try:
+                        await self.send(path)
+                    except FileNotFoundError:
+                        # Evicted while waiting its turn
+                        await self.send(await self.fetch(protein))
+
+                except asyncio.CancelledError:
+                    raise
+
+                except (OSError, FetchError) as e:
+                    err = "{} does not exist, or is not available: {}".format(protein, e)
+                    _log.error(err)
+
+                except Exception:
+                    _log.exception("RCSB: fetching {} failed.".format(protein))
+
+        finally:
+            # Stopped early, e.g. cancelled: drop the downloads still going
+            for protein, task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.wait([task for protein, task in pending])
+
+            await self.done()
 
-        reads = file.read()
-        s = reads.decode('utf-8')
-        lines = s.split('\n')
-        data = self._tm.new_text(lines=lines)
-        await self.publish((data))
-        await self.done()
 
     def xform_data(self, data, to_type):
         return data
-
-class PDBDoesntExist(Exception):
-    pass
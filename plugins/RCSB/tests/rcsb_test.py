@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from sphinx.plugin import BasePlugin
+from plugins.RCSB.fetch import Mirror, FetchError, download
+from plugins.RCSB.plugin import RCSB
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+# What the stand-in for the RCSB server has to offer
+ENTRIES = {
+    '/1ABC.pdb': b'HEADER    1ABC\nATOM      1  N   ALA A   1\nEND\n',
+    '/2XYZ.pdb': b'HEADER    2XYZ\n' + b'ATOM\n' * 250 + b'END\n',
+    '/3SAM.pdb': b'HEADER    1ABC\nATOM      1  N   ALA A   1\nEND\n',
+}
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/MOVED.pdb':
+            self.send_response(302)
+            self.send_header('Location', '/1ABC.pdb')
+            self.end_headers()
+            return
+
+        if self.path == '/SLOW.pdb':
+            # The body stalls for longer than the tests' timeout
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(0.5)
+            self.wfile.write(ENTRIES['/1ABC.pdb'])
+            return
+
+        if self.path == '/GARBLED.pdb':
+            self.wfile.write(b'HTTP/1.0 OK\r\n\r\n')
+            return
+
+        if self.path == '/SHORT.pdb':
+            # The connection drops part way through the body
+            body = ENTRIES['/2XYZ.pdb']
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body)//2])
+            return
+
+        body = ENTRIES.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def setup_server():
+    global server, url, mirror_dir
+    server = HTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:{}/{{id}}.{{format}}'.format(server.server_port)
+    mirror_dir = tempfile.mkdtemp()
+
+
+def teardown_server():
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(mirror_dir)
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@with_setup(setup_server, teardown_server)
+def test_download_into_mirror():
+    '''Test that downloads are stored by content
+    '''
+    mirror = Mirror(mirror_dir)
+    path = run(download(url.format(id='1ABC', format='pdb'), mirror, '1abc.pdb'))
+    with open(path, 'rb') as f:
+        assert_equal(f.read(), ENTRIES['/1ABC.pdb'])
+    assert_equal(mirror.lookup('1ABC.pdb'), path)
+
+    # The same contents are only stored once
+    same = run(download(url.format(id='3SAM', format='pdb'), mirror, '3sam.pdb'))
+    assert_equal(same, path)
+
+
+@with_setup(setup_server, teardown_server)
+def test_redirect_and_missing():
+    '''Test that redirects are followed, and missing entries fail cleanly
+    '''
+    mirror = Mirror(mirror_dir)
+    path = run(download(url.format(id='MOVED', format='pdb'), mirror, 'moved.pdb'))
+    with open(path, 'rb') as f:
+        assert_equal(f.read(), ENTRIES['/1ABC.pdb'])
+
+    assert_raises(FetchError, run,
+                  download(url.format(id='NONE', format='pdb'), mirror, 'none.pdb'))
+    assert_is_none(mirror.lookup('none.pdb'))
+
+
+@with_setup(setup_server, teardown_server)
+def test_short_download():
+    '''Test that a download cut short of its Content-Length isn't stored
+    '''
+    mirror = Mirror(mirror_dir)
+    assert_raises(FetchError, run,
+                  download(url.format(id='SHORT', format='pdb'), mirror, 'short.pdb'))
+    assert_is_none(mirror.lookup('short.pdb'))
+    for dirpath, dirnames, filenames in os.walk(mirror_dir):
+        assert_equal(filenames, [])
+
+
+@with_setup(setup_server, teardown_server)
+def test_timeout_and_garbled_status():
+    '''Test that stalled downloads and malformed responses fail cleanly
+    '''
+    mirror = Mirror(mirror_dir)
+    assert_raises(FetchError, run,
+                  download(url.format(id='SLOW', format='pdb'), mirror,
+                           'slow.pdb', timeout=0.1))
+    assert_raises(FetchError, run,
+                  download(url.format(id='GARBLED', format='pdb'), mirror,
+                           'garbled.pdb'))
+    for dirpath, dirnames, filenames in os.walk(mirror_dir):
+        assert_equal(filenames, [])
+
+    # The stand-in server answers one request at a time, so fetch in turn
+    ids = ['GARBLED', '1ABC', 'SLOW']
+    lines = run_plugin(file=ids, url=url, mirror=mirror_dir, prefetch=1,
+                       timeout=0.1)
+    assert_equal(sum(lines, []),
+                 ENTRIES['/1ABC.pdb'].decode().split('\n')[:-1])
+
+
+@with_setup(setup_server, teardown_server)
+def test_plugin_cancelled():
+    '''Test that a cancelled plugin drops its downloads and still finishes
+    '''
+    runner = FakeRunner()
+    plugin = RCSB(runner=runner, plugins={}, file=['SLOW', '1ABC'], url=url,
+                  mirror=mirror_dir, timeout=5)
+    databus = FakeDatabus()
+    BasePlugin.set_databus(databus)
+    plugin._set_sink(databus, 'text')
+
+    loop = asyncio.get_event_loop()
+    task = asyncio.ensure_future(runner.task)
+    loop.run_until_complete(asyncio.sleep(0.1))
+    task.cancel()
+    assert_raises(asyncio.CancelledError, loop.run_until_complete, task)
+    assert_true(databus.finished)
+    assert_equal(databus.lines, [])
+    # No partial download is left behind
+    for dirpath, dirnames, filenames in os.walk(mirror_dir):
+        assert_false([name for name in filenames if name.startswith('tmp')])
+
+
+@with_setup(setup_server, teardown_server)
+def test_private_mirror():
+    '''Test that the mirror is only used if it is private to the user
+    '''
+    path = os.path.join(mirror_dir, 'mirror')
+    mirror = Mirror(path)
+    run(download(url.format(id='1ABC', format='pdb'), mirror, '1abc.pdb'))
+    assert_equal(os.stat(path).st_mode & 0o777, 0o700)
+    assert_is_not_none(mirror.lookup('1abc.pdb'))
+
+    os.chmod(path, 0o777)
+    assert_raises(FetchError, mirror.lookup, '1abc.pdb')
+    assert_raises(FetchError, run,
+                  download(url.format(id='2XYZ', format='pdb'), mirror, '2xyz.pdb'))
+    os.chmod(path, 0o700)
+
+    link = os.path.join(mirror_dir, 'link')
+    os.symlink(path, link)
+    assert_raises(FetchError, Mirror(link).lookup, '1abc.pdb')
+
+
+@with_setup(setup_server, teardown_server)
+def test_eviction():
+    '''Test that the least recently used contents are evicted
+    '''
+    mirror = Mirror(mirror_dir, max_size=len(ENTRIES['/2XYZ.pdb']))
+    first = run(download(url.format(id='1ABC', format='pdb'), mirror, '1abc.pdb'))
+    os.utime(first, (0, 0))
+    run(download(url.format(id='2XYZ', format='pdb'), mirror, '2xyz.pdb'))
+    assert_is_none(mirror.lookup('1abc.pdb'))
+    assert_is_not_none(mirror.lookup('2xyz.pdb'))
+
+
+@with_setup(setup_server, teardown_server)
+def test_plugin_streams_in_order():
+    '''Test that the plugin sends its entries in order, in chunks, and then
+    again from the mirror alone
+    '''
+    ids = ['2XYZ', 'NONE', '1ABC']
+    lines = run_plugin(file=ids, url=url, mirror=mirror_dir, prefetch=2)
+    expected = []
+    for id in ('2XYZ', '1ABC'):
+        expected += ENTRIES['/{}.pdb'.format(id)].decode().split('\n')[:-1]
+    assert_equal(sum(lines, []), expected)
+    assert_equal([len(chunk) for chunk in lines], [100, 100, 52, 3])
+
+    server.shutdown()
+    offline = run_plugin(file=ids, url=url, mirror=mirror_dir, offline=True)
+    assert_equal(offline, lines)
+
+
+def run_plugin(**kwargs):
+    runner = FakeRunner()
+    plugin = RCSB(runner=runner, plugins={}, **kwargs)
+    databus = FakeDatabus()
+    BasePlugin.set_databus(databus)
+    plugin._set_sink(databus, 'text')
+    run(runner.task)
+    return databus.lines
+
+
+class FakeTypeManager():
+    def new_text(self, lines):
+        return {'text': {'lines': lines}}
+
+
+class FakeDatabus():
+    _typemgr = FakeTypeManager()
+
+    def __init__(self):
+        self.lines = []
+        self.finished = False
+
+    async def publish(self, data, sink):
+        if data:
+            self.lines.append(data['text']['lines'])
+        else:
+            self.finished = True
+
+
+class FakeRunner():
+    def create_task(self, coroutine):
+        self.task = coroutine
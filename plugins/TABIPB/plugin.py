@@ -85,7 +85,7 @@ class TABIPB(BasePlugin):
 
     @classmethod
     def sinks(cls):
-        return ['apbs_atom']
+        return ['apbs_atom', 'pqr_atoms']
 
 
     @classmethod
@@ -96,11 +96,34 @@ class TABIPB(BasePlugin):
     @asyncio.coroutine
     def run(self):
         try:
-            # Collect all of the atoms that are available.
+            # Collect all of the atoms that are available.  Atoms from
+            # different models are solved separately, each as soon as the
+            # next model starts.
+            model = None
             while True:
                 data = yield from self.read_data()
-                if data:
+                if data and 'pqr_atoms' in data:
+                    # A whole model at once, straight from PDB2PQR.
+                    if self._molecules:
+                        yield from self._solve()
+
+                    atoms = data['pqr_atoms']['atoms']
+                    for x, y, z, radius, charge in zip(atoms['x'], atoms['y'],
+                            atoms['z'], atoms['radius'], atoms['charge']):
+                        self._molecules.append({
+                            'pos': (x, y, z),
+                            'radius': radius,
+                            'charge': charge
+                        })
+
+                    yield from self._solve()
+
+                elif data:
                     value = data['apbs_atom']
+                    if self._molecules and value.get('pdbx_PDB_model_num') != model:
+                        yield from self._solve()
+
+                    model = value.get('pdbx_PDB_model_num')
                     self._molecules.append({
                         'pos': (
                             value['Cartn_x'],
@@ -113,16 +136,25 @@ class TABIPB(BasePlugin):
                 else:
                     break
 
-            # Run TABIPB in a separate process
-            result = yield from self.runner.run_as_process(run_tabipb,
-                    {'atoms': self._molecules})
-
-            yield from self.publish(self._tm.new_text(lines=[str(result)]))
+            if self._molecules:
+                yield from self._solve()
 
             yield from self.done()
         except Exception as e:
             _log.exception('Unhandled exception:')
 
 
+    @asyncio.coroutine
+    def _solve(self):
+        '''Solve the atoms collected so far, and publish the result.
+        '''
+        # Run TABIPB in a separate process
+        result = yield from self.runner.run_as_process(run_tabipb,
+                {'atoms': self._molecules})
+        self._molecules = []
+
+        yield from self.publish(self._tm.new_text(lines=[str(result)]))
+
+
     def xform_data(self, data, to_type):
         return data
@@ -38,7 +38,7 @@
 # THE POSSIBILITY OF SUCH DAMAGE.
 #}}}
 
-from jsonschema import validate, ValidationError
+from jsonschema import validators, ValidationError
 import simplejson as json
 from functools import partial
 import os
@@ -66,6 +66,14 @@ class TypeManager:
         with open(PDBx_mmCIF_SCHEMA) as f:
             self._schema = json.loads(f.read())
 
+        # Checking the schema itself takes far longer than validating a value
+        # against it, so do that once, rather than on every validate().  The
+        # validator sees the types that are defined later, as it holds on to
+        # the schema rather than a copy.
+        cls = validators.validator_for(self._schema)
+        cls.check_schema(self._schema)
+        self._validator = cls(self._schema)
+
         # Setup a regex for "new_*" method dispatching.  What's "new_*" method
         # dispatching you ask?  Check it out below in the __getattr__ method.
         self._method_regex = re.compile('new_(.*)')
@@ -110,7 +118,7 @@ class TypeManager:
 
         #TODO: (NB) I'm concerned that this may be too slow.
         try:
-            validate(d, self._schema)
+            self._validator.validate(d)
         except ValidationError:
             _log.error('Validation Error: {}'.format(d))
             raise
@@ -160,10 +160,12 @@ class BasePlugin(metaclass=ABCMeta):
         '''
         for sink, data_type in self._sinks.items():
             # Special case 'None', since that's our 'eof'.  See the 'done'
-            # method below.
+            # method below.  Each sink gets the data transformed from what
+            # we were given, not from what the sink before it got.
+            sink_data = data
             if data:
-                data = self.xform_data(data, data_type)
-            await self._databus.publish(data, sink)
+                sink_data = self.xform_data(data, data_type)
+            await self._databus.publish(sink_data, sink)
 
 
     async def write_data(self, data):
@@ -41,6 +41,7 @@
 from nose.tools import *
 
 from functools import partial
+import asyncio
 import os
 
 from sphinx.plugin import *
@@ -74,6 +75,30 @@ def test_impedence_fail():
     sink().source()
 
 
+@with_setup(setup_runner)
+def test_publish_per_sink():
+    '''Test Publishing to Sinks of Different Types
+
+    Verify that each sink gets the data transformed to its own type.
+    '''
+    source = runner.load('multi')()
+    number_sink = source.sink()
+    string_sink = source.string_sink()
+
+    BasePlugin.set_databus(FakeDatabus())
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(source.publish(42))
+    assert_equal(loop.run_until_complete(number_sink.read_data()), ('a_number', 42))
+    assert_equal(loop.run_until_complete(string_sink.read_data()), ('a_string', 42))
+
+
+class FakeDatabus():
+    _typemgr = None
+
+    async def publish(self, data, sink):
+        await sink.write_data(data)
+
+
 class TestRunner():
     def __init__(self):
         self._plugin_dict = {}
@@ -82,6 +107,8 @@ class TestRunner():
         self._plugin_dict['sink'] = partial(SinkPlugin, runner=self, plugins=self._plugin_dict)
         self._plugin_dict['source'] = partial(SourcePlugin, runner=self, plugins=self._plugin_dict)
         self._plugin_dict['foo'] = partial(FooPlugin, runner=self, plugins=self._plugin_dict)
+        self._plugin_dict['multi'] = partial(MultiSourcePlugin, runner=self, plugins=self._plugin_dict)
+        self._plugin_dict['string_sink'] = partial(StringSinkPlugin, runner=self, plugins=self._plugin_dict)
 
     def load(self, plugin):
         return self._plugin_dict[plugin]
@@ -151,4 +178,25 @@ class FooPlugin(BasePlugin):
         pass
 
 
+class MultiSourcePlugin(BasePlugin):
+    @classmethod
+    def sources(cls):
+        return ['a_number', 'a_string']
 
+    def run(self):
+        pass
+
+    def xform_data(self, data, to_type):
+        return (to_type, data)
+
+
+class StringSinkPlugin(BasePlugin):
+    @classmethod
+    def sinks(cls):
+        return ['a_string']
+
+    def run(self):
+        pass
+
+    def xform_data(self, data, to_type):
+        pass
@@ -74,6 +74,91 @@ class PdbxReader(object):
         else:
             raise PdbxError()
 
+    def readRows(self, catName):
+        """
+        Generates the rows of one category as they are read, without building
+        any containers, so that large categories such as atom_site can be
+        processed in bounded memory.
+
+        Yields (attributeList, row) for each row, where row is a list of the
+        values in attributeList order.  A category given as item-value pairs
+        yields its single row when the pairs end.  The category is read from
+        every data block.
+        """
+        self.__curLineNumber = 0
+        tokenizer = self.__tokenizer(self.__ifh, wordLists=True)
+        attributeList = []
+        row = []
+        try:
+            curCatName, curAttName, curQuotedString, curWord = next(tokenizer)
+            while True:
+                if curCatName == catName:
+                    # Item-value pairs
+                    attributeList.append(curAttName)
+                    tCat, tAtt, curQuotedString, curWord = next(tokenizer)
+                    if curWord is None:
+                        row.append(curQuotedString)
+                    elif type(curWord) is list:
+                        row.extend(curWord)
+                    else:
+                        row.append(curWord)
+                    curCatName, curAttName, curQuotedString, curWord = next(tokenizer)
+                    continue
+
+                if row:
+                    yield attributeList, row
+                    attributeList = []
+                    row = []
+
+                if (curWord is None or type(curWord) is list or
+                        self.__getState(curWord)[1] != "ST_TABLE"):
+                    curCatName, curAttName, curQuotedString, curWord = next(tokenizer)
+                    continue
+
+                # A loop_ declaration; skip its data unless it's ours
+                curCatName, curAttName, curQuotedString, curWord = next(tokenizer)
+                loopName = curCatName
+                if loopName is None:
+                    self.__syntaxError("Unexpected token in loop_ declaration")
+                while curCatName is not None:
+                    if curCatName != loopName:
+                        self.__syntaxError("Changed category name in loop_ declaration")
+                    attributeList.append(curAttName)
+                    curCatName, curAttName, curQuotedString, curWord = next(tokenizer)
+
+                if loopName != catName:
+                    attributeList = []
+                    continue
+
+                width = len(attributeList)
+                while curCatName is None:
+                    if curWord is None:
+                        row.append(curQuotedString)
+                    elif type(curWord) is list:
+                        # Most often a line holds exactly one row
+                        if not row and len(curWord) == width:
+                            yield attributeList, curWord
+                            curCatName, curAttName, curQuotedString, curWord = next(tokenizer)
+                            continue
+                        row.extend(curWord)
+                    elif self.__getState(curWord)[0] is not None:
+                        break
+                    else:
+                        row.append(curWord)
+
+                    while len(row) >= width:
+                        yield attributeList, row[:width]
+                        row = row[width:]
+
+                    curCatName, curAttName, curQuotedString, curWord = next(tokenizer)
+
+                attributeList = []
+                row = []
+
+        except StopIteration:
+            if row:
+                yield attributeList, row
+
     def __syntaxError(self, errText):
         raise SyntaxError(self.__curLineNumber, errText)
 
@@ -324,7 +409,7 @@ class PdbxReader(object):
                 return
                 
 
-    def __tokenizer(self, ifh):
+    def __tokenizer(self, ifh, wordLists=False):
         """ Tokenizer method for the mmCIF syntax file - 
 
             Each return/yield from this method returns information about
@@ -332,6 +417,9 @@ class PdbxReader(object):
 
             (category name, attribute name, quoted strings, words w/o quotes or white space)
 
+            With wordLists, a line of plain words is returned as one token
+            whose words are a list.  Such lines hold no reserved words.
+
             Differentiated the reqular expression to the better handle embedded quotes.
 
         """
@@ -384,6 +472,18 @@ class PdbxReader(object):
                 line = line[1:]
                 #continue
 
+            # Lines of plain words, e.g. most loop_ rows, need no regex
+            elif ("_" not in line and "'" not in line and '"' not in line
+                  and "#" not in line):
+                if wordLists:
+                    words = line.split()
+                    if words:
+                        yield (None, None, None, words)
+                else:
+                    for word in line.split():
+                        yield (None, None, None, word)
+                continue
+
             # Apply regex to the current line consolidate the single/double
             # quoted within the quoted string category
             for it in mmcifRe.finditer(line):
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python ff=unix sw=4 ts=4 sts=4 et:
+# APBS -- Adaptive Poisson-Boltzmann Solver
+#
+#  Nathan A. Baker (nathan.baker@pnnl.gov)
+#  Pacific Northwest National Laboratory
+#
+#  Additional contributing authors listed in the code documentation.
+#
+# Copyright (c) 2010-2016 Battelle Memorial Institute. Developed at the
+# Pacific Northwest National Laboratory, operated by Battelle Memorial
+# Institute, Pacific Northwest Division for the U.S. Department of Energy.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# Redistributions of source code must retain the above copyright notice, this
+# list of conditions and the following disclaimer.
+#
+# Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# Neither the name of the developer nor the names of its contributors may be
+# used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
+# THE POSSIBILITY OF SUCH DAMAGE.
+#}}}
+
+from nose.tools import *
+
+import io
+import os
+
+from sphinx.utils import PdbxReader
+
+__author__ = 'Keith T. Star <keith@pnnl.gov>'
+
+DATA_DIR = os.path.dirname(__file__)
+
+# Rows split over lines and sharing lines, quoted and multi-line values,
+# item-value pairs, and a category in two data blocks
+ODD_CIF = '''data_first
+_cell.entry_id 'A B'
+_cell.length_a   10.0
+_cell.length_b
+20.0
+loop_
+_atom_site.id
+_atom_site.label
+_atom_site.note
+1 CA 'quoted value'
+2 "N" ?
+3
+CB
+.
+4 CG
+;multi
+line text
+;
+5 OD1 plain 6 OD2 "it's"
+#
+loop_
+_other.a
+_other.b
+x y
+data_second
+loop_
+_atom_site.id
+_atom_site.label
+_atom_site.note
+7 ZN last
+_cell.entry_id C
+'''
+
+ODD_ROWS = {
+    'atom_site': [
+        ['1', 'CA', 'quoted value'],
+        ['2', 'N', '?'],
+        ['3', 'CB', '.'],
+        ['4', 'CG', 'multi\nline text'],
+        ['5', 'OD1', 'plain'],
+        ['6', 'OD2', "it's"],
+        ['7', 'ZN', 'last'],
+    ],
+    'cell': [['A B', '10.0', '20.0'], ['C']],
+    'other': [['x', 'y']],
+}
+
+
+def read_containers(text):
+    containers = []
+    PdbxReader(io.StringIO(text)).read(containers)
+    return containers
+
+
+def parsed_rows(containers, catName):
+    '''The rows of a category from a full parse, from every data block
+    '''
+    rows = []
+    for container in containers:
+        category = container.getObj(catName)
+        if category is None:
+            continue
+        attributes = category.getAttributeList()
+        for row in category.getRowList():
+            rows.append((list(attributes), list(row)))
+    return rows
+
+
+def streamed_rows(text, catName):
+    return [(list(attributes), list(row)) for attributes, row in
+            PdbxReader(io.StringIO(text)).readRows(catName)]
+
+
+def test_odd_rows():
+    '''Test Reading Rows Of An Odd CIF
+
+    readRows and a full parse give the same rows, which are the ones
+    written in the file.
+    '''
+    containers = read_containers(ODD_CIF)
+    assert_equal([container.getName() for container in containers],
+                 ['first', 'second'])
+    for catName, rows in ODD_ROWS.items():
+        parsed = parsed_rows(containers, catName)
+        assert_equal([row for attributes, row in parsed], rows)
+        assert_equal(streamed_rows(ODD_CIF, catName), parsed)
+    assert_equal(streamed_rows(ODD_CIF, 'missing'), [])
+
+
+def test_file_rows():
+    '''Test Reading Rows Of PDBx Files
+
+    readRows gives every category of the structure and structure factor
+    files of 1KIP as a full parse does.
+    '''
+    for name in ('1kip.cif', '1kip-sf.cif'):
+        with open(os.path.join(DATA_DIR, name)) as f:
+            text = f.read()
+        containers = read_containers(text)
+        catNames = set()
+        for container in containers:
+            catNames.update(container.getObjNameList())
+        assert_in('atom_site' if name == '1kip.cif' else 'refln', catNames)
+
+        for catName in sorted(catNames):
+            parsed = parsed_rows(containers, catName)
+            assert_true(parsed)
+            assert_equal(streamed_rows(text, catName), parsed)